@@ -0,0 +1,3 @@
+"""Benchmarks for ShopAPI.
+Every benchmark boots `main.app` in-process against its own throw-away database.
+"""
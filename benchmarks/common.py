@@ -0,0 +1,158 @@
+"""Shared helpers for benchmarks: in-process ASGI client, app bootstrapping and seeding
+"""
+
+import json
+import os
+import tempfile
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, NamedTuple, Optional, Tuple
+
+ADMIN_EMAIL = "bench.admin@demo-shopapi.demo"
+ADMIN_PASSWORD = "benchadmin"
+
+
+class Response(NamedTuple):
+    """Response as received by `ASGIClient`"""
+
+    status_code: int
+    headers: Dict[str, str]
+    body: bytes
+
+    def json(self) -> Any:
+        """Decode response body as json"""
+        return json.loads(self.body)
+
+
+class ASGIClient:
+    """Minimal async HTTP client calling ASGI `app` directly, without any network in between"""
+
+    def __init__(self, app, headers: Optional[Dict[str, str]] = None):
+        self.app = app
+        self.headers = headers or {}
+
+    async def request(
+        self, method: str, url: str, json_body: Any = None, headers: Optional[Dict[str, str]] = None
+    ) -> Response:
+        """Send request to the app and return the complete response"""  # pylint: disable=too-many-locals
+        path, _, query = url.partition("?")
+        body = json.dumps(json_body).encode("utf-8") if json_body is not None else b""
+        all_headers = {"host": "localhost", **self.headers, **(headers or {})}
+        if body:
+            all_headers["content-type"] = "application/json"
+            all_headers["content-length"] = str(len(body))
+        raw_headers: List[Tuple[bytes, bytes]] = [
+            (key.lower().encode("latin-1"), value.encode("latin-1")) for key, value in all_headers.items()
+        ]
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": method.upper(),
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode("utf-8"),
+            "query_string": query.encode("utf-8"),
+            "root_path": "",
+            "headers": raw_headers,
+            "client": ("127.0.0.1", 0),
+            "server": ("localhost", 80),
+        }
+        request_sent = False
+        status_code = 500
+        response_headers: Dict[str, str] = {}
+        chunks: List[bytes] = []
+
+        async def receive() -> Dict[str, Any]:
+            nonlocal request_sent
+            if request_sent:
+                return {"type": "http.disconnect"}
+            request_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        async def send(message: Dict[str, Any]):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                for key, value in message.get("headers", []):
+                    response_headers[key.decode("latin-1")] = value.decode("latin-1")
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        await self.app(scope, receive, send)
+        return Response(status_code, response_headers, b"".join(chunks))
+
+    async def get(self, url: str, headers: Optional[Dict[str, str]] = None) -> Response:
+        """Send GET request"""
+        return await self.request("GET", url, headers=headers)
+
+    async def post(self, url: str, json_body: Any = None, headers: Optional[Dict[str, str]] = None) -> Response:
+        """Send POST request"""
+        return await self.request("POST", url, json_body, headers)
+
+    async def put(self, url: str, json_body: Any = None, headers: Optional[Dict[str, str]] = None) -> Response:
+        """Send PUT request"""
+        return await self.request("PUT", url, json_body, headers)
+
+    async def delete(self, url: str, headers: Optional[Dict[str, str]] = None) -> Response:
+        """Send DELETE request"""
+        return await self.request("DELETE", url, headers=headers)
+
+
+def prepare_environment(database: Optional[str] = None, env: Optional[Dict[str, str]] = None) -> str:
+    """Point ShopAPI configuration at a fresh database. Must be called before `main` is imported.
+    Returns path to the SQLite database file (or the `database` uri if given).
+    """
+    os.environ.setdefault("SHOPAPI__SECRET_KEY", "benchmark-secret-key")
+    os.environ.update(env or {})
+    if database is not None:
+        os.environ["SHOPAPI__DB_URI"] = database
+        return database
+    path = os.path.join(tempfile.mkdtemp(prefix="shopapi-bench-"), "db.sqlite3")
+    os.environ["SHOPAPI__DB_BACKEND"] = "sqlite"
+    os.environ["SHOPAPI__DB_HOST"] = path
+    return path
+
+
+@asynccontextmanager
+async def running_app() -> AsyncIterator[ASGIClient]:
+    """Import `main.app`, run its startup and shutdown events and yield client bound to it"""
+    import main  # pylint: disable=import-outside-toplevel
+
+    await main.app.router.startup()
+    try:
+        yield ASGIClient(main.app)
+    finally:
+        await main.app.router.shutdown()
+
+
+async def seed(client: ASGIClient) -> Dict[str, str]:
+    """Initialize db, insert demo data and an admin user.
+    Returns authorization headers of the admin user.
+    """
+    from shopapi.constants import ROLE_ADMIN_ID  # pylint: disable=import-outside-toplevel
+    from shopapi.schemas import models  # pylint: disable=import-outside-toplevel
+
+    await client.get("/service/db-init")
+    await client.get("/service/demo-data")
+    credentials = {"email": ADMIN_EMAIL, "password": ADMIN_PASSWORD}
+    await client.post("/auth/register", credentials)
+    await models.User.filter(email=ADMIN_EMAIL).update(role_id=ROLE_ADMIN_ID)
+    return await login(client, credentials)
+
+
+async def promote_demo_users(role_id: int) -> List[Dict[str, str]]:
+    """Assign `role_id` to all demo users and return their login credentials"""
+    from shopapi.helpers import demo  # pylint: disable=import-outside-toplevel
+    from shopapi.schemas import models  # pylint: disable=import-outside-toplevel
+
+    emails = [user.email for user in demo.users]
+    await models.User.filter(email__in=emails).update(role_id=role_id)
+    return [{"email": user.email, "password": user.password} for user in demo.users]
+
+
+async def login(client: ASGIClient, credentials: Dict[str, str]) -> Dict[str, str]:
+    """Login user and return authorization headers"""
+    response = await client.post("/auth/login", credentials)
+    if response.status_code != 200:
+        raise RuntimeError(f"Unable to login {credentials['email']}: {response.body!r}")
+    return {"authorization": f"Bearer {response.json()['token']}"}
@@ -0,0 +1,203 @@
+"""Load test of the API running in-process against a seeded database.
+
+Usage:
+
+    python -m benchmarks.load [--workers 32] [--duration 20] [--database postgres://...] [--compare results.json]
+
+By default a fresh SQLite database is created for every run. Results (throughput and latency percentiles
+per endpoint) are printed and stored as JSON in `benchmarks/results/` together with the current git commit,
+so that runs can be compared across commits using `--compare`.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional
+
+from benchmarks import common
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+class Session(NamedTuple):
+    """Logged in benchmark user"""
+
+    credentials: Dict[str, str]
+    headers: Dict[str, str]
+    user_id: int
+
+
+class Scenario(NamedTuple):
+    """Single endpoint exercised by the load test"""
+
+    name: str
+    weight: int
+    call: Callable[[common.ASGIClient, Session, random.Random], Awaitable[common.Response]]
+
+
+async def tag_list(client: common.ASGIClient, _session: Session, rng: random.Random) -> common.Response:
+    """Anonymous tag list, sometimes with search"""
+    return await client.get(rng.choice(["/tag/", "/tag/?limit=50", "/tag/?search=s"]))
+
+
+async def category_list(client: common.ASGIClient, _session: Session, rng: random.Random) -> common.Response:
+    """Anonymous category list, sometimes with search"""
+    return await client.get(rng.choice(["/category/", "/category/?limit=50", "/category/?search=h"]))
+
+
+async def category_get(client: common.ASGIClient, session: Session, rng: random.Random) -> common.Response:
+    """Authenticated category detail"""
+    return await client.get(f"/category/{rng.randint(1, 7)}", session.headers)
+
+
+async def auth_login(client: common.ASGIClient, session: Session, _rng: random.Random) -> common.Response:
+    """Password login (bcrypt bound)"""
+    return await client.post("/auth/login", session.credentials)
+
+
+async def user_update(client: common.ASGIClient, session: Session, rng: random.Random) -> common.Response:
+    """User updating their own profile"""
+    body = {"first_name": f"Bench{rng.randint(0, 9999)}"}
+    return await client.put(f"/user/{session.user_id}", body, session.headers)
+
+
+SCENARIOS = [
+    Scenario("tag_list", 30, tag_list),
+    Scenario("category_list", 30, category_list),
+    Scenario("category_get", 25, category_get),
+    Scenario("user_update", 10, user_update),
+    Scenario("auth_login", 5, auth_login),
+]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of sorted `values`"""
+    if not values:
+        return 0.0
+    index = max(0, min(len(values) - 1, int(round(pct / 100 * len(values))) - 1))
+    return values[index]
+
+
+def git_commit() -> str:
+    """Current git commit or `unknown`"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], check=True, stdout=subprocess.PIPE, text=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def worker(
+    client: common.ASGIClient,
+    sessions: List[Session],
+    latencies: Dict[str, List[float]],
+    errors: Dict[str, int],
+    stop: float,
+    seed: int,
+):
+    """Pick weighted scenarios and record their latencies until `stop`"""
+    rng = random.Random(seed)
+    weights = [scenario.weight for scenario in SCENARIOS]
+    while time.perf_counter() < stop:
+        scenario = rng.choices(SCENARIOS, weights)[0]
+        session = rng.choice(sessions)
+        started = time.perf_counter()
+        response = await scenario.call(client, session, rng)
+        latencies[scenario.name].append(time.perf_counter() - started)
+        if response.status_code >= 400:
+            errors[scenario.name] += 1
+
+
+async def run(args) -> Dict:
+    """Seed database, run the load and return results"""
+    from shopapi.constants import ROLE_VIEWER_ID  # pylint: disable=import-outside-toplevel
+
+    async with common.running_app() as client:
+        await common.seed(client)
+        sessions = []
+        for credentials in await common.promote_demo_users(ROLE_VIEWER_ID):
+            headers = await common.login(client, credentials)
+            user_id = (await client.get("/user/me", headers)).json()["id"]
+            sessions.append(Session(credentials, headers, user_id))
+        latencies: Dict[str, List[float]] = {scenario.name: [] for scenario in SCENARIOS}
+        errors: Dict[str, int] = {scenario.name: 0 for scenario in SCENARIOS}
+        started = time.perf_counter()
+        stop = started + args.duration
+        await asyncio.gather(
+            *[worker(client, sessions, latencies, errors, stop, args.seed + index) for index in range(args.workers)]
+        )
+        elapsed = time.perf_counter() - started
+    endpoints = {}
+    for name, values in latencies.items():
+        values.sort()
+        endpoints[name] = {
+            "requests": len(values),
+            "errors": errors[name],
+            "throughput": len(values) / elapsed,
+            "p50_ms": percentile(values, 50) * 1000,
+            "p95_ms": percentile(values, 95) * 1000,
+            "p99_ms": percentile(values, 99) * 1000,
+        }
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.utcnow().isoformat(),
+        "database": "sqlite" if args.database is None else args.database.split(":", 1)[0],
+        "workers": args.workers,
+        "duration": elapsed,
+        "throughput": sum(len(values) for values in latencies.values()) / elapsed,
+        "endpoints": endpoints,
+    }
+
+
+def print_results(results: Dict, baseline: Optional[Dict] = None):
+    """Print results table, with relative change against `baseline` if given"""
+    print(f"commit {results['commit']}, {results['workers']} workers, {results['throughput']:.1f} req/s total")
+    print(f"{'endpoint':<16} {'req/s':>10} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'errors':>8}")
+    for name, stats in results["endpoints"].items():
+        line = (
+            f"{name:<16} {stats['throughput']:>10.1f} {stats['p50_ms']:>10.2f} "
+            f"{stats['p95_ms']:>10.2f} {stats['p99_ms']:>10.2f} {stats['errors']:>8}"
+        )
+        base = (baseline or {}).get("endpoints", {}).get(name)
+        if base and base["throughput"] and base["p95_ms"]:
+            line += (
+                f"   req/s {100 * (stats['throughput'] / base['throughput'] - 1):+.1f}%"
+                f", p95 {100 * (stats['p95_ms'] / base['p95_ms'] - 1):+.1f}%"
+            )
+        print(line)
+
+
+def main():
+    """Parse arguments, run the load test, store and print results"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=32, help="number of concurrent clients")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds to run the load for")
+    parser.add_argument("--seed", type=int, default=0, help="random seed of the request mix")
+    parser.add_argument("--database", help="tortoise db url to use instead of a fresh SQLite database")
+    parser.add_argument("--compare", help="results JSON file to compare against")
+    parser.add_argument("--output", help="where to store results JSON (default: benchmarks/results/)")
+    args = parser.parse_args()
+    common.prepare_environment(args.database)
+    results = asyncio.run(run(args))
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"load-{datetime.utcnow():%Y%m%d-%H%M%S}-{results['commit']}.json")
+    with open(output, "w", encoding="utf-8") as fid:
+        json.dump(results, fid, indent=2)
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as fid:
+            baseline = json.load(fid)
+    print_results(results, baseline)
+    print(f"Results stored in {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Compare memory and time needed to list resources as full ORM model instances and as lightweight rows.
+
+Usage:
+
+    python -m benchmarks.memory [--categories 5000] [--tags 200] [--tags-per-category 5]
+
+Seeds an in-memory SQLite database, then lists all categories with their tags both ways,
+measuring peak memory with `tracemalloc`. Also checks that both ways produce the same schemas.
+"""
+
+import argparse
+import asyncio
+import time
+import tracemalloc
+from typing import Any, Awaitable, Callable, List, Tuple
+
+from benchmarks import common
+
+
+async def _seed(categories: int, tags: int, tags_per_category: int):
+    # pylint: disable=import-outside-toplevel
+    from tortoise import Tortoise
+    from shopapi.schemas import models
+
+    await models.Tag.bulk_create([models.Tag(name=f"tag-{index}") for index in range(tags)])
+    await models.Category.bulk_create([models.Category(title=f"category-{index}") for index in range(categories)])
+    pairs = ", ".join(
+        f"({category}, {(category * tags_per_category + offset) % tags + 1})"
+        for category in range(1, categories + 1)
+        for offset in range(tags_per_category)
+    )
+    await Tortoise.get_connection("default").execute_script(
+        f'INSERT INTO "category_tag" ("category_id", "tag_id") VALUES {pairs}'
+    )
+
+
+async def measure(fetch: Callable[[], Awaitable[List[Any]]]) -> Tuple[List[Any], float, float]:
+    """Run `fetch` and return its result, peak of memory allocated during it in MiB and duration in seconds"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = await fetch()
+    duration = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, peak / 2**20, duration
+
+
+async def run(categories: int, tags: int, tags_per_category: int) -> bool:
+    """Print memory and time of both ways of listing, returns False if their output differs"""
+    # pylint: disable=import-outside-toplevel
+    from tortoise import Tortoise
+    from shopapi.actions.category import CategoryOperator
+    from shopapi.helpers import dependencies as deps
+
+    await Tortoise.init(db_url="sqlite://:memory:", modules={"models": ["shopapi.schemas.models"]})
+    await Tortoise.generate_schemas()
+    try:
+        await _seed(categories, tags, tags_per_category)
+        operator = CategoryOperator()
+        params = deps.QueryParams(search=None, offset=0, limit=categories)
+        outputs = []
+        print(f"{'way':<16} {'peak MiB':>10} {'seconds':>10}")
+        for name, fetch in (("models", operator.mlist), ("rows", operator.mlist_rows)):
+            resources, peak, duration = await measure(lambda fetch=fetch: fetch(params))  # type: ignore
+            print(f"{name:<16} {peak:>10.1f} {duration:>10.3f}")
+            outputs.append([operator.schema.trusted(resource) for resource in resources])
+            del resources
+        return outputs[0] == outputs[1]
+    finally:
+        await Tortoise.close_connections()
+
+
+def main():
+    """Parse arguments and run the comparison"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--categories", type=int, default=5000)
+    parser.add_argument("--tags", type=int, default=200)
+    parser.add_argument("--tags-per-category", type=int, default=5)
+    args = parser.parse_args()
+    common.prepare_environment(env={"SHOPAPI__METRICS_ENABLED": "false"})
+    if not asyncio.run(run(args.categories, args.tags, args.tags_per_category)):
+        raise SystemExit("Rows and models produce different output")
+    print("Output of both ways is equal")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,324 @@
+"""Microbenchmarks of hot in-process code paths.
+
+Usage:
+
+    python -m benchmarks.micro run [--filter jwt] [--save benchmarks/results/micro-baseline.json]
+    python -m benchmarks.micro compare benchmarks/results/micro-baseline.json [--threshold 15]
+
+`run` prints time per call of every benchmark, `--save` stores the results as a baseline.
+`compare` runs the benchmarks again and exits with status 1 if any of them is slower
+than the baseline by more than `--threshold` percent.
+
+Fixtures are built once, before any timing starts, and never touch the network or a database file.
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+import timeit
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, NamedTuple
+
+from benchmarks import common
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "results", "micro-baseline.json")
+
+
+class Benchmark(NamedTuple):
+    """Named benchmark, `setup` returns the callable to be timed"""
+
+    name: str
+    setup: Callable[[], Callable[[], object]]
+
+
+benchmarks: List[Benchmark] = []
+
+
+def benchmark(name: str):
+    """Register decorated fixture function as benchmark `name`"""
+
+    def decorator(setup: Callable[[], Callable[[], object]]):
+        benchmarks.append(Benchmark(name, setup))
+        return setup
+
+    return decorator
+
+
+def _user():
+    from shopapi.schemas import schemas  # pylint: disable=import-outside-toplevel
+
+    now = datetime.utcnow()
+    return schemas.UserFromDB(
+        id=42, email="bench.user@demo-shopapi.demo", role_id=4, created_at=now, updated_at=now
+    )  # type: ignore
+
+
+@benchmark("security.create_access_token")
+def bench_create_access_token():
+    """JWT encoding and signing"""
+    from shopapi.helpers import security  # pylint: disable=import-outside-toplevel
+
+    user = _user()
+    return lambda: security.create_access_token(user, timedelta(minutes=5))
+
+
+@benchmark("security.verify_token")
+def bench_verify_token():
+    """JWT signature verification and validity checks done by `decode_jwt`"""
+    from shopapi.helpers import security  # pylint: disable=import-outside-toplevel
+
+    token = security.create_access_token(_user(), timedelta(days=1))
+    return lambda: security.verify_token(token)
+
+
+@benchmark("schemas.UserToken.from_token")
+def bench_user_token_from_token():
+    """Token payload to schema, including EmailStr validation"""
+    from shopapi.helpers import security  # pylint: disable=import-outside-toplevel
+    from shopapi.schemas import schemas  # pylint: disable=import-outside-toplevel
+
+    payload = security.verify_token(security.create_access_token(_user(), timedelta(days=1)))
+    return lambda: schemas.UserToken.from_token(payload)
+
+
+@benchmark("schemas.UserToken.from_trusted_token")
+def bench_user_token_from_trusted_token():
+    """Token payload to schema without validation, as done for every authenticated request"""
+    from shopapi.helpers import security  # pylint: disable=import-outside-toplevel
+    from shopapi.schemas import schemas  # pylint: disable=import-outside-toplevel
+
+    payload = security.verify_token(security.create_access_token(_user(), timedelta(days=1)))
+    assert schemas.UserToken.from_trusted_token(payload) == schemas.UserToken.from_token(payload)
+    return lambda: schemas.UserToken.from_trusted_token(payload)
+
+
+@benchmark("ResourceOperator.check_roles")
+def bench_check_roles():
+    """Role permission check of a regular read"""
+    from shopapi.actions.category import CategoryOperator  # pylint: disable=import-outside-toplevel
+    from shopapi.schemas import schemas  # pylint: disable=import-outside-toplevel
+
+    operator = CategoryOperator()
+    role = schemas.Role(id=4, title="viewer", categories=schemas.VIEWER, tags=schemas.VIEWER)
+    return lambda: operator.check_roles(role, "get")
+
+
+@benchmark("utils.build_search_query")
+def bench_build_search_query():
+    """Search query building for a model with multiple search fields"""
+    from shopapi.helpers import dependencies as deps, utils  # pylint: disable=import-outside-toplevel
+    from shopapi.schemas import models  # pylint: disable=import-outside-toplevel
+
+    common_params = deps.QueryParams(search="hat", offset=0, limit=10)
+    return lambda: utils.build_search_query(common_params, models.User)
+
+
+def _category():
+    from shopapi.schemas import models  # pylint: disable=import-outside-toplevel
+
+    now = datetime.utcnow()
+    category = models.Category(id=1, title="Hats", created_at=now, updated_at=now)
+    tags = [models.Tag(id=index, name=f"tag-{index}", created_at=now, updated_at=now) for index in range(20)]
+    # the related manager is only typed as the field declaration
+    category.tags._set_result_for_query(tags)  # pylint: disable=protected-access,no-member
+    return category
+
+
+@benchmark("schemas.Category.from_orm")
+def bench_category_from_orm():
+    """Category with 20 nested tags from Tortoise model instance"""
+    from shopapi.schemas import schemas  # pylint: disable=import-outside-toplevel
+
+    category = _category()
+    return lambda: schemas.Category.from_orm(category)
+
+
+@benchmark("schemas.Category.trusted")
+def bench_category_trusted():
+    """Category with 20 nested tags from Tortoise model instance, without validation"""
+    from shopapi.schemas import schemas  # pylint: disable=import-outside-toplevel
+
+    category = _category()
+    assert schemas.Category.trusted(category) == schemas.Category.from_orm(category)
+    return lambda: schemas.Category.trusted(category)
+
+
+def _user_db():
+    from shopapi.schemas import models  # pylint: disable=import-outside-toplevel
+
+    now = datetime.utcnow()
+    role = models.Role(id=4, title="viewer", users=1, roles=1, tags=1, categories=1, products=1)
+    user = models.User(
+        id=42, email="bench.user@demo-shopapi.demo", first_name="Bench", role_id=4, created_at=now, updated_at=now
+    )
+    user._role = role  # pylint: disable=protected-access
+    return user
+
+
+@benchmark("schemas.UserFromDB.from_orm")
+def bench_user_from_orm():
+    """User with its role from Tortoise model instance"""
+    from shopapi.schemas import schemas  # pylint: disable=import-outside-toplevel
+
+    user = _user_db()
+    return lambda: schemas.UserFromDB.from_orm(user)
+
+
+@benchmark("schemas.UserFromDB.trusted")
+def bench_user_trusted():
+    """User with its role from Tortoise model instance, without validation"""
+    from shopapi.schemas import schemas  # pylint: disable=import-outside-toplevel
+
+    user = _user_db()
+    assert schemas.UserFromDB.trusted(user) == schemas.UserFromDB.from_orm(user)
+    return lambda: schemas.UserFromDB.trusted(user)
+
+
+@benchmark("ComputedBase.dict")
+def bench_computed_base_dict():
+    """`dict` of schema with computed properties, as done before every user update"""
+    from shopapi.schemas import api  # pylint: disable=import-outside-toplevel
+
+    update = api.UserUpdateIn(first_name="Bench", last_name="Mark", email="bench.user@demo-shopapi.demo")
+    return lambda: update.dict(exclude_none=True)
+
+
+LOG_WRITE_LATENCY = 0.0001
+
+
+class _SlowStream(io.StringIO):
+    """Log sink with the write latency of a busy stderr pipe, e.g. a container log collector under load"""
+
+    def write(self, text: str) -> int:
+        time.sleep(LOG_WRITE_LATENCY)
+        return len(text)
+
+
+def _logger(name: str, handler: logging.Handler) -> logging.Logger:
+    logger = logging.getLogger(f"benchmarks.micro.{name}")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.handlers = [handler]
+    return logger
+
+
+@benchmark("logging.blocking")
+def bench_logging_blocking():
+    """JSON warning formatted and written by the calling thread, as with `logging.basicConfig`"""
+    from shopapi.helpers import logs  # pylint: disable=import-outside-toplevel
+
+    handler = logging.StreamHandler(_SlowStream())
+    handler.setFormatter(logs.JSONFormatter())
+    logger = _logger("blocking", handler)
+    return lambda: logger.warning("No role was provided for %s", "TagOperator.list")
+
+
+@benchmark("logging.queued")
+def bench_logging_queued():
+    """JSON warning handed over to the background thread, as configured by `logs.setup` without rate limiting.
+    Records the thread can not keep up with are dropped, so the caller never waits for the sink.
+    """
+    from shopapi.helpers import logs  # pylint: disable=import-outside-toplevel
+
+    target = logging.StreamHandler(_SlowStream())
+    target.setFormatter(logs.JSONFormatter())
+    handler = logs.NonBlockingQueueHandler(queue.Queue(10000))
+    logging.handlers.QueueListener(handler.queue, target).start()
+    logger = _logger("queued", handler)
+    return lambda: logger.warning("No role was provided for %s", "TagOperator.list")
+
+
+@benchmark("logging.rate_limited")
+def bench_logging_rate_limited():
+    """Repeated warning suppressed by `logs.RateLimitFilter` before it reaches the queue"""
+    from shopapi.helpers import logs  # pylint: disable=import-outside-toplevel
+
+    handler = logs.NonBlockingQueueHandler(queue.Queue(10000))
+    handler.addFilter(logs.RateLimitFilter(burst=10, period=3600))
+    logger = _logger("rate_limited", handler)
+    return lambda: logger.warning("No role was provided for %s", "TagOperator.list")
+
+
+async def _init_orm():
+    from tortoise import Tortoise  # pylint: disable=import-outside-toplevel
+
+    await Tortoise.init(db_url="sqlite://:memory:", modules={"models": ["shopapi.schemas.models"]})
+    # models only need to be initialized, connection itself is never used
+    await Tortoise.close_connections()
+
+
+def time_call(func: Callable[[], object], repeat: int) -> float:
+    """Return best time per call of `func` in nanoseconds"""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number * 1e9
+
+
+def run(name_filter: str, repeat: int) -> Dict[str, float]:
+    """Run benchmarks matching `name_filter` and return nanoseconds per call by benchmark name"""
+    common.prepare_environment(env={"SHOPAPI__METRICS_ENABLED": "false"})
+    asyncio.run(_init_orm())
+    selected = [bench for bench in benchmarks if name_filter in bench.name]
+    funcs = {bench.name: bench.setup() for bench in selected}
+    results = {}
+    for name, func in funcs.items():
+        results[name] = time_call(func, repeat)
+        print(f"{name:<36} {results[name]:>12.0f} ns")
+    return results
+
+
+def compare(results: Dict[str, float], baseline: Dict[str, float], threshold: float) -> bool:
+    """Print comparison against `baseline`, returns False if any benchmark regressed past `threshold` %"""
+    passed = True
+    print(f"{'benchmark':<36} {'baseline ns':>12} {'current ns':>12} {'change':>9}")
+    for name, current in results.items():
+        if name not in baseline:
+            print(f"{name:<36} {'-':>12} {current:>12.0f} {'new':>9}")
+            continue
+        change = 100 * (current / baseline[name] - 1)
+        regressed = change > threshold
+        passed = passed and not regressed
+        flag = " REGRESSION" if regressed else ""
+        print(f"{name:<36} {baseline[name]:>12.0f} {current:>12.0f} {change:>+8.1f}%{flag}")
+    return passed
+
+
+def main():
+    """Parse arguments and run or compare benchmarks"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    run_parser = subparsers.add_parser("run", help="run benchmarks")
+    run_parser.add_argument("--save", nargs="?", const=DEFAULT_BASELINE, help="store results as baseline")
+    compare_parser = subparsers.add_parser("compare", help="run benchmarks and compare with baseline")
+    compare_parser.add_argument("baseline", nargs="?", default=DEFAULT_BASELINE)
+    compare_parser.add_argument("--threshold", type=float, default=15.0, help="allowed slowdown in percent")
+    for subparser in (run_parser, compare_parser):
+        subparser.add_argument("--filter", default="", help="run only benchmarks containing this string")
+        subparser.add_argument("--repeat", type=int, default=7, help="timing repetitions, best one is used")
+    args = parser.parse_args()
+    # read before running the benchmarks, so a missing baseline fails fast
+    baseline: Dict[str, float] = {}
+    if args.command == "compare":
+        with open(args.baseline, "r", encoding="utf-8") as fid:
+            baseline = json.load(fid)["results"]
+    results = run(args.filter, args.repeat)
+    if args.command == "run":
+        if args.save:
+            os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+            with open(args.save, "w", encoding="utf-8") as fid:
+                json.dump({"timestamp": datetime.utcnow().isoformat(), "results": results}, fid, indent=2)
+            print(f"Baseline stored in {args.save}")
+        return
+    if not compare(results, baseline, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
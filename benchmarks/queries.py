@@ -0,0 +1,105 @@
+"""Check number of SQL statements issued by user, role and service endpoints against their budgets.
+
+Usage:
+
+    python -m benchmarks.queries
+
+Runs the app in debug mode against a fresh SQLite database and reads `X-Query-Count` response headers.
+Exits with status 1 if any request issues more statements than its budget.
+"""
+
+import asyncio
+import sys
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from benchmarks import common
+
+
+class Case(NamedTuple):
+    """Request and maximum number of statements it may issue"""
+
+    name: str
+    method: str
+    url: str
+    budget: int
+    body: Optional[Dict[str, Any]] = None
+    admin: bool = True
+
+
+# authentication (user and role) is loaded once per request, further reads of the same rows are served
+# from the request identity map, in batches once for all operations; writes also take the next change sequence number
+CASES = [
+    Case("own user", "GET", "/user/{self}", 2, admin=False),
+    Case("own role", "GET", "/user/role", 2, admin=False),
+    Case("update own user", "PUT", "/user/{self}", 4, {"first_name": "Bench"}, admin=False),
+    Case("other user", "GET", "/user/{other}", 3),
+    Case("update other user", "PUT", "/user/{other}", 5, {"last_name": "Bench"}),
+    Case("own role by id", "GET", "/role/{admin_role}", 2),
+    Case("users by ids", "GET", "/user/?ids={self},{other}", 3),
+    Case(
+        "batch of reads",
+        "POST",
+        "/batch/",
+        7,
+        {"operations": [{"method": "GET", "path": path} for path in ("/user/role", "/tag/", "/category/?limit=5")]},
+    ),
+]
+
+# run against the empty database before it is seeded, without authentication
+INIT_CASES = [
+    # initialized check, creation of the change counter, one insert of all roles,
+    # lookup and insert of the initialized flag
+    Case("db init", "GET", "/service/db-init", 6, admin=False),
+]
+
+# run after all other cases, as they remove the data the other cases read
+TEARDOWN_CASES = [
+    # production check, then per model regardless of the number of demo rows: ids of matching rows,
+    # ids of rows deleted by cascades (openids, child categories, products), delete, change sequence number
+    # and insert of tombstones
+    Case("demo data teardown", "DELETE", "/service/demo-data", 16),
+]
+
+
+async def run_case(client: common.ASGIClient, case: Case, headers: Dict[str, str], params: Dict[str, Any]) -> bool:
+    """Run single case, print its result and return True if it is over budget"""
+    url = case.url.format(**params)
+    response = await client.request(case.method, url, case.body, headers)
+    count = int(response.headers.get("x-query-count", -1))
+    over = response.status_code != 200 or not 0 <= count <= case.budget
+    print(f"{'FAIL' if over else 'ok':<5} {case.name:<20} {case.method} {url}: {count}/{case.budget}")
+    return over
+
+
+async def check() -> int:
+    """Run all cases and return number of cases over budget"""
+    common.prepare_environment(env={"SHOPAPI__DEBUG": "true"})
+    # configuration is read on import, so shopapi must be imported after the environment is prepared
+    # pylint: disable=import-outside-toplevel
+    from shopapi.constants import ROLE_ADMIN_ID, ROLE_VIEWER_ID
+    from shopapi.schemas import models
+
+    failures = 0
+    async with common.running_app() as client:
+        for case in INIT_CASES:
+            failures += await run_case(client, case, {}, {})
+        admin_headers = await common.seed(client)
+        credentials = (await common.promote_demo_users(ROLE_VIEWER_ID))[:2]
+        user_headers = await common.login(client, credentials[0])
+        ids: List[int] = [(await models.User.get(email=user["email"])).pk for user in credentials]
+        params = {"self": ids[0], "other": ids[1], "admin_role": ROLE_ADMIN_ID}
+        for case in CASES + TEARDOWN_CASES:
+            failures += await run_case(client, case, admin_headers if case.admin else user_headers, params)
+    return failures
+
+
+def main():
+    """Run query count checks and exit with non-zero status on failure"""
+    failures = asyncio.run(check())
+    if failures:
+        print(f"{failures} requests over their query budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Fill a database with synthetic data in production-like volumes.
+
+Usage:
+
+    python -m benchmarks.seed [--users 1000000] [--tags 5000] [--categories 20000] [--category-depth 6]
+                              [--products 500000] [--seed 0] [--database sqlite:///tmp/shop.sqlite3] [--delete]
+
+Without `--database` the database configured for ShopAPI is used. The database is initialized first if needed.
+The same arguments (including `--seed`) always produce the same data, use `--delete` to remove it again.
+"""
+
+import argparse
+import asyncio
+
+from benchmarks import common
+
+VOLUMES = (
+    "users",
+    "tags",
+    "categories",
+    "category_depth",
+    "tags_per_category",
+    "products",
+    "tags_per_product",
+    "seed",
+    "batch_size",
+)
+
+
+async def run(args):
+    """Initialize the database if needed and generate (or delete) synthetic data"""
+    from shopapi.helpers import synthetic  # pylint: disable=import-outside-toplevel
+    from shopapi.schemas import api, models  # pylint: disable=import-outside-toplevel
+
+    async with common.running_app() as client:
+        if not await models.Shop.is_initialized():
+            await client.get("/service/db-init")
+        if args.delete:
+            await synthetic.delete()
+            print("Synthetic data deleted")
+            return
+        volumes = {name: getattr(args, name) for name in VOLUMES if getattr(args, name) is not None}
+        params = api.SyntheticDataIn(**volumes)
+        for table, count in (await synthetic.generate(params)).items():
+            print(f"{table:<14} {count:>12.0f}")
+
+
+def main():
+    """Parse arguments and seed the database"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    for name in VOLUMES:
+        parser.add_argument(f"--{name.replace('_', '-')}", type=int, help="default: see `api.SyntheticDataIn`")
+    parser.add_argument("--database", help="tortoise db url to use instead of the configured database")
+    parser.add_argument("--delete", action="store_true", help="delete synthetic data instead of generating it")
+    args = parser.parse_args()
+    if args.database:
+        common.prepare_environment(args.database)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Compare concurrent read/write throughput of tag and category endpoints
+with the SQLite performance profile (`Config.Database.SQLite`) and with the rollback journal baseline,
+which sets the SQLite defaults explicitly (Tortoise ORM would switch to WAL on its own otherwise).
+
+Usage:
+
+    python -m benchmarks.sqlite_profile [--workers 32] [--duration 10] [--write-ratio 0.2]
+
+Each variant runs in its own process, because configuration is read once on import.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import sys
+import time
+from typing import Any, Dict
+
+from benchmarks import common
+
+VARIANTS: Dict[str, Dict[str, str]] = {
+    "rollback": {
+        "SHOPAPI__DB_SQLITE_PROFILE": "true",
+        "SHOPAPI__DB_SQLITE_JOURNAL_MODE": "DELETE",
+        "SHOPAPI__DB_SQLITE_SYNCHRONOUS": "FULL",
+        "SHOPAPI__DB_SQLITE_MMAP_SIZE": "0",
+        "SHOPAPI__DB_SQLITE_CACHE_SIZE": "-2000",
+        "SHOPAPI__DB_SQLITE_BUSY_TIMEOUT": "0",
+        "SHOPAPI__DB_SQLITE_TEMP_STORE": "DEFAULT",
+    },
+    "profile": {"SHOPAPI__DB_SQLITE_PROFILE": "true"},
+}
+
+PRAGMAS = ("journal_mode", "synchronous", "mmap_size", "cache_size", "busy_timeout", "temp_store")
+
+
+async def worker(client: common.ASGIClient, headers: Dict[str, str], args, counts: Dict[str, int], stop: float):
+    """Issue requests until `stop`, writes (tag create + delete) with probability `write_ratio`"""
+    rng = random.Random()
+    while time.perf_counter() < stop:
+        if rng.random() < args.write_ratio:
+            response = await client.post("/tag/", {"name": f"bench-{rng.getrandbits(64):x}"}, headers)
+            if response.status_code == 200:
+                await client.delete(f"/tag/{response.json()['id']}", headers)
+                counts["writes"] += 2
+            else:
+                counts["errors"] += 1
+        else:
+            url = rng.choice(["/tag/?limit=50", "/category/?limit=50", "/tag/?search=s", "/category/?search=e"])
+            response = await client.get(url)
+            counts["reads" if response.status_code == 200 else "errors"] += 1
+
+
+async def read_pragmas() -> Dict[str, Any]:
+    """Pragmas in effect on the connection of the application"""
+    from tortoise import Tortoise  # pylint: disable=import-outside-toplevel
+
+    connection = Tortoise.get_connection("default")
+    pragmas = {}
+    for pragma in PRAGMAS:
+        rows = await connection.execute_query_dict(f"PRAGMA {pragma}")
+        pragmas[pragma] = next(iter(rows[0].values())) if rows else None
+    return pragmas
+
+
+async def run_variant(args) -> Dict[str, Any]:
+    """Run the workload against a fresh database in the current process"""
+    common.prepare_environment(env=VARIANTS[args.variant])
+    async with common.running_app() as client:
+        headers = await common.seed(client)
+        pragmas = await read_pragmas()
+        counts = {"reads": 0, "writes": 0, "errors": 0}
+        started = time.perf_counter()
+        stop = started + args.duration
+        await asyncio.gather(*[worker(client, headers, args, counts, stop) for _ in range(args.workers)])
+        elapsed = time.perf_counter() - started
+    return {
+        "variant": args.variant,
+        "reads_per_second": counts["reads"] / elapsed,
+        "writes_per_second": counts["writes"] / elapsed,
+        "errors": counts["errors"],
+        "pragmas": pragmas,
+    }
+
+
+def main():
+    """Run both variants in subprocesses and print comparison"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    parser.add_argument("--variant", choices=list(VARIANTS), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.variant:
+        print(json.dumps(asyncio.run(run_variant(args))))
+        return
+    results = []
+    for variant in VARIANTS:
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.sqlite_profile", *sys.argv[1:], "--variant", variant],
+            check=True,
+            stdout=subprocess.PIPE,
+            text=True,
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    print(f"{'variant':<10} {'reads/s':>12} {'writes/s':>12} {'errors':>8}")
+    for result in results:
+        print(
+            f"{result['variant']:<10} {result['reads_per_second']:>12.1f} "
+            f"{result['writes_per_second']:>12.1f} {result['errors']:>8}"
+        )
+    for result in results:
+        pragmas = ", ".join(f"{name}={value}" for name, value in result["pragmas"].items())
+        print(f"{result['variant']:<10} {pragmas}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,13 +4,32 @@
 import logging
 from fastapi import FastAPI
 
+from tortoise import Tortoise
 from tortoise.contrib.fastapi import register_tortoise
+from tortoise.utils import generate_schema_for_client
 
 from shopapi import routers
-from shopapi.config import build_db_url
+from shopapi.config import Config, build_db_connections
+from shopapi.helpers import (
+    dbhooks,
+    jobs,
+    loadshedding,
+    logs,
+    metrics,
+    profiling,
+    querydebug,
+    requestcontext,
+    slowlog,
+    tracing,
+)
 
-# TODO: Logging from config to keep everything in one place?
-logging.basicConfig(format="[%(asctime)s] <%(name)s> %(levelname)s: %(message)s", level=logging.INFO)
+logs.setup(
+    Config.Logging.level,
+    Config.Logging.output,
+    Config.Logging.queue_size,
+    Config.Logging.rate_limit_burst,
+    Config.Logging.rate_limit_seconds,
+)
 logger = logging.getLogger(__name__)
 
 
@@ -21,6 +40,8 @@ tags = [
     {"name": "Roles", "description": "Endpoints used to manage user roles"},
     {"name": "Categories", "description": "Categories allow basic products differentiation."},
     {"name": "Tags", "description": "Tags allow better products and categories sub-categorization."},
+    {"name": "Events", "description": "Server-sent event streams of catalog changes."},
+    {"name": "Batch", "description": "Several operations executed in a single round-trip."},
     {"name": "Service", "description": "Service endpoint used to manager ShopAPI environment and deployment."},
 ]
 
@@ -47,5 +68,63 @@ app.include_router(routers.service.router)
 app.include_router(routers.role.router)
 app.include_router(routers.tag.router)
 app.include_router(routers.category.router)
+app.include_router(routers.events.router)
+app.include_router(routers.batch.router)
+
+register_tortoise(
+    app,
+    config={
+        "connections": build_db_connections(),
+        "apps": {"models": {"models": ["shopapi.schemas.models"], "default_connection": "default"}},
+    },
+)
+
+
+@app.on_event("startup")
+async def generate_schemas():
+    """Generate schemas on the primary database only, read replicas receive them via replication"""
+    await generate_schema_for_client(Tortoise.get_connection("default"), safe=True)
+
+
+if Config.SlowQueries.enabled:
+    dbhooks.add_listener(slowlog.record_query)
+
+# innermost, so that shed requests are still measured and traced
+if Config.LoadShedding.enabled:
+    app.add_middleware(loadshedding.LoadSheddingMiddleware)
+
+if Config.Metrics.enabled:
+    app.add_middleware(metrics.MetricsMiddleware)
+    dbhooks.add_listener(metrics.observe_query)
+
+if Config.Debug.enabled:
+    app.add_middleware(querydebug.QueryDebugMiddleware)
+    dbhooks.add_listener(querydebug.record_query)
+
+if Config.Profiling.enabled:
+    app.add_middleware(profiling.ProfilingMiddleware)
+    dbhooks.add_listener(profiling.record_query)
+
+if tracing.exporter is not None:
+    app.add_middleware(tracing.TracingMiddleware)
+    dbhooks.add_listener(tracing.record_query)
+
+app.add_middleware(requestcontext.RequestContextMiddleware)
+
+
+@app.on_event("startup")
+async def install_db_hooks():
+    """Hook database clients once Tortoise has loaded its backends"""
+    dbhooks.install()
+
+
+@app.on_event("startup")
+async def start_jobs():
+    """Start background job workers"""
+    await jobs.start()
+
 
-register_tortoise(app, db_url=build_db_url(), modules={"models": ["shopapi.schemas.models"]}, generate_schemas=True)
+@app.on_event("shutdown")
+async def stop_jobs():
+    """Stop background job workers, interrupted jobs are marked as failed on the next start"""
+    await jobs.stop()
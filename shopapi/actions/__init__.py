@@ -6,3 +6,4 @@ from shopapi.actions import user
 from shopapi.actions import tag
 from shopapi.actions import role
 from shopapi.actions import category
+from shopapi.actions import jobs
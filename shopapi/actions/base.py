@@ -2,16 +2,35 @@
 """
 
 import logging
-from typing import Dict, List, Optional, Type, NamedTuple
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Sequence, Tuple, Type, NamedTuple, TypeVar
 
+from starlette.responses import Response
+from tortoise.backends.base.client import BaseDBAsyncClient
 from tortoise.exceptions import DoesNotExist, IntegrityError
+from tortoise.transactions import in_transaction
 
 from shopapi.schemas import schemas, base
 from shopapi.schemas.base import BaseModelTortoise, ORMBase
-from shopapi.helpers import dependencies as deps, exceptions, utils
+from shopapi.helpers import (
+    autocomplete,
+    changes,
+    dependencies as deps,
+    events,
+    exceptions,
+    identitymap,
+    replicas,
+    requestcontext,
+    rows,
+    singleflight,
+    utils,
+)
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
+MISSING_IDS_HEADER = "X-Missing-Ids"
+
 
 class RoleTuple(NamedTuple):
     """NamedTuple containing role type and permission that was split from str"""
@@ -68,6 +87,11 @@ class ResourceOperator:
         "delete": ["delete"],
     }
     related_fields: Dict[str, base.ModelDefinition] = {}
+    prefix_index: Optional[autocomplete.PrefixIndex] = None
+    publish_events: bool = False
+    # models embedding the resource in their schemas by the name of the relation, e.g. tags of categories,
+    # their rows are marked as changed in the change feed when the resource is updated or deleted
+    embedded_in: Dict[Type[BaseModelTortoise], str] = {}
 
     def check_roles(self, role: Optional[schemas.Role], operation: Optional[str] = None):
         """Raise `InsufficientPermissions` exception if the current `role`
@@ -91,90 +115,251 @@ class ResourceOperator:
             raise exceptions.InsufficientPermissions([str(r) for r in required_roles])
         return
 
+    async def coalesce(
+        self, operation: str, key: Hashable, role: Optional[schemas.Role], fetch: Callable[[], Awaitable[T]]
+    ) -> T:
+        """Share result of `fetch` with identical concurrent reads, i.e. with the same `operation`, `key` and role.
+        Reads pinned to the primary (after a write) are never coalesced, so that they see their own writes.
+        """
+        if replicas.primary_pinned():
+            return await fetch()
+        return await singleflight.group.do(
+            f"{self.__class__.__name__}.{operation}", (key, role.id if role else None), fetch
+        )
+
+    async def touch_embedding(self, resource_id: int, connection: BaseDBAsyncClient):
+        """Mark rows embedding resource `resource_id` (see `embedded_in`) as changed within transaction `connection`"""
+        for model, relation in self.embedded_in.items():
+            await changes.touch(model, connection, **{f"{relation}__id": resource_id})
+
+    def index(self, resource_db: BaseModelTortoise):
+        """Update autocomplete index (if any) with created or updated `resource_db`"""
+        if self.prefix_index is not None:
+            self.prefix_index.add(resource_db.id, getattr(resource_db, self.prefix_index.field))
+
+    def publish(self, action: str, resource: Optional[ORMBase] = None, resource_id: Optional[int] = None):
+        """Publish `action` event with `resource` (or just its id) to the event stream if `publish_events` is set"""
+        if self.publish_events:
+            events.publish(self.resource.lower(), action, resource.json() if resource else None, resource_id)
+
+    @requestcontext.tracked
+    async def suggest(
+        self, prefix: str, limit: int = 10, role: Optional[schemas.Role] = None
+    ) -> List[schemas.Suggestion]:
+        """Return up to `limit` resources with a word starting with `prefix` from in-memory `prefix_index`"""
+        self.check_roles(role, "list")
+        if self.prefix_index is None:
+            raise exceptions.InvalidOperation(detail=f"{self.resource} does not support autocomplete")
+        return [
+            schemas.Suggestion(id=item_id, text=text)
+            for item_id, text in await self.prefix_index.search(prefix, limit)
+        ]
+
+    @requestcontext.tracked
     async def mlist(self, common: deps.QueryParams, role: Optional[schemas.Role] = None) -> List[BaseModelTortoise]:
         """List resources and do not convert them to Pydantic"""
         self.check_roles(role, "list")
         query = utils.build_search_query(common, self.model)
-        return (
-            await self.model.filter(query)
+        return await replicas.router.read(
+            lambda db: self.model.filter(query)
+            .using_db(db)
             .prefetch_related(*self.related_fields)
             .limit(common.limit)
             .offset(common.offset)
         )
 
-    async def list(self, common: deps.QueryParams, role: Optional[schemas.Role] = None) -> List[ORMBase]:
+    @requestcontext.tracked
+    async def mlist_rows(self, common: deps.QueryParams, role: Optional[schemas.Role] = None) -> List[Any]:
+        """List resources like `mlist`, but as read-only rows with `related_fields` fetched in bulk, see `rows.fetch`.
+        Rows are much cheaper than model instances, use them whenever the resources are only converted to schemas.
+        """
+        self.check_roles(role, "list")
+        query = utils.build_search_query(common, self.model)
+        return await replicas.router.read(
+            lambda db: rows.fetch(
+                self.model.filter(query).limit(common.limit).offset(common.offset), list(self.related_fields), db
+            )
+        )
+
+    @requestcontext.tracked
+    async def list(
+        self, common: deps.QueryParams, role: Optional[schemas.Role] = None, response: Optional[Response] = None
+    ) -> List[ORMBase]:
         """List resources `model` from database based on `common` query parameters.
         If the current `role` does not conform with combination of `role_name`
         and `permissions[operation]` permissions, `InsufficientPermissions` exception is raised.
+        Concurrent identical calls share a single query, see `coalesce`.
+
+        If `common.ids` are given, resources with these ids are returned in the same order, see `get_many`,
+        ids that were not found are listed in `X-Missing-Ids` header of `response`.
 
         Returns list of specified `schema` instances.
         """
-        resources_db = await self.mlist(common, role)
-        return [self.schema.from_orm(resource) for resource in resources_db]
+        if common.ids:
+            resources, missing = await self.get_many(common.ids, role)
+            if missing and response is not None:
+                response.headers[MISSING_IDS_HEADER] = ",".join(str(resource_id) for resource_id in missing)
+            return resources
+
+        async def fetch() -> List[ORMBase]:
+            resources = await self.mlist_rows(common, role)
+            return [self.schema.trusted(resource) for resource in resources]
+
+        # search is case-insensitive, so the case does not need to be part of the key
+        key = common._replace(search=common.search.lower()) if common.search else common
+        return await self.coalesce("list", key, role, fetch)
+
+    @requestcontext.tracked
+    async def changes(
+        self, sync_token: Optional[str] = None, limit: int = 100, role: Optional[schemas.Role] = None
+    ) -> schemas.Changes:
+        """Return resources created or updated and ids of resources deleted since `sync_token`
+        (all current resources if it is None), see `changes.changes_since`.
+        Clients repeat the call with the returned `sync_token` while `has_more` is set.
+        """
+        self.check_roles(role, "list")
+        changed, deleted, token, has_more = await changes.changes_since(
+            self.model, sync_token, limit, list(self.related_fields)
+        )
+        return schemas.Changes(
+            changed=[self.schema.trusted(resource) for resource in changed],
+            deleted=deleted,
+            sync_token=token,
+            has_more=has_more,
+        )
 
+    @requestcontext.tracked
     async def mget(self, resource_id: int, role: Optional[schemas.Role] = None) -> BaseModelTortoise:
-        """Get single resource from database and do not convert it to pydantic schema"""
+        """Get single resource from database (or from the request identity map, see `identitymap`)
+        and do not convert it to pydantic schema
+        """
         self.check_roles(role, "get")
-        try:
-            resource_db = await self.model.get(id=resource_id)
-            await resource_db.fetch_related(*self.related_fields)
+
+        async def fetch(db: BaseDBAsyncClient) -> BaseModelTortoise:
+            resource_db = await identitymap.get(self.model, resource_id, db)
+            await resource_db.fetch_related(*self.related_fields, using_db=db)
             return resource_db
+
+        try:
+            return await replicas.router.read(fetch)
         except DoesNotExist:
             raise exceptions.ResourceNotFound(self.resource, resource_id)
 
+    @requestcontext.tracked
     async def get(self, resource_id: int, role: Optional[schemas.Role] = None) -> ORMBase:
         """Get single resource from database based on `model`.
         Raises `InsufficientPermissions` exception if role does not conform.
         Raises `ResourceNotFound` exception if the resource is not found by its `resource_id`.
 
+        Concurrent identical calls share a single query, see `coalesce`.
+
         Returns resource as `response_model`.
         """
-        resource_db = await self.mget(resource_id, role)
-        return self.schema.from_orm(resource_db)
 
+        async def fetch() -> ORMBase:
+            return self.schema.trusted(await self.mget(resource_id, role))
+
+        return await self.coalesce("get", resource_id, role, fetch)
+
+    @requestcontext.tracked
+    async def mget_many(
+        self, resource_ids: Sequence[int], role: Optional[schemas.Role] = None
+    ) -> Tuple[List[BaseModelTortoise], List[int]]:
+        """Get resources by their ids using one query plus one query per related field,
+        do not convert them to pydantic schema.
+        Returns resources in the order of `resource_ids` (without duplicates) and list of ids that were not found.
+        """
+        self.check_roles(role, "get")
+        unique_ids = list(dict.fromkeys(resource_ids))
+        resources_db = await replicas.router.read(
+            lambda db: self.model.filter(id__in=unique_ids).using_db(db).prefetch_related(*self.related_fields)
+        )
+        by_id: Dict[int, BaseModelTortoise] = {resource.pk: resource for resource in resources_db}
+        found = [by_id[resource_id] for resource_id in unique_ids if resource_id in by_id]
+        missing = [resource_id for resource_id in unique_ids if resource_id not in by_id]
+        return found, missing
+
+    @requestcontext.tracked
+    async def get_many(
+        self, resource_ids: Sequence[int], role: Optional[schemas.Role] = None
+    ) -> Tuple[List[ORMBase], List[int]]:
+        """Get resources by their ids as `schema` instances, see `mget_many`"""
+
+        async def fetch() -> Tuple[List[ORMBase], List[int]]:
+            resources_db, missing = await self.mget_many(resource_ids, role)
+            return [self.schema.trusted(resource) for resource in resources_db], missing
+
+        return await self.coalesce("get_many", tuple(resource_ids), role, fetch)
+
+    @requestcontext.tracked
     async def create(self, resource: schemas.BaseModel, role: Optional[schemas.Role] = None) -> ORMBase:
         """Create resource defined by `resource` schema in the db and return it"""
         self.check_roles(role, "create")
+        replicas.pin_primary()
         try:
-            resource_db = await self.model.create(**resource.dict(exclude_none=True))
+            resource_db = identitymap.remember(await self.model.create(**resource.dict(exclude_none=True)))
             await resource_db.fetch_related(*self.related_fields)
-            return self.schema.from_orm(resource_db)
+            self.index(resource_db)
+            created = self.schema.trusted(resource_db)
         except IntegrityError as error:
             logger.error(error)
             raise exceptions.ResourceExistsException(detail=f"{self.resource} already exists in the database")
+        self.publish("create", created)
+        return created
 
+    @requestcontext.tracked
     async def update(
         self, resource_id: int, resource: schemas.BaseModel, role: Optional[schemas.Role] = None
     ) -> ORMBase:
         """Update resource defined by `resource_id` and schema `resource` in the db and return it"""
         self.check_roles(role, "update")
+        replicas.pin_primary()
         try:
-            resource_db = await self.model.get(id=resource_id)
+            resource_db = await identitymap.get(self.model, resource_id)
             await resource_db.fetch_related(*self.related_fields)
         except DoesNotExist:
             raise exceptions.ResourceNotFound(self.resource, resource_id)
         try:
             await resource_db.update_from_dict(resource.dict(exclude_none=True))
-            await resource_db.save()
+            async with in_transaction() as connection:
+                await resource_db.save(using_db=connection)
+                await self.touch_embedding(resource_id, connection)
             await resource_db.fetch_related(*self.related_fields)
-            return self.schema.from_orm(resource_db)
+            self.index(resource_db)
+            updated = self.schema.trusted(resource_db)
         except IntegrityError:
+            # the instance holds values that were not saved
+            identitymap.forget(self.model, resource_id)
             raise exceptions.ResourceExistsException(detail=f"{self.resource} already exists in the database")
+        self.publish("update", updated)
+        return updated
 
+    @requestcontext.tracked
     async def delete(self, resource_id: int, role: Optional[schemas.Role] = None):
         """Delete resource with id `resource_id` from the db."""
         self.check_roles(role, "delete")
-        try:
-            resource_db = await self.model.get(id=resource_id)
-            await resource_db.delete()
-        except DoesNotExist:
+        replicas.pin_primary()
+        async with in_transaction() as connection:
+            await self.touch_embedding(resource_id, connection)
+            deleted = await changes.delete_tracked(self.model, connection, id=resource_id)
+        if not deleted:
             raise exceptions.ResourceNotFound(self.resource, resource_id)
+        for deleted_model, deleted_ids in deleted.items():
+            for deleted_id in deleted_ids:
+                identitymap.forget(deleted_model, deleted_id)
+        # rows of the same model removed by cascades, e.g. child categories
+        for deleted_id in sorted(deleted[self.model]):
+            if self.prefix_index is not None:
+                self.prefix_index.remove(deleted_id)
+            self.publish("delete", resource_id=deleted_id)
 
+    @requestcontext.tracked
     async def add_related(
         self, resource_id: int, related_id: int, related_resource: str, role: Optional[schemas.Role] = None
     ) -> List[ORMBase]:
         """Add {related_id} to attribute {related_resource} of {resource_id}"""
         self.check_roles(role, "update")
+        replicas.pin_primary()
         related_definition = self.related_fields[related_resource]
         rmodel, rschema = related_definition.model, related_definition.schema
         try:
@@ -182,15 +367,21 @@ class ResourceOperator:
         except DoesNotExist:
             raise exceptions.ResourceNotFound(str(rmodel), related_id)
         resource_db = await self.mget(resource_id)
-        await getattr(resource_db, related_resource).add(related_db)
+        async with in_transaction() as connection:
+            await getattr(resource_db, related_resource).add(related_db, using_db=connection)
+            # the link is part of the resource, so it has to show up in the change feed
+            await resource_db.save(using_db=connection, update_fields=["updated_at"])
         await resource_db.fetch_related(related_resource)
-        return [rschema.from_orm(nested) for nested in getattr(resource_db, related_resource)]
+        self.publish("update", self.schema.trusted(resource_db))
+        return [rschema.trusted(nested) for nested in getattr(resource_db, related_resource)]
 
+    @requestcontext.tracked
     async def remove_related(
         self, resource_id: int, related_id: int, related_resource: str, role: Optional[schemas.Role] = None
     ) -> List[ORMBase]:
         """Remove {related_id} from attribute {related_resource} of {resource_id}"""
         self.check_roles(role, "update")
+        replicas.pin_primary()
         related_definition = self.related_fields[related_resource]
         rmodel, rschema = related_definition.model, related_definition.schema
         try:
@@ -198,6 +389,10 @@ class ResourceOperator:
         except DoesNotExist:
             raise exceptions.ResourceNotFound(str(rmodel), related_id)
         resource_db = await self.mget(resource_id)
-        await getattr(resource_db, related_resource).remove(related_db)
+        async with in_transaction() as connection:
+            await getattr(resource_db, related_resource).remove(related_db, using_db=connection)
+            # the link is part of the resource, so it has to show up in the change feed
+            await resource_db.save(using_db=connection, update_fields=["updated_at"])
         await resource_db.fetch_related(related_resource)
-        return [rschema.from_orm(nested) for nested in getattr(resource_db, related_resource)]
+        self.publish("update", self.schema.trusted(resource_db))
+        return [rschema.trusted(nested) for nested in getattr(resource_db, related_resource)]
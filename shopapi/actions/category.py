@@ -4,6 +4,7 @@
 from shopapi.schemas import schemas, models
 from shopapi.schemas.base import ModelDefinition
 from shopapi.actions.base import ResourceOperator
+from shopapi.helpers import autocomplete
 
 
 class CategoryOperator(ResourceOperator):
@@ -17,3 +18,6 @@ class CategoryOperator(ResourceOperator):
         "tags": ModelDefinition(models.Tag, schemas.Tag),
         "parent_category": ModelDefinition(models.Category, schemas.Category),
     }
+    prefix_index = autocomplete.PrefixIndex(models.Category, "title")
+    publish_events = True
+    embedded_in = {models.Category: "parent_category"}
@@ -0,0 +1,33 @@
+"""Background job handlers, see `helpers.jobs`
+"""
+
+from typing import Any, Dict
+
+from shopapi.actions import user
+from shopapi.helpers import autocomplete, jobs, synthetic
+from shopapi.schemas import api
+
+
+@jobs.register("synthetic-data")
+async def synthetic_data(params: Dict[str, Any], progress: jobs.Progress) -> Dict[str, float]:
+    """Generate synthetic data, params as `api.SyntheticDataIn`"""
+    result = await synthetic.generate(api.SyntheticDataIn(**params), progress)
+    autocomplete.invalidate_all()
+    return result
+
+
+@jobs.register("synthetic-data-delete")
+async def synthetic_data_delete(_params: Dict[str, Any], _progress: jobs.Progress):
+    """Delete synthetic data"""
+    await synthetic.delete()
+    autocomplete.invalidate_all()
+
+
+@jobs.register("user-purge")
+async def user_purge(params: Dict[str, Any], progress: jobs.Progress) -> Dict[str, int]:
+    """Completely purge users with ids in `user_ids` param"""
+    user_ids = [int(user_id) for user_id in params.get("user_ids", [])]
+    for index, user_id in enumerate(user_ids):
+        await user.user_delete(user_id)
+        await progress((index + 1) / len(user_ids), f"Purged user {user_id}")
+    return {"purged": len(user_ids)}
@@ -3,6 +3,7 @@
 
 from shopapi.schemas import schemas, models
 from shopapi.actions.base import ResourceOperator
+from shopapi.helpers import autocomplete
 
 
 class TagOperator(ResourceOperator):
@@ -12,3 +13,6 @@ class TagOperator(ResourceOperator):
     model = models.Tag
     schema = schemas.Tag
     role_name = "tags"
+    prefix_index = autocomplete.PrefixIndex(models.Tag, "name")
+    publish_events = True
+    embedded_in = {models.Category: "tags"}
@@ -7,10 +7,11 @@ from datetime import timedelta
 from typing import Optional
 from starlette.responses import JSONResponse, RedirectResponse, Response
 from tortoise.exceptions import IntegrityError
+from tortoise.transactions import in_transaction
 
 from shopapi.actions.base import ResourceOperator
 from shopapi.schemas import schemas, models, api
-from shopapi.helpers import exceptions, security
+from shopapi.helpers import changes, exceptions, security, tracing
 from shopapi.config import Config
 
 logger = logging.getLogger(__name__)
@@ -32,7 +33,7 @@ async def load_openid(openid: schemas.OpenID) -> Optional[schemas.OpenIDFromDB]:
     ).first()
     if not oid:
         return None
-    return schemas.OpenIDFromDB.from_orm(oid)
+    return schemas.OpenIDFromDB.trusted(oid)
 
 
 async def get_user_by_openid(openid: schemas.OpenID) -> Optional[schemas.UserFromDB]:
@@ -43,10 +44,11 @@ async def get_user_by_openid(openid: schemas.OpenID) -> Optional[schemas.UserFro
     user = await models.User.get(id=oid.user_id)
     await user.fetch_related("role")
     if user:
-        return schemas.UserFromDB.from_orm(user)
+        return schemas.UserFromDB.trusted(user)
     return None
 
 
+@tracing.traced()
 async def get_or_create_user(openid: schemas.OpenID) -> schemas.UserFromDB:
     """Get user from database based on openid provider information.
     If the user does not exist, it is created first
@@ -69,7 +71,7 @@ async def get_or_create_user(openid: schemas.OpenID) -> schemas.UserFromDB:
     user_db = await models.User.create(**user_input.dict(exclude_none=True))
     await user_db.fetch_related("role")
     await models.OpenID.create(**openid.dict(exclude_none=True), user_id=user_db.id)
-    return schemas.UserFromDB.from_orm(user_db)
+    return schemas.UserFromDB.trusted(user_db)
 
 
 async def create_user(user: api.LoginUserIn) -> schemas.UserFromDB:
@@ -84,10 +86,11 @@ async def create_user(user: api.LoginUserIn) -> schemas.UserFromDB:
     except IntegrityError:
         raise exceptions.UserAlreadyExists(user.email)
     await user_model.fetch_related("role")
-    userdb = schemas.UserFromDB.from_orm(user_model)
+    userdb = schemas.UserFromDB.trusted(user_model)
     return userdb
 
 
+@tracing.traced()
 async def login_user(
     user: schemas.UserFromDB,
     permanent: bool = False,
@@ -119,6 +122,7 @@ async def login_user(
     return response
 
 
+@tracing.traced()
 async def user_add_openid(openid: schemas.OpenID, user_id: int):
     """Add another openid for existing user"""
     openid.user_id = user_id
@@ -143,12 +147,11 @@ async def get_user_by_email(email: str) -> Optional[schemas.UserFromDB]:
     if not user:
         return None
     await user.fetch_related("role")
-    return schemas.UserFromDB.from_orm(user)
+    return schemas.UserFromDB.trusted(user)
 
 
 async def user_delete(user_id: int):
     """Performs all actions needed to completely purge user from database"""
-    user = await models.User.get(id=user_id)
-    if not user:
-        raise exceptions.ResourceNotFound("user", user_id)
-    await user.delete()
+    async with in_transaction() as connection:
+        if not await changes.delete_tracked(models.User, connection, id=user_id):
+            raise exceptions.ResourceNotFound("user", user_id)
@@ -3,8 +3,9 @@
 
 import os
 from base64 import b64encode
+from urllib.parse import urlencode
 
-from typing import Any, List, Optional, Type
+from typing import Any, Dict, List, Optional, Type
 import config_proxy
 
 from dotenv import load_dotenv
@@ -45,6 +46,35 @@ class IntProperty(config_proxy.IntProperty):
     ):
         super().__init__(path=path, env=env, default=default, proxy=proxy)
 
+    @property
+    def value(self) -> Optional[int]:
+        value = super().get_value(use_list=False)
+        return None if value is None else int(value)
+
+    @property
+    def fvalue(self) -> int:
+        return int(super().get_value(use_list=False, forced=True))
+
+
+class ListOfStringsProperty(config_proxy.ListOfStringsProperty):
+    """ListOfStringsProperty, environmental variable is expected to be comma-separated"""
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        env: Optional[str] = None,
+        default: Optional[Any] = None,
+        proxy: Type[config_proxy.ConfigProxy] = ConfigProxy,
+    ):
+        super().__init__(path=path, env=env, default=default, proxy=proxy)
+
+    @property
+    def value(self) -> List[str]:
+        value = super().get_value(use_list=True)
+        if isinstance(value, str):
+            return [item.strip() for item in value.split(",") if item.strip()]
+        return value
+
 
 class BoolProperty(config_proxy.ConfigProperty):
     """BoolProperty"""
@@ -60,7 +90,14 @@ class BoolProperty(config_proxy.ConfigProperty):
 
     @property
     def value(self) -> bool:
-        return super().get_value(use_list=False)
+        value = super().get_value(use_list=False)
+        if isinstance(value, str):
+            return value.lower() in ("yes", "true", "1")
+        return bool(value)
+
+    @property
+    def fvalue(self) -> bool:
+        return self.value
 
 
 class Config:
@@ -83,6 +120,142 @@ class Config:
         password = StringProperty("database.password", "SHOPAPI__DB_PASS").value
         database = StringProperty("database.database", "SHOPAPI__DB_NAME", "shopapi").fvalue
         uri = StringProperty("database.uri", "SHOPAPI__DB_URI", None).value
+        replicas = ListOfStringsProperty("database.replicas[*]", "SHOPAPI__DB_REPLICAS").value
+        replica_eject_seconds = IntProperty(
+            "database.replica_eject_seconds", "SHOPAPI__DB_REPLICA_EJECT_SECONDS", 30
+        ).fvalue
+
+        class SQLite:
+            """SQLite performance profile, applied as pragmas on connection init"""
+
+            enabled = BoolProperty("database.sqlite.enabled", "SHOPAPI__DB_SQLITE_PROFILE", True).fvalue
+            journal_mode = StringProperty(
+                "database.sqlite.journal_mode", "SHOPAPI__DB_SQLITE_JOURNAL_MODE", "WAL"
+            ).fvalue
+            synchronous = StringProperty(
+                "database.sqlite.synchronous", "SHOPAPI__DB_SQLITE_SYNCHRONOUS", "NORMAL"
+            ).fvalue
+            mmap_size = IntProperty("database.sqlite.mmap_size", "SHOPAPI__DB_SQLITE_MMAP_SIZE", 268435456).fvalue
+            cache_size = IntProperty("database.sqlite.cache_size", "SHOPAPI__DB_SQLITE_CACHE_SIZE", -65536).fvalue
+            busy_timeout = IntProperty("database.sqlite.busy_timeout", "SHOPAPI__DB_SQLITE_BUSY_TIMEOUT", 5000).fvalue
+            temp_store = StringProperty("database.sqlite.temp_store", "SHOPAPI__DB_SQLITE_TEMP_STORE", "MEMORY").fvalue
+
+    class Jobs:
+        """Background jobs settings"""
+
+        workers = IntProperty("jobs.workers", "SHOPAPI__JOBS_WORKERS", 2).fvalue
+        queue_size = IntProperty("jobs.queue_size", "SHOPAPI__JOBS_QUEUE_SIZE", 100).fvalue
+        heartbeat_seconds = IntProperty("jobs.heartbeat_seconds", "SHOPAPI__JOBS_HEARTBEAT_SECONDS", 15).fvalue
+
+    class Autocomplete:
+        """In-memory autocomplete index settings"""
+
+        refresh_seconds = IntProperty(
+            "autocomplete.refresh_seconds", "SHOPAPI__AUTOCOMPLETE_REFRESH_SECONDS", 300
+        ).fvalue
+
+    class Events:
+        """Server-sent event stream settings"""
+
+        queue_size = IntProperty("events.queue_size", "SHOPAPI__EVENTS_QUEUE_SIZE", 100).fvalue
+        max_subscribers = IntProperty("events.max_subscribers", "SHOPAPI__EVENTS_MAX_SUBSCRIBERS", 10000).fvalue
+        keepalive_seconds = IntProperty("events.keepalive_seconds", "SHOPAPI__EVENTS_KEEPALIVE_SECONDS", 15).fvalue
+
+    class Tracing:
+        """Request tracing settings"""
+
+        enabled = BoolProperty("tracing.enabled", "SHOPAPI__TRACING_ENABLED", True).fvalue
+        sample_percent = IntProperty("tracing.sample_percent", "SHOPAPI__TRACING_SAMPLE_PERCENT", 1).fvalue
+        trust_traceparent = BoolProperty(
+            "tracing.trust_traceparent", "SHOPAPI__TRACING_TRUST_TRACEPARENT", False
+        ).fvalue
+        exporter = StringProperty("tracing.exporter", "SHOPAPI__TRACING_EXPORTER", "memory").fvalue
+        file = StringProperty("tracing.file", "SHOPAPI__TRACING_FILE", "traces.jsonl").fvalue
+        keep = IntProperty("tracing.keep", "SHOPAPI__TRACING_KEEP", 100).fvalue
+        max_spans = IntProperty("tracing.max_spans", "SHOPAPI__TRACING_MAX_SPANS", 1000).fvalue
+
+    class Coalescing:
+        """Single-flight coalescing of identical concurrent reads"""
+
+        enabled = BoolProperty("coalescing.enabled", "SHOPAPI__COALESCING_ENABLED", True).fvalue
+
+    class Logging:
+        """Logging settings"""
+
+        level = StringProperty("logging.level", "SHOPAPI__LOGGING_LEVEL", "INFO").fvalue
+        output = StringProperty("logging.output", "SHOPAPI__LOGGING_OUTPUT", "text").fvalue
+        queue_size = IntProperty("logging.queue_size", "SHOPAPI__LOGGING_QUEUE_SIZE", 10000).fvalue
+        rate_limit_burst = IntProperty("logging.rate_limit_burst", "SHOPAPI__LOGGING_RATE_LIMIT_BURST", 10).fvalue
+        rate_limit_seconds = IntProperty(
+            "logging.rate_limit_seconds", "SHOPAPI__LOGGING_RATE_LIMIT_SECONDS", 60
+        ).fvalue
+
+    class Metrics:
+        """Metrics settings"""
+
+        enabled = BoolProperty("metrics.enabled", "SHOPAPI__METRICS_ENABLED", True).fvalue
+
+    class Debug:
+        """Debug mode settings"""
+
+        enabled = BoolProperty("debug.enabled", "SHOPAPI__DEBUG", False).fvalue
+        query_budget = IntProperty("debug.query_budget", "SHOPAPI__DEBUG_QUERY_BUDGET", 20).fvalue
+        repeated_query_threshold = IntProperty(
+            "debug.repeated_query_threshold", "SHOPAPI__DEBUG_REPEATED_QUERY_THRESHOLD", 3
+        ).fvalue
+
+    class Profiling:
+        """On-demand request profiling settings"""
+
+        enabled = BoolProperty("profiling.enabled", "SHOPAPI__PROFILING_ENABLED", True).fvalue
+        interval_ms = IntProperty("profiling.interval_ms", "SHOPAPI__PROFILING_INTERVAL_MS", 2).fvalue
+        keep = IntProperty("profiling.keep", "SHOPAPI__PROFILING_KEEP", 20).fvalue
+        directory = StringProperty("profiling.directory", "SHOPAPI__PROFILING_DIRECTORY").value
+
+    class LoadShedding:
+        """Concurrency limits and load shedding per route class"""
+
+        enabled = BoolProperty("load_shedding.enabled", "SHOPAPI__LOAD_SHEDDING_ENABLED", True).fvalue
+        queue_timeout_ms = IntProperty(
+            "load_shedding.queue_timeout_ms", "SHOPAPI__LOAD_SHEDDING_QUEUE_TIMEOUT_MS", 2000
+        ).fvalue
+        retry_after = IntProperty("load_shedding.retry_after", "SHOPAPI__LOAD_SHEDDING_RETRY_AFTER", 1).fvalue
+        auth_routes = ListOfStringsProperty(
+            "load_shedding.auth_routes[*]", "SHOPAPI__LOAD_SHEDDING_AUTH_ROUTES"
+        ).value or ["auth_login", "auth_register", "user_create"]
+        exempt_routes = ListOfStringsProperty(
+            "load_shedding.exempt_routes[*]", "SHOPAPI__LOAD_SHEDDING_EXEMPT_ROUTES"
+        ).value or ["events_stream", "service_metrics"]
+        auth_concurrency = IntProperty(
+            "load_shedding.auth_concurrency", "SHOPAPI__LOAD_SHEDDING_AUTH_CONCURRENCY", 2
+        ).fvalue
+        auth_queue = IntProperty("load_shedding.auth_queue", "SHOPAPI__LOAD_SHEDDING_AUTH_QUEUE", 16).fvalue
+        read_concurrency = IntProperty(
+            "load_shedding.read_concurrency", "SHOPAPI__LOAD_SHEDDING_READ_CONCURRENCY", 64
+        ).fvalue
+        read_queue = IntProperty("load_shedding.read_queue", "SHOPAPI__LOAD_SHEDDING_READ_QUEUE", 256).fvalue
+        write_concurrency = IntProperty(
+            "load_shedding.write_concurrency", "SHOPAPI__LOAD_SHEDDING_WRITE_CONCURRENCY", 16
+        ).fvalue
+        write_queue = IntProperty("load_shedding.write_queue", "SHOPAPI__LOAD_SHEDDING_WRITE_QUEUE", 64).fvalue
+
+    class Batch:
+        """Batch endpoint settings"""
+
+        max_operations = IntProperty("batch.max_operations", "SHOPAPI__BATCH_MAX_OPERATIONS", 50).fvalue
+        concurrency = IntProperty("batch.concurrency", "SHOPAPI__BATCH_CONCURRENCY", 8).fvalue
+
+    class Memory:
+        """Memory diagnostics settings"""
+
+        trace_frames = IntProperty("memory.trace_frames", "SHOPAPI__MEMORY_TRACE_FRAMES", 16).fvalue
+
+    class SlowQueries:
+        """Slow query log settings"""
+
+        enabled = BoolProperty("slow_queries.enabled", "SHOPAPI__SLOW_QUERIES_ENABLED", True).fvalue
+        threshold_ms = IntProperty("slow_queries.threshold_ms", "SHOPAPI__SLOW_QUERIES_THRESHOLD_MS", 100).fvalue
+        keep = IntProperty("slow_queries.keep", "SHOPAPI__SLOW_QUERIES_KEEP", 500).fvalue
 
     class SSO:
         """SSO Settings"""
@@ -102,15 +275,41 @@ class Config:
         ).value
 
 
+def build_sqlite_pragmas() -> Dict[str, Any]:
+    """Build SQLite pragmas of the performance profile from Config object.
+    Tortoise orm runs every query parameter of sqlite url as `PRAGMA key=value` when the connection is created.
+    """
+    return {
+        "journal_mode": Config.Database.SQLite.journal_mode,
+        "synchronous": Config.Database.SQLite.synchronous,
+        "mmap_size": Config.Database.SQLite.mmap_size,
+        "cache_size": Config.Database.SQLite.cache_size,
+        "busy_timeout": Config.Database.SQLite.busy_timeout,
+        "temp_store": Config.Database.SQLite.temp_store,
+    }
+
+
 def build_db_url() -> str:
     """Build DB tortoise orm url for connection from Config object"""
     if Config.Database.uri is not None:
         return Config.Database.uri
     if Config.Database.backend == "sqlite":
-        return f"sqlite://{Config.Database.host}"
+        if not Config.Database.SQLite.enabled:
+            return f"sqlite://{Config.Database.host}"
+        return f"sqlite://{Config.Database.host}?{urlencode(build_sqlite_pragmas())}"
     if Config.Database.backend == "postgres":
         return (
             f"postgres://{Config.Database.user}:{Config.Database.password}"
             f"@{Config.Database.host}/{Config.Database.database}"
         )
     raise NotImplementedError(f"DB Backend {Config.Database.backend} is not implemented")
+
+
+def build_db_connections() -> Dict[str, str]:
+    """Build tortoise orm connections from Config object.
+    The primary database is always named `default`, read replicas (if any) are named `replica0`, `replica1`, ...
+    """
+    connections = {"default": build_db_url()}
+    for index, replica_url in enumerate(Config.Database.replicas):
+        connections[f"replica{index}"] = replica_url
+    return connections
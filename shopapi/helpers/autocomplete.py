@@ -0,0 +1,107 @@
+"""In-memory prefix indexes for autocomplete served without hitting the database
+"""
+
+import asyncio
+import time
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Optional, Tuple, Type
+
+from shopapi.config import Config
+from shopapi.helpers import memory
+from shopapi.schemas.base import BaseModelTortoise
+
+
+indexes: List["PrefixIndex"] = []
+
+
+def invalidate_all():
+    """Rebuild all indexes on their next lookup, used after bulk writes bypassing the resource operators"""
+    for index in indexes:
+        index.invalidate()
+
+
+class PrefixIndex:
+    """Sorted array of `(lowercased text, id)` keys of `model.field`, looked up by bisection.
+    Every word of the text is indexed, so `fri` finds `black friday` as well.
+    Built lazily on the first lookup and rebuilt from the database every `refresh_seconds`
+    to pick up changes made by other processes, own changes are applied incrementally via `add`/`remove`.
+    """
+
+    def __init__(self, model: Type[BaseModelTortoise], field: str):
+        self.model = model
+        self.field = field
+        self.keys: List[Tuple[str, int]] = []
+        self.texts: Dict[int, str] = {}
+        self.built_at = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+        indexes.append(self)
+        name = f"autocomplete.{model.__name__}.{field}"
+        memory.register_cache(f"{name}.keys", lambda: self.keys)
+        memory.register_cache(f"{name}.texts", lambda: self.texts)
+
+    @staticmethod
+    def _words(text: str) -> List[str]:
+        lowered = text.lower()
+        words = lowered.split()
+        return [lowered] + [" ".join(words[index:]) for index in range(1, len(words))]
+
+    def build(self, items: Iterable[Tuple[int, str]]):
+        """Replace index contents with `(id, text)` `items`"""
+        self.texts = dict(items)
+        self.keys = sorted((word, item_id) for item_id, text in self.texts.items() for word in self._words(text))
+        self.built_at = time.monotonic()
+
+    def add(self, item_id: int, text: str):
+        """Add or replace single item"""
+        self.remove(item_id)
+        self.texts[item_id] = text
+        for word in self._words(text):
+            insort(self.keys, (word, item_id))
+
+    def remove(self, item_id: int):
+        """Remove item if it is indexed"""
+        text = self.texts.pop(item_id, None)
+        if text is None:
+            return
+        for word in self._words(text):
+            index = bisect_left(self.keys, (word, item_id))
+            if index < len(self.keys) and self.keys[index] == (word, item_id):
+                del self.keys[index]
+
+    def invalidate(self):
+        """Force rebuild on the next lookup, e.g. after bulk writes"""
+        self.built_at = 0.0
+
+    def lookup(self, prefix: str, limit: int = 10) -> List[Tuple[int, str]]:
+        """Return up to `limit` `(id, text)` items having a word starting with `prefix`, in alphabetical order
+        of the matched words (exact matches first)
+        """
+        prefix = prefix.lower().strip()
+        found: Dict[int, str] = {}
+        index = bisect_left(self.keys, (prefix,))
+        while index < len(self.keys) and len(found) < limit:
+            word, item_id = self.keys[index]
+            if not word.startswith(prefix):
+                break
+            found.setdefault(item_id, self.texts[item_id])
+            index += 1
+        return list(found.items())
+
+    def fresh(self) -> bool:
+        """Returns True if the index was built and is not older than the configured refresh interval"""
+        return bool(self.built_at) and time.monotonic() - self.built_at < Config.Autocomplete.refresh_seconds
+
+    async def ensure_built(self):
+        """Build the index from the database if it is missing or stale"""
+        if self.fresh():
+            return
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if not self.fresh():
+                self.build(await self.model.all().values_list("id", self.field))
+
+    async def search(self, prefix: str, limit: int = 10) -> List[Tuple[int, str]]:
+        """Make sure the index is built and look up `prefix`"""
+        await self.ensure_built()
+        return self.lookup(prefix, limit)
@@ -0,0 +1,244 @@
+"""Batch execution of several API operations (sub-requests) within a single HTTP request
+"""
+
+import asyncio
+import json
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from fastapi.dependencies.utils import solve_dependencies
+from fastapi.encoders import jsonable_encoder
+from fastapi.exceptions import RequestValidationError
+from fastapi.routing import APIRoute, run_endpoint_function, serialize_response
+from starlette.exceptions import HTTPException
+from starlette.requests import Request
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Match
+from starlette.status import HTTP_202_ACCEPTED, HTTP_405_METHOD_NOT_ALLOWED
+from tortoise.transactions import in_transaction
+
+from shopapi.config import Config
+from shopapi.helpers import (
+    autocomplete,
+    dependencies as deps,
+    events,
+    exceptions,
+    metrics,
+    replicas,
+    requestcontext,
+    tracing,
+)
+from shopapi.schemas import api
+
+logger = logging.getLogger(__name__)
+
+# FastAPI dependency cache, values of dependencies by `(dependency, security scopes)`
+DependencyCache = Dict[Any, Any]
+
+_OMITTED_HEADERS = ("content-length", "content-type")
+
+
+class _RollBack(Exception):
+    """Raised to roll back the batch transaction after a failed operation"""
+
+
+async def authenticate(token: Optional[str]) -> DependencyCache:
+    """Resolve user and role of `token` once for all operations of a batch.
+    Returns dependency cache with `get_user` and `get_user_role` solved, empty for anonymous batches,
+    their operations requiring authentication fail one by one.
+    """
+    if not token:
+        return {}
+    user = await deps.get_user(token)
+    role = await deps.get_user_role(user)
+    return {(deps.get_user, ()): user, (deps.get_user_role, ()): role}
+
+
+async def _receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+def _batchable(route: APIRoute) -> bool:
+    """Streaming endpoints never finish, e.g. the event stream, and the password hashing endpoints
+    (`Config.LoadShedding.auth_routes`) must not get around the concurrency limit of their route class
+    """
+    if route.name in Config.LoadShedding.auth_routes:
+        return False
+    response_class = getattr(route.response_class, "value", route.response_class)
+    return not (isinstance(response_class, type) and issubclass(response_class, StreamingResponse))
+
+
+def _headers(response: Response) -> Dict[str, str]:
+    return {key: value for key, value in response.headers.items() if key not in _OMITTED_HEADERS}
+
+
+def _content(response: Response) -> Any:
+    if not response.body:
+        return None
+    if response.media_type == "application/json":
+        return json.loads(response.body)
+    return response.body.decode(response.charset)
+
+
+def _steps(operations: List[api.BatchOperationIn]) -> List[List[api.BatchOperationIn]]:
+    """Split operations to steps run one after another, consecutive reads form a single step"""
+    steps: List[List[api.BatchOperationIn]] = []
+    for operation in operations:
+        if operation.method == "GET" and steps and steps[-1][0].method == "GET":
+            steps[-1].append(operation)
+        else:
+            steps.append([operation])
+    return steps
+
+
+class BatchExecutor:
+    """Executes operations of a batch against routes of the application the batch `request` was sent to.
+    Operations run through the same validation, dependencies and serialization as standalone requests,
+    except that the dependencies in `dependency_cache` (see `authenticate`) are reused by all of them.
+
+    Consecutive reads (`GET`) run concurrently, at most `Config.Batch.concurrency` at a time,
+    writes run one by one in the order of the operations.
+    """
+
+    def __init__(self, request: Request, dependency_cache: DependencyCache):
+        self.scope = request.scope
+        self.routes = [route for route in request.app.router.routes if isinstance(route, APIRoute)]
+        self.dependency_cache = dependency_cache
+        self.semaphore = asyncio.Semaphore(Config.Batch.concurrency)
+        self.transaction = False
+
+    async def run(self, operations: List[api.BatchOperationIn], transaction: bool = False) -> api.BatchOut:
+        """Execute `operations` and return their results in the same order.
+        Without `transaction` every operation runs on its own and failures do not stop the batch.
+        With `transaction` all operations run in one database transaction, the first failed step rolls it back
+        (the result is not `committed`) and the remaining operations are skipped.
+        """
+        results: List[api.BatchOperationOut] = []
+        self.transaction = transaction
+        if not transaction:
+            await self._run_steps(operations, results, stop_on_error=False)
+            return api.BatchOut(committed=True, results=results)
+        # reads must see the uncommitted writes
+        replicas.pin_primary()
+        try:
+            with events.deferred():
+                async with in_transaction(replicas.PRIMARY):
+                    if not await self._run_steps(operations, results, stop_on_error=True):
+                        raise _RollBack()
+        except _RollBack:
+            # indexes were updated with rows that are gone now
+            autocomplete.invalidate_all()
+            skipped = operations[len(results) :]
+            results += [self._error(operation, exceptions.OperationSkipped()) for operation in skipped]
+            return api.BatchOut(committed=False, results=results)
+        return api.BatchOut(committed=True, results=results)
+
+    async def _run_steps(
+        self, operations: List[api.BatchOperationIn], results: List[api.BatchOperationOut], stop_on_error: bool
+    ) -> bool:
+        """Append results of `operations` to `results`, returns False if stopped after a failed step"""
+        for step in _steps(operations):
+            if len(step) == 1:
+                # writes run in the current context, so that later operations read from the primary after them
+                step_results = [await self._execute(step[0])]
+            else:
+                step_results = await asyncio.gather(*(self._execute_limited(operation) for operation in step))
+            results.extend(step_results)
+            if stop_on_error and any(result.status >= 400 for result in step_results):
+                return False
+        return True
+
+    async def _execute_limited(self, operation: api.BatchOperationIn) -> api.BatchOperationOut:
+        async with self.semaphore:
+            return await self._execute(operation)
+
+    async def _execute(self, operation: api.BatchOperationIn) -> api.BatchOperationOut:
+        """Execute single operation, errors are returned as the result like error responses"""
+        with tracing.span("batch.operation", method=operation.method, path=operation.path):
+            try:
+                status, headers, body = await self._dispatch(operation)
+                result = api.BatchOperationOut(id=operation.id, status=status, headers=headers, body=body)
+            except HTTPException as error:
+                result = self._error(operation, error)
+            except RequestValidationError as error:
+                result = api.BatchOperationOut(
+                    id=operation.id, status=422, body={"detail": jsonable_encoder(error.errors())}
+                )
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Batch operation %s %s failed", operation.method, operation.path)
+                result = self._error(operation, exceptions.UnexpectedException())
+        metrics.BATCH_OPERATIONS.inc((operation.method, str(result.status)))
+        return result
+
+    @staticmethod
+    def _error(operation: api.BatchOperationIn, error: HTTPException) -> api.BatchOperationOut:
+        return api.BatchOperationOut(
+            id=operation.id,
+            status=error.status_code,
+            headers=getattr(error, "headers", None) or {},
+            body={"detail": error.detail},
+        )
+
+    def _resolve(self, method: str, path: str) -> Tuple[APIRoute, Dict[str, Any]]:
+        """Find route handling `method` and `path` (with or without the trailing slash) and build its scope"""
+        url = urlsplit(path)
+        alternative = url.path[:-1] if url.path.endswith("/") else f"{url.path}/"
+        method_matched = False
+        for candidate in filter(None, (url.path, alternative)):
+            scope = {
+                **self.scope,
+                "method": method,
+                "path": candidate,
+                "raw_path": candidate.encode("latin-1"),
+                "query_string": url.query.encode("latin-1"),
+            }
+            for route in self.routes:
+                match, child_scope = route.matches(scope)
+                if match == Match.FULL:
+                    if route.endpoint is self.scope.get("endpoint") or not _batchable(route):
+                        raise exceptions.InvalidOperation(detail=f"{method} {url.path} can not be batched")
+                    if self.transaction and route.status_code == HTTP_202_ACCEPTED:
+                        # background jobs are queued right away and run outside of the batch transaction
+                        raise exceptions.InvalidOperation(
+                            detail=f"{method} {url.path} submits a background job and can not run in a transaction"
+                        )
+                    return route, {**scope, **child_scope}
+                method_matched = method_matched or match == Match.PARTIAL
+        if method_matched:
+            raise exceptions.ExtendedHTTPException(HTTP_405_METHOD_NOT_ALLOWED, f"{method} is not allowed")
+        raise exceptions.ResourceNotFound("endpoint", url.path)
+
+    async def _dispatch(self, operation: api.BatchOperationIn) -> Tuple[int, Dict[str, str], Any]:
+        """Run endpoint of `operation` like FastAPI does, returns status code, headers and json-able body"""
+        route, scope = self._resolve(operation.method, operation.path)
+        dependant = route.dependant
+        is_coroutine = asyncio.iscoroutinefunction(dependant.call)
+        with requestcontext.sub_request(scope):
+            values, errors, background_tasks, sub_response, _ = await solve_dependencies(
+                request=Request(scope, _receive),
+                dependant=dependant,
+                body=operation.body,
+                dependency_overrides_provider=route.dependency_overrides_provider,
+                # every operation gets its own copy, only the shared dependencies are solved already
+                dependency_cache=dict(self.dependency_cache),
+            )
+            if errors:
+                raise RequestValidationError(errors, body=operation.body)
+            raw_response = await run_endpoint_function(dependant=dependant, values=values, is_coroutine=is_coroutine)
+        if background_tasks is not None:
+            await background_tasks()
+        if isinstance(raw_response, Response):
+            return raw_response.status_code, _headers(raw_response), _content(raw_response)
+        body = await serialize_response(
+            field=route.secure_cloned_response_field,
+            response_content=raw_response,
+            include=route.response_model_include,
+            exclude=route.response_model_exclude,
+            by_alias=route.response_model_by_alias,
+            exclude_unset=route.response_model_exclude_unset,
+            exclude_defaults=route.response_model_exclude_defaults,
+            exclude_none=route.response_model_exclude_none,
+            is_coroutine=is_coroutine,
+        )
+        return sub_response.status_code or route.status_code, _headers(sub_response), body
@@ -0,0 +1,162 @@
+"""Change feed for incremental sync: tombstones of deleted rows and opaque sync tokens
+"""
+
+import base64
+import json
+from typing import Dict, List, NamedTuple, Optional, Sequence, Set, Tuple, Type
+
+from tortoise import timezone
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.fields.relational import BackwardFKRelation, ForeignKeyFieldInstance
+from tortoise.models import Model
+from tortoise.queryset import Q
+
+from shopapi.helpers import exceptions, replicas
+from shopapi.schemas import models
+from shopapi.schemas.base import BaseModelTortoise
+
+
+class SyncToken(NamedTuple):
+    """Position in the change feed: last seen `(change_seq, id)` of changed rows and of tombstones.
+    Change sequence numbers are committed in increasing order (see `models.ChangeCounter`), so no change
+    committed later can appear behind a position already returned to a client.
+    """
+
+    change_seq: int
+    id: int
+    tombstone_seq: int
+    tombstone_id: int
+
+    def encode(self) -> str:
+        """Encode as opaque url-safe string"""
+        data = json.dumps(list(self), separators=(",", ":"))
+        return base64.urlsafe_b64encode(data.encode("utf-8")).decode("ascii").rstrip("=")
+
+    @classmethod
+    def decode(cls, token: str) -> "SyncToken":
+        """Decode token created by `encode`, raises `InvalidOperation` if it is malformed"""
+        try:
+            data = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+            if not isinstance(data, list) or len(data) != len(cls._fields):
+                raise ValueError(token)
+            return cls(*(int(value) for value in data))
+        except (ValueError, TypeError):
+            raise exceptions.InvalidOperation(detail="Invalid sync token")
+
+
+async def _cascaded_ids(
+    model: Type[BaseModelTortoise], ids: Sequence[int], db: Optional[BaseDBAsyncClient]
+) -> Dict[Type[Model], Set[int]]:
+    """Ids of rows deleted together with `ids` of `model`, including rows removed by `ON DELETE CASCADE`"""
+    # pylint: disable=protected-access
+    collected: Dict[Type[Model], Set[int]] = {}
+    pending: List[Tuple[Type[Model], Set[int]]] = [(model, set(ids))]
+    while pending:
+        current, current_ids = pending.pop()
+        current_ids -= collected.setdefault(current, set())
+        if not current_ids:
+            continue
+        collected[current] |= current_ids
+        for name in current._meta.backward_fk_fields:
+            relation: BackwardFKRelation = current._meta.fields_map[name]  # type: ignore
+            related = relation.related_model
+            forward: ForeignKeyFieldInstance = next(
+                related._meta.fields_map[fk]  # type: ignore
+                for fk in related._meta.fk_fields
+                if related._meta.fields_map[fk].source_field == relation.relation_field
+            )
+            if forward.on_delete != "CASCADE":
+                continue
+            children = (
+                await related.filter(**{f"{relation.relation_field}__in": list(current_ids)})
+                .using_db(db)  # type: ignore
+                .values_list("id", flat=True)
+            )
+            pending.append((related, set(children)))
+    return collected
+
+
+async def delete_tracked(
+    model: Type[BaseModelTortoise], using_db: Optional[BaseDBAsyncClient] = None, **filters
+) -> Dict[Type[Model], Set[int]]:
+    """Delete rows of `model` matching `filters` with one statement and record tombstones
+    of them and of all rows removed by cascades. Returns ids of deleted rows by model, empty if nothing matched.
+    """
+    ids = await model.filter(**filters).using_db(using_db).values_list("id", flat=True)  # type: ignore
+    if not ids:
+        return {}
+    deleted = await _cascaded_ids(model, ids, using_db)
+    await model.filter(id__in=ids).using_db(using_db).delete()  # type: ignore
+    db = using_db or models.Tombstone._meta.db  # pylint: disable=protected-access
+    change_seq = await models.ChangeCounter.next(db)
+    await models.Tombstone.bulk_create(
+        [
+            models.Tombstone(resource=deleted_model.__name__, resource_id=resource_id, change_seq=change_seq)
+            for deleted_model, deleted_ids in deleted.items()
+            for resource_id in sorted(deleted_ids)
+        ],
+        using_db=using_db,
+    )
+    return deleted
+
+
+async def touch(model: Type[BaseModelTortoise], using_db: BaseDBAsyncClient, **filters) -> List[int]:
+    """Mark rows of `model` matching `filters` as changed, e.g. rows embedding a renamed or deleted related row,
+    so that the change feed serves them again. Returns ids of touched rows.
+    """
+    ids = await model.filter(**filters).using_db(using_db).distinct().values_list("id", flat=True)  # type: ignore
+    if ids:
+        change_seq = await models.ChangeCounter.next(using_db)
+        await model.filter(id__in=ids).using_db(using_db).update(change_seq=change_seq, updated_at=timezone.now())
+    return list(ids)
+
+
+def after(change_seq: int, last_id: int) -> Q:
+    """Filter of rows past `(change_seq, id)`, written as a range on `change_seq`
+    so that it is answered by the `change_seq` index on every backend
+    """
+    return Q(Q(change_seq__gte=change_seq), Q(change_seq__gt=change_seq) | Q(id__gt=last_id))
+
+
+async def changes_since(
+    model: Type[BaseModelTortoise], token: Optional[str], limit: int, related_fields: Sequence[str] = ()
+) -> Tuple[List[BaseModelTortoise], List[int], str, bool]:
+    """Rows of `model` changed and ids of rows deleted after position `token` (`None` starts a full sync,
+    which skips deletions that happened before it). Both are returned in the order of changes, at most `limit` each.
+    Returns changed rows, deleted ids, token of the new position and whether more changes are waiting.
+    """
+    position = SyncToken.decode(token) if token is not None else None
+
+    async def fetch(db: BaseDBAsyncClient) -> Tuple[SyncToken, List[BaseModelTortoise], List[Tuple[int, int, int]]]:
+        start = position
+        if start is None:
+            last_tombstone = await models.Tombstone.all().using_db(db).order_by("-change_seq", "-id").first()
+            start = (
+                SyncToken(0, 0, last_tombstone.change_seq, last_tombstone.pk)
+                if last_tombstone
+                else SyncToken(0, 0, 0, 0)
+            )
+        changed = (
+            await model.filter(after(start.change_seq, start.id))
+            .using_db(db)
+            .order_by("change_seq", "id")
+            .limit(limit + 1)
+            .prefetch_related(*related_fields)
+        )
+        tombstones = (
+            await models.Tombstone.filter(after(start.tombstone_seq, start.tombstone_id), resource=model.__name__)
+            .using_db(db)
+            .order_by("change_seq", "id")
+            .limit(limit + 1)
+            .values_list("change_seq", "id", "resource_id")
+        )
+        return start, changed, tombstones
+
+    start, changed, tombstones = await replicas.router.read(fetch)
+    has_more = len(changed) > limit or len(tombstones) > limit
+    changed, tombstones = changed[:limit], tombstones[:limit]
+    if changed:
+        start = start._replace(change_seq=changed[-1].change_seq, id=changed[-1].pk)  # type: ignore
+    if tombstones:
+        start = start._replace(tombstone_seq=tombstones[-1][0], tombstone_id=tombstones[-1][1])
+    return changed, [resource_id for _, _, resource_id in tombstones], start.encode(), has_more
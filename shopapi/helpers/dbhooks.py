@@ -0,0 +1,103 @@
+"""Hooks into Tortoise ORM database clients.
+Every SQL statement executed by any client is reported to registered listeners.
+"""
+
+import functools
+import logging
+import re
+import time
+from typing import Callable, List, NamedTuple, Set, Type
+
+from tortoise.backends.base.client import BaseDBAsyncClient
+
+logger = logging.getLogger(__name__)
+
+HOOKED_METHODS = ("execute_insert", "execute_query", "execute_query_dict", "execute_many", "execute_script")
+
+
+class QueryEvent(NamedTuple):
+    """Information about a single executed SQL statement"""
+
+    sql: str
+    connection: str
+    started: float
+    duration: float
+    failed: bool
+
+
+QueryListener = Callable[[QueryEvent], None]
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"(?<![\w$])-?\d+(?:\.\d+)?\b")
+_POSITIONAL_PARAM = re.compile(r"\$\d+")
+_VALUE_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+listeners: List[QueryListener] = []
+
+
+def fingerprint(sql: str) -> str:
+    """Return shape of `sql` statement with literals and parameters replaced by `?`
+    and value lists collapsed, so that statements differing only in values compare equal.
+    """
+    shape = _STRING_LITERAL.sub("?", sql)
+    shape = _POSITIONAL_PARAM.sub("?", shape)
+    shape = _NUMBER_LITERAL.sub("?", shape)
+    shape = _VALUE_LIST.sub("(...)", shape)
+    return _WHITESPACE.sub(" ", shape).strip()
+
+
+def add_listener(listener: QueryListener):
+    """Register `listener` to be called after every executed SQL statement"""
+    if listener not in listeners:
+        listeners.append(listener)
+
+
+def remove_listener(listener: QueryListener):
+    """Unregister previously registered `listener`"""
+    if listener in listeners:
+        listeners.remove(listener)
+
+
+def _hook(method: Callable) -> Callable:
+    @functools.wraps(method)
+    async def hooked(self, query, *args, **kwargs):
+        if not listeners:
+            return await method(self, query, *args, **kwargs)
+        started = time.perf_counter()
+        failed = True
+        try:
+            result = await method(self, query, *args, **kwargs)
+            failed = False
+            return result
+        finally:
+            event = QueryEvent(query, self.connection_name, started, time.perf_counter() - started, failed)
+            for listener in listeners:
+                try:
+                    listener(event)
+                except Exception as error:  # pylint: disable=broad-except
+                    logger.error("Query listener %s failed: %s", listener, error)
+
+    hooked.__shopapi_hooked__ = True  # type: ignore
+    return hooked
+
+
+def _subclasses(cls: Type) -> Set[Type]:
+    found = set()
+    for subclass in cls.__subclasses__():
+        found.add(subclass)
+        found |= _subclasses(subclass)
+    return found
+
+
+def install():
+    """Hook all database client classes loaded so far.
+    Has to be called after Tortoise is initialized, because backends are imported lazily.
+    Calling it multiple times is safe.
+    """
+    for client_class in _subclasses(BaseDBAsyncClient):
+        for name in HOOKED_METHODS:
+            method = client_class.__dict__.get(name)
+            if method is None or getattr(method, "__shopapi_hooked__", False):
+                continue
+            setattr(client_class, name, _hook(method))
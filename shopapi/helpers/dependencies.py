@@ -1,12 +1,12 @@
 """Dependencies to make our lifes easier and our views cleaner"""
 
 import logging
-from typing import NamedTuple, Optional
+from typing import NamedTuple, Optional, Tuple
 from fastapi import Cookie, Header, Depends
 import tortoise.exceptions
 
 from shopapi.config import Config
-from shopapi.helpers import exceptions, security
+from shopapi.helpers import exceptions, identitymap, security, tracing
 from shopapi.schemas import schemas, models
 
 logger = logging.getLogger(__name__)
@@ -18,6 +18,21 @@ class QueryParams(NamedTuple):
     search: Optional[str]
     offset: int = 0
     limit: int = 10
+    ids: Optional[Tuple[int, ...]] = None
+
+
+class SuggestParams(NamedTuple):
+    """Named Tuple to contain autocomplete query params"""
+
+    q: str
+    limit: int = 10
+
+
+class ChangesParams(NamedTuple):
+    """Named Tuple to contain change feed query params"""
+
+    sync_token: Optional[str]
+    limit: int = 100
 
 
 async def get_user_token(
@@ -46,16 +61,18 @@ async def get_user_token_strict(token: Optional[str] = Depends(get_user_token))
     raise exceptions.AuthenticationException()
 
 
+@tracing.traced("deps.get_user")
 async def get_user(token: str = Depends(get_user_token_strict)) -> schemas.UserToken:
     """Get user information schema from the decoded token info"""
     token_info = await security.decode_jwt(token)
-    return schemas.UserToken.from_token(token_info)
+    return schemas.UserToken.from_trusted_token(token_info)
 
 
+@tracing.traced("deps.get_user_role")
 async def get_user_role(user: schemas.UserToken = Depends(get_user)) -> schemas.Role:
     """Get user's role"""
     try:
-        role_db = await models.Role.get(id=user.role_id)
+        role_db = await identitymap.get(models.Role, user.role_id)
     except tortoise.exceptions.DoesNotExist as error:
         logger.error(error)
         raise exceptions.CredentialsException()
@@ -63,13 +80,46 @@ async def get_user_role(user: schemas.UserToken = Depends(get_user)) -> schemas.
         raise exceptions.UnexpectedException(
             detail=f"We were unable to retrieve your user information. Please contact us at {Config.support_contact}"
         )
-    return schemas.Role.from_orm(role_db)
+    return schemas.Role.trusted(role_db)
+
 
+async def get_admin_role(role: schemas.Role = Depends(get_user_role)) -> schemas.Role:
+    """Get user's role and make sure it is an admin role, that is a role with all `roles` permissions"""
+    if role.roles != schemas.ADMIN:
+        raise exceptions.InsufficientPermissions(["roles.read", "roles.write", "roles.delete"])
+    return role
 
-async def query_params(search: Optional[str] = None, offset: int = 0, limit: int = 10) -> QueryParams:
-    """Default query parameters search, skip and limit"""
+
+async def query_params(
+    search: Optional[str] = None, offset: int = 0, limit: int = 10, ids: Optional[str] = None
+) -> QueryParams:
+    """Default query parameters search, skip and limit.
+    Comma-separated `ids` select resources by their ids instead, taking precedence over search and paging.
+    """
     if not 0 < limit <= 100:
         raise exceptions.InvalidOperation(detail="`limit` must be at least 1 and at most 100")
     if offset < 0:
         raise exceptions.InvalidOperation(detail="`offset` muset be >= 0")
-    return QueryParams(search=search, offset=offset, limit=limit)
+    if ids is None:
+        return QueryParams(search=search, offset=offset, limit=limit)
+    try:
+        parsed_ids = tuple(int(resource_id) for resource_id in ids.split(",") if resource_id.strip())
+    except ValueError:
+        raise exceptions.InvalidOperation(detail="`ids` must be a comma-separated list of integers")
+    if not 0 < len(parsed_ids) <= 100:
+        raise exceptions.InvalidOperation(detail="`ids` must contain at least 1 and at most 100 ids")
+    return QueryParams(search=search, offset=offset, limit=limit, ids=parsed_ids)
+
+
+async def suggest_params(q: str, limit: int = 10) -> SuggestParams:
+    """Autocomplete query parameters, prefix `q` and limit of suggestions"""
+    if not 0 < limit <= 100:
+        raise exceptions.InvalidOperation(detail="`limit` must be at least 1 and at most 100")
+    return SuggestParams(q=q, limit=limit)
+
+
+async def changes_params(sync_token: Optional[str] = None, limit: int = 100) -> ChangesParams:
+    """Change feed query parameters, `sync_token` of the previous call and limit of changed rows"""
+    if not 0 < limit <= 1000:
+        raise exceptions.InvalidOperation(detail="`limit` must be at least 1 and at most 1000")
+    return ChangesParams(sync_token=sync_token, limit=limit)
@@ -0,0 +1,158 @@
+"""In-process broadcaster of resource write events streamed to clients as server-sent events
+"""
+
+import asyncio
+import json
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, FrozenSet, Iterator, List, Optional, Set, Tuple
+
+from starlette.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+from shopapi.config import Config
+from shopapi.helpers import exceptions, metrics
+
+logger = logging.getLogger(__name__)
+
+MEDIA_TYPE = "text/event-stream"
+
+RESYNC = b"event: resync\ndata: {}\n\n"
+KEEPALIVE = b": keepalive\n\n"
+
+
+class Subscription:
+    """Bounded queue of encoded events for a single client"""
+
+    def __init__(self, resources: FrozenSet[str], queue_size: int):
+        self.resources = resources
+        self.queue: "asyncio.Queue[bytes]" = asyncio.Queue(maxsize=queue_size)
+        self.overflowed = False
+
+    def offer(self, frame: bytes) -> bool:
+        """Queue `frame` without waiting, returns False if the queue is full"""
+        try:
+            self.queue.put_nowait(frame)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+
+class Broadcaster:
+    """Fan-out of events to all subscribers. Events are encoded once and queued without waiting,
+    so a slow client never blocks the writer or other clients. A client whose queue overflows receives
+    a `resync` event and is disconnected, it is expected to catch up using the change feed and reconnect.
+
+    Events are only delivered to clients connected to the same process.
+    """
+
+    def __init__(self):
+        self.subscribers: Set[Subscription] = set()
+        self.sequence = 0
+
+    def publish(self, resource: str, action: str, data: str):
+        """Send `action` event (e.g. `update`) of `resource` with already json-encoded `data` to subscribers"""
+        metrics.EVENTS_PUBLISHED.inc((resource, action))
+        if not self.subscribers:
+            return
+        self.sequence += 1
+        frame = f"id: {self.sequence}\nevent: {resource}.{action}\ndata: {data}\n\n".encode("utf-8")
+        for subscription in list(self.subscribers):
+            if resource not in subscription.resources:
+                continue
+            if not subscription.offer(frame):
+                self._overflow(subscription)
+
+    def _overflow(self, subscription: Subscription):
+        subscription.overflowed = True
+        self.subscribers.discard(subscription)
+        # make room for the resync marker, events left in the queue are superseded by the resync anyway
+        while not subscription.queue.empty():
+            subscription.queue.get_nowait()
+        subscription.queue.put_nowait(RESYNC)
+        metrics.EVENT_SUBSCRIBERS.dec()
+        metrics.EVENT_SUBSCRIBERS_DROPPED.inc()
+        logger.info("Dropped event subscriber that fell %s events behind", subscription.queue.maxsize)
+
+    def subscribe(self, resources: FrozenSet[str]) -> Subscription:
+        """Register new subscriber to events of `resources`, raises `ServiceBusy` if there are too many"""
+        if len(self.subscribers) >= Config.Events.max_subscribers:
+            raise exceptions.ServiceBusy(detail="Too many event subscribers, please try again later", retry_after=30)
+        subscription = Subscription(resources, Config.Events.queue_size)
+        self.subscribers.add(subscription)
+        metrics.EVENT_SUBSCRIBERS.inc()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        """Remove subscriber, does nothing if it was already dropped"""
+        if subscription in self.subscribers:
+            self.subscribers.discard(subscription)
+            metrics.EVENT_SUBSCRIBERS.dec()
+
+    async def stream(self, subscription: Subscription) -> AsyncIterator[bytes]:
+        """Yield encoded events of `subscription` and keepalive comments until the subscriber is dropped,
+        unsubscribes when the client disconnects
+        """
+        try:
+            yield b"retry: 3000\n\n"
+            while True:
+                try:
+                    frame = await asyncio.wait_for(subscription.queue.get(), Config.Events.keepalive_seconds)
+                except asyncio.TimeoutError:
+                    yield KEEPALIVE
+                    continue
+                yield frame
+                if frame is RESYNC:
+                    return
+        finally:
+            self.unsubscribe(subscription)
+
+
+class EventStreamResponse(StreamingResponse):
+    """Streaming response of server-sent events, stops streaming when the client disconnects"""
+
+    media_type = MEDIA_TYPE
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        # wrap coroutines in tasks explicitly, newer Pythons refuse bare coroutines in `asyncio.wait`
+        tasks = [
+            asyncio.ensure_future(self.stream_response(send)),
+            asyncio.ensure_future(self.listen_for_disconnect(receive)),
+        ]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+broadcaster = Broadcaster()
+
+_deferred: ContextVar[Optional[List[Tuple[str, str, str]]]] = ContextVar("deferred_events", default=None)
+
+
+@contextmanager
+def deferred() -> Iterator[None]:
+    """Hold back events published within the block until it exits, e.g. until a transaction commits.
+    If the block raises, its events are discarded.
+    """
+    pending: List[Tuple[str, str, str]] = []
+    token = _deferred.set(pending)
+    try:
+        yield
+    finally:
+        _deferred.reset(token)
+    for resource, action, data in pending:
+        broadcaster.publish(resource, action, data)
+
+
+def publish(resource: str, action: str, data: Optional[str] = None, resource_id: Optional[int] = None):
+    """Publish event to the global broadcaster, `data` defaults to `{"id": resource_id}`, see also `deferred`"""
+    data = data if data is not None else json.dumps({"id": resource_id})
+    pending = _deferred.get()
+    if pending is not None:
+        pending.append((resource, action, data))
+    else:
+        broadcaster.publish(resource, action, data)
@@ -144,3 +144,23 @@ class ResourceNotFound(ExtendedHTTPException):
         status_code = status.HTTP_404_NOT_FOUND
         detail = f"Specified {res_type} ({res_name}) was not found"
         super().__init__(status_code=status_code, detail=detail)
+
+
+class ServiceBusy(ExtendedHTTPException):
+    """Raised when the server cannot accept more work at the moment"""
+
+    def __init__(self, detail: Optional[str] = None, retry_after: int = 1):
+        detail = detail or "The server is busy at the moment, please try again later"
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=detail, headers={"Retry-After": str(retry_after)}
+        )
+
+
+class OperationSkipped(ExtendedHTTPException):
+    """Raised for batch operations that were not executed, because a previous operation of the transaction failed"""
+
+    def __init__(self):
+        super().__init__(
+            status_code=status.HTTP_424_FAILED_DEPENDENCY,
+            detail="Not executed, a previous operation of the batch transaction failed",
+        )
@@ -0,0 +1,58 @@
+"""Request-scoped identity map: every row is loaded at most once per request
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional, Tuple, Type, TypeVar
+
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.models import Model
+
+M = TypeVar("M", bound=Model)
+
+Identities = Dict[Tuple[Type[Model], int], Model]
+
+_identities: ContextVar[Optional[Identities]] = ContextVar("identity_map", default=None)
+
+
+@contextmanager
+def scope() -> Iterator[Identities]:
+    """Open new identity map for the duration of the block, e.g. a request"""
+    token = _identities.set({})
+    try:
+        yield _identities.get()  # type: ignore
+    finally:
+        _identities.reset(token)
+
+
+def lookup(model: Type[M], pk: int) -> Optional[M]:
+    """Return instance of `model` loaded in the current scope, None if it was not loaded or there is no scope"""
+    identities = _identities.get()
+    if identities is None:
+        return None
+    return identities.get((model, pk))  # type: ignore
+
+
+def remember(instance: M) -> M:
+    """Store loaded or written `instance` in the current scope (if any) and return it"""
+    identities = _identities.get()
+    if identities is not None:
+        identities[(instance.__class__, instance.pk)] = instance
+    return instance
+
+
+def forget(model: Type[Model], pk: int):
+    """Drop instance of `model`, e.g. after it was deleted or modified by a bulk update"""
+    identities = _identities.get()
+    if identities is not None:
+        identities.pop((model, pk), None)
+
+
+async def get(model: Type[M], pk: int, using_db: Optional[BaseDBAsyncClient] = None) -> M:
+    """Return instance of `model` with primary key `pk`, loading it only if it is not in the current scope yet.
+    Raises `DoesNotExist` like `Model.get`.
+    """
+    instance = lookup(model, pk)
+    if instance is None:
+        instance = remember(await model.filter(pk=pk).using_db(using_db).get())  # type: ignore
+    return instance
@@ -0,0 +1,196 @@
+"""In-process background jobs with persistent job records
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from tortoise.queryset import Q
+
+from shopapi.config import Config
+from shopapi.helpers import exceptions
+from shopapi.schemas import models
+from shopapi.schemas.schemas import JobStatus
+
+logger = logging.getLogger(__name__)
+
+Progress = Callable[[float, Optional[str]], Awaitable[None]]
+Handler = Callable[[Dict[str, Any], Progress], Awaitable[Any]]
+
+handlers: Dict[str, Handler] = {}
+
+# running jobs without a heartbeat for this many heartbeat intervals are considered orphaned
+ORPHAN_HEARTBEATS = 3
+
+
+def register(kind: str) -> Callable[[Handler], Handler]:
+    """Register decorated coroutine function as handler of jobs of `kind`.
+    Handler receives job params and an async `progress(fraction, message)` callback, its return value
+    (which must be json-serializable) is stored as job result.
+    """
+
+    def decorator(handler: Handler) -> Handler:
+        handlers[kind] = handler
+        return handler
+
+    return decorator
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _progress(job_id: int) -> Progress:
+    async def progress(fraction: float, message: Optional[str] = None):
+        await models.Job.filter(id=job_id).update(progress=max(0.0, min(1.0, fraction)), message=message)
+
+    return progress
+
+
+class JobRunner:
+    """Queue of jobs processed by a bounded pool of worker tasks.
+    Jobs run independently of the request that submitted them, so they finish even if the client disconnects.
+    Runners refresh heartbeats of their running jobs, jobs without a heartbeat for several intervals were left
+    by a stopped process and are marked as failed by any runner, so that several processes can share the records.
+    """
+
+    def __init__(self):
+        self.queue: Optional[asyncio.Queue] = None
+        self.workers: List[asyncio.Task] = []
+        self.heartbeat: Optional[asyncio.Task] = None
+        self.running: Dict[int, asyncio.Task] = {}
+        # queue slots taken by submissions still creating their job records
+        self.reserved = 0
+
+    async def start(self, workers: int, queue_size: int, heartbeat_seconds: float = 15):
+        """Recover orphaned job records, queue the waiting ones and start `workers` worker tasks"""
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        await self._fail_orphans(heartbeat_seconds)
+        for job_id in await models.Job.filter(status=JobStatus.QUEUED).order_by("id").values_list("id", flat=True):
+            if self.queue.full():
+                await models.Job.filter(id=job_id).update(
+                    status=JobStatus.FAILED, error="Job queue is full", finished_at=_now()
+                )
+                continue
+            self.queue.put_nowait(job_id)
+        self.workers = [asyncio.ensure_future(self._worker()) for _ in range(workers)]
+        self.heartbeat = asyncio.ensure_future(self._heartbeat(heartbeat_seconds))
+
+    async def stop(self):
+        """Cancel all workers and running jobs"""
+        tasks = [*self.workers, *([self.heartbeat] if self.heartbeat else [])]
+        for task in [*tasks, *self.running.values()]:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.workers = []
+        self.heartbeat = None
+        self.queue = None
+
+    async def _fail_orphans(self, heartbeat_seconds: float):
+        """Mark running jobs of other (stopped) processes as failed, i.e. those without a recent heartbeat"""
+        stale = _now() - timedelta(seconds=heartbeat_seconds * ORPHAN_HEARTBEATS)
+        await (
+            models.Job.filter(status=JobStatus.RUNNING)
+            .filter(Q(heartbeat_at__lt=stale) | Q(heartbeat_at__isnull=True, started_at__lt=stale))
+            .exclude(id__in=list(self.running))
+            .update(
+                status=JobStatus.FAILED, error="Interrupted, the process running the job stopped", finished_at=_now()
+            )
+        )
+
+    async def _heartbeat(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if self.running:
+                    await models.Job.filter(id__in=list(self.running), status=JobStatus.RUNNING).update(
+                        heartbeat_at=_now()
+                    )
+                await self._fail_orphans(interval)
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Job heartbeat failed")
+
+    async def submit(self, kind: str, params: Dict[str, Any], user_id: Optional[int] = None) -> models.Job:
+        """Store new job record and queue it"""
+        if kind not in handlers:
+            raise exceptions.InvalidOperation(detail=f"Unknown job kind '{kind}', use one of {', '.join(handlers)}")
+        if self.queue is None:
+            raise exceptions.ServiceBusy(detail="Job runner is not running")
+        # the slot is reserved before the record is created, so that concurrent submissions can not overfill the queue
+        if self.queue.maxsize and self.queue.qsize() + self.reserved >= self.queue.maxsize:
+            raise exceptions.ServiceBusy(detail="Job queue is full, please try again later", retry_after=10)
+        self.reserved += 1
+        try:
+            job = await models.Job.create(kind=kind, params=params, user_id=user_id)
+        finally:
+            self.reserved -= 1
+        self.queue.put_nowait(job.id)
+        return job
+
+    async def cancel(self, job_id: int) -> models.Job:
+        """Cancel queued or running job"""
+        job = await models.Job.get_or_none(id=job_id)
+        if job is None:
+            raise exceptions.ResourceNotFound("job", job_id)
+        if job.status == JobStatus.RUNNING and job_id in self.running:
+            task = self.running[job_id]
+            task.cancel()
+            await asyncio.wait([task])
+        elif job.status != JobStatus.QUEUED:
+            raise exceptions.InvalidOperation(detail=f"Job {job_id} is {job.status.value} and cannot be cancelled")
+        await models.Job.filter(id=job_id, status=job.status).update(status=JobStatus.CANCELLED, finished_at=_now())
+        return await models.Job.get(id=job_id)
+
+    async def _worker(self):
+        assert self.queue is not None
+        while True:
+            job_id = await self.queue.get()
+            try:
+                await self._run(job_id)
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Job %s could not be processed", job_id)
+            finally:
+                self.queue.task_done()
+
+    async def _run(self, job_id: int):
+        # claiming the job atomically makes sure it is not run twice, e.g. when it was cancelled while queued
+        claimed = await models.Job.filter(id=job_id, status=JobStatus.QUEUED).update(
+            status=JobStatus.RUNNING, started_at=_now(), heartbeat_at=_now()
+        )
+        if not claimed:
+            return
+        job = await models.Job.get(id=job_id)
+        logger.info("Job %s (%s) started", job.id, job.kind)
+        task = asyncio.ensure_future(handlers[job.kind](job.params or {}, _progress(job.id)))
+        self.running[job.id] = task
+        try:
+            await asyncio.wait([task])
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+        finally:
+            del self.running[job.id]
+        if task.cancelled():
+            values: Dict[str, Any] = {"status": JobStatus.CANCELLED}
+        elif task.exception() is not None:
+            error = task.exception()
+            logger.error("Job %s (%s) failed: %r", job.id, job.kind, error)
+            values = {"status": JobStatus.FAILED, "error": repr(error)[:1024]}
+        else:
+            values = {"status": JobStatus.SUCCEEDED, "progress": 1.0, "result": task.result()}
+        await models.Job.filter(id=job.id).update(**values, finished_at=_now())
+        logger.info("Job %s (%s) finished: %s", job.id, job.kind, values["status"].value)
+
+
+runner = JobRunner()
+
+
+async def start():
+    """Start the global job runner"""
+    await runner.start(Config.Jobs.workers, Config.Jobs.queue_size, Config.Jobs.heartbeat_seconds)
+
+
+async def stop():
+    """Stop the global job runner"""
+    await runner.stop()
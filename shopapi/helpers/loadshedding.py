@@ -0,0 +1,139 @@
+"""Concurrency limits per route class with bounded wait queues, excess requests are shed with 503
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from starlette.responses import JSONResponse
+from starlette.routing import BaseRoute, Match
+
+from shopapi.config import Config
+from shopapi.helpers import exceptions, metrics
+
+AUTH = "auth"
+READ = "read"
+WRITE = "write"
+EXEMPT = "exempt"
+
+_READ_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+class RouteClassLimiter:
+    """At most `concurrency` requests of route class `name` run at once and up to `queue_size` more wait
+    for a slot in order of arrival. Requests finding the queue full or waiting too long are rejected.
+    """
+
+    def __init__(self, name: str, concurrency: int, queue_size: int):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.active = 0
+        self.waiters: Deque[asyncio.Future] = deque()
+
+    def _shed(self, reason: str) -> exceptions.ServiceBusy:
+        metrics.REQUESTS_SHED.inc((self.name, reason))
+        return exceptions.ServiceBusy(
+            detail=f"Too many {self.name} requests at the moment, please try again later",
+            retry_after=Config.LoadShedding.retry_after,
+        )
+
+    async def acquire(self, timeout: float):
+        """Take a slot, waiting at most `timeout` seconds for one.
+        Raises `ServiceBusy` if the queue is full or no slot was freed in time.
+        """
+        if self.active < self.concurrency and not self.waiters:
+            self.active += 1
+            metrics.ROUTE_CLASS_ACTIVE.inc((self.name,))
+            return
+        if len(self.waiters) >= self.queue_size:
+            raise self._shed("queue_full")
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        metrics.ROUTE_CLASS_QUEUED.inc((self.name,))
+        started = time.perf_counter()
+        try:
+            # the slot is handed over by `release` together with the result of the waiter
+            await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            self._forget(waiter)
+            raise self._shed("timeout")
+        except BaseException:
+            self._forget(waiter)
+            raise
+        finally:
+            metrics.ROUTE_CLASS_QUEUED.dec((self.name,))
+            metrics.ROUTE_CLASS_WAIT.observe(time.perf_counter() - started, (self.name,))
+
+    def _forget(self, waiter: asyncio.Future):
+        if waiter.done() and not waiter.cancelled():
+            # the slot was handed over just as the wait ended
+            self.release()
+        elif waiter in self.waiters:
+            self.waiters.remove(waiter)
+
+    def release(self):
+        """Hand the slot over to the longest waiting request, or free it if none is waiting"""
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+        metrics.ROUTE_CLASS_ACTIVE.dec((self.name,))
+
+
+class LoadSheddingMiddleware:
+    """ASGI middleware running every HTTP request within the limit of its route class, so that e.g. bcrypt-bound
+    logins can not starve database-bound reads. Endpoints listed in `Config.LoadShedding.auth_routes` form
+    the `auth` class, the others are `read` (GET) or `write` requests, `exempt_routes` are never limited.
+    Requests over the limit wait in a bounded queue, those that can not be admitted are rejected
+    with 503 and `Retry-After` header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.limiters: Dict[str, RouteClassLimiter] = {
+            AUTH: RouteClassLimiter(AUTH, Config.LoadShedding.auth_concurrency, Config.LoadShedding.auth_queue),
+            READ: RouteClassLimiter(READ, Config.LoadShedding.read_concurrency, Config.LoadShedding.read_queue),
+            WRITE: RouteClassLimiter(WRITE, Config.LoadShedding.write_concurrency, Config.LoadShedding.write_queue),
+        }
+        self.timeout = Config.LoadShedding.queue_timeout_ms / 1000
+        self.routes: Optional[List[Tuple[BaseRoute, str]]] = None
+
+    def route_class(self, scope) -> str:
+        """Class of the request, given by the endpoint for configured routes, otherwise by the method"""
+        if self.routes is None:
+            classes = {name: AUTH for name in Config.LoadShedding.auth_routes}
+            classes.update((name, EXEMPT) for name in Config.LoadShedding.exempt_routes)
+            self.routes = [
+                (route, classes[route.name])
+                for route in scope["app"].router.routes
+                if getattr(route, "name", None) in classes
+            ]
+        for route, route_class in self.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route_class
+        return READ if scope["method"] in _READ_METHODS else WRITE
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        route_class = self.route_class(scope)
+        if route_class == EXEMPT:
+            await self.app(scope, receive, send)
+            return
+        limiter = self.limiters[route_class]
+        try:
+            await limiter.acquire(self.timeout)
+        except exceptions.ServiceBusy as error:
+            response = JSONResponse({"detail": error.detail}, error.status_code, headers=error.headers)
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release()
@@ -0,0 +1,141 @@
+"""Non-blocking logging: records are queued by the caller and written by a background thread
+"""
+
+import atexit
+import copy
+import json
+import logging
+import queue
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, List, Tuple
+
+from shopapi.helpers import metrics, requestcontext
+
+TEXT_FORMAT = "[%(asctime)s] <%(name)s> %(levelname)s: %(message)s"
+
+_exception_formatter = logging.Formatter()
+
+
+class JSONFormatter(logging.Formatter):
+    """Format records as single-line JSON objects, with the current route (if any) and exception details"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        route = getattr(record, "route", None)
+        if route:
+            entry["route"] = route
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            entry["suppressed"] = suppressed
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """Pass at most `burst` records of the same logger, level and message template per `period` seconds.
+    Records at `max_level` and above (errors by default) always pass. The first record passed after
+    a suppression carries number of suppressed records in its `suppressed` attribute.
+    """
+
+    def __init__(self, burst: int, period: float, max_level: int = logging.ERROR):
+        super().__init__()
+        self.burst = burst
+        self.period = period
+        self.max_level = max_level
+        # (logger, level, template) -> (window start, records in window, suppressed records)
+        self.windows: Dict[Tuple[str, int, str], Tuple[float, int, int]] = {}
+        self.lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= self.max_level or self.burst <= 0:
+            return True
+        key = (record.name, record.levelno, str(record.msg))
+        now = time.monotonic()
+        with self.lock:
+            start, count, suppressed = self.windows.get(key, (now, 0, 0))
+            if now - start >= self.period:
+                start, count = now, 0
+            if count >= self.burst:
+                self.windows[key] = (start, count, suppressed + 1)
+                metrics.LOG_RECORDS_SUPPRESSED.inc()
+                return False
+            self.windows[key] = (start, count + 1, 0)
+        if suppressed:
+            record.suppressed = suppressed
+            record.msg = f"{record.msg} ({suppressed} similar messages suppressed)"
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Queue handler that drops records when the queue is full instead of blocking the caller.
+    Adds the current route to records, because the listener thread has no request context.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # merge arguments now, they may change before the listener gets to the record, but keep the traceback
+        # apart from the message, so that the target formatter can structure it
+        record = copy.copy(record)
+        record.msg = record.message = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = record.exc_text or _exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        record.route = requestcontext.route()
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.LOG_RECORDS_DROPPED.inc()
+
+
+listeners: List[QueueListener] = []
+
+
+def setup(
+    level: str = "INFO",
+    output: str = "text",
+    queue_size: int = 10000,
+    rate_limit_burst: int = 10,
+    rate_limit_seconds: float = 60,
+) -> QueueListener:
+    """Replace handlers of the root logger with a queue handler, records are formatted as `output`
+    (`text` or `json`) and written to stderr by a background listener thread.
+    Repeated records are rate limited, see `RateLimitFilter`. The listener is stopped, i.e. the queue flushed,
+    on exit or by `shutdown`.
+    """
+    shutdown()
+    target = logging.StreamHandler(sys.stderr)
+    target.setFormatter(JSONFormatter() if output == "json" else logging.Formatter(TEXT_FORMAT))
+    handler = NonBlockingQueueHandler(queue.Queue(queue_size))
+    handler.addFilter(RateLimitFilter(rate_limit_burst, rate_limit_seconds))
+    root = logging.getLogger()
+    for old_handler in root.handlers[:]:
+        root.removeHandler(old_handler)
+    root.addHandler(handler)
+    root.setLevel(level.upper())
+    listener = QueueListener(handler.queue, target, respect_handler_level=True)
+    listener.start()
+    listeners.append(listener)
+    return listener
+
+
+def shutdown():
+    """Write all queued records and stop the listener thread"""
+    while listeners:
+        listeners.pop().stop()
+
+
+atexit.register(shutdown)
@@ -0,0 +1,170 @@
+"""Memory diagnostics: `tracemalloc` snapshots grouped by module and sizes of in-process caches
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+from collections import deque
+from types import FunctionType, ModuleType
+from typing import Any, Callable, Dict, List, Optional, Set
+
+GROUPS = ("module", "caller", "line")
+
+# allocations done by the diagnostics themselves are not interesting
+_IGNORED = (__file__, tracemalloc.__file__, "<frozen importlib._bootstrap>", "<unknown>")
+_APP_PACKAGES = ("shopapi", "main")
+
+caches: Dict[str, Callable[[], Any]] = {}
+
+# snapshot later snapshots are compared with and when it was taken, see `take_baseline`
+_baseline: Dict[str, Any] = {}
+
+
+def register_cache(name: str, getter: Callable[[], Any]):
+    """Register in-process cache `name`, `getter` returns its current container (e.g. a dict) to be measured"""
+    caches[name] = getter
+
+
+def deep_size(root: Any, limit: int = 1000000) -> int:
+    """Approximate size of `root` in bytes including everything it references (containers, attributes),
+    except for modules, classes and functions. Stops after `limit` objects.
+    """
+    seen: Set[int] = set()
+    size = 0
+    pending = deque([root])
+    while pending and len(seen) < limit:
+        obj = pending.popleft()
+        if id(obj) in seen or isinstance(obj, (type, ModuleType, FunctionType)):
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        # containers are copied in a single step first, they may be changed by the event loop meanwhile
+        if isinstance(obj, dict):
+            for key, value in list(obj.items()):
+                pending.extend((key, value))
+        elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+            pending.extend(list(obj))
+        if hasattr(obj, "__dict__"):
+            pending.append(obj.__dict__)
+        for slot in getattr(type(obj), "__slots__", ()):
+            if hasattr(obj, slot):
+                pending.append(getattr(obj, slot))
+    return size
+
+
+def cache_copies() -> Dict[str, Any]:
+    """Shallow copies of every registered cache, taken on the event loop so that `cache_sizes` can measure them
+    in a worker thread while requests keep changing the caches
+    """
+    copies = {}
+    for name, getter in sorted(caches.items()):
+        cache = getter()
+        copies[name] = dict(cache) if isinstance(cache, dict) else list(cache)
+    return copies
+
+
+def cache_sizes(copies: Dict[str, Any]) -> Dict[str, Dict[str, Optional[int]]]:
+    """Number of entries and approximate size in bytes of every cache in `copies`, see `cache_copies`.
+    Walks up to a million objects per cache, so it should run in a worker thread.
+    """
+    return {name: {"entries": len(cache), "bytes": deep_size(cache)} for name, cache in copies.items()}
+
+
+def start(frames: int):
+    """Start tracing allocations storing `frames` frames of each traceback and take the baseline snapshot"""
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+    take_baseline()
+
+
+def stop():
+    """Stop tracing allocations and forget the baseline, traced memory is released"""
+    tracemalloc.stop()
+    _baseline.clear()
+
+
+def take_baseline():
+    """Take snapshot later snapshots are compared with, see `top`"""
+    _baseline.update(snapshot=_snapshot(), taken_at=time.time())
+
+
+def status() -> Dict[str, Any]:
+    """Whether allocations are traced, traced memory, its peak and time of the baseline snapshot"""
+    current, peak = tracemalloc.get_traced_memory()
+    return {
+        "tracing": tracemalloc.is_tracing(),
+        "frames": tracemalloc.get_traceback_limit(),
+        "traced_bytes": current,
+        "peak_bytes": peak,
+        "tracemalloc_overhead_bytes": tracemalloc.get_tracemalloc_memory(),
+        "baseline_at": _baseline.get("taken_at"),
+    }
+
+
+def _snapshot() -> tracemalloc.Snapshot:
+    return tracemalloc.take_snapshot().filter_traces(
+        [tracemalloc.Filter(False, pattern, all_frames=False) for pattern in _IGNORED]
+    )
+
+
+def _module_names() -> Dict[str, str]:
+    """Module names by absolute path of their files"""
+    return {
+        os.path.abspath(filename): name
+        for name, filename in [(name, getattr(module, "__file__", None)) for name, module in list(sys.modules.items())]
+        if filename
+    }
+
+
+class _Grouping:
+    """Names the group of traced allocations by their traceback"""
+
+    def __init__(self, group_by: str, depth: int):
+        self.group_by = group_by
+        self.depth = depth
+        self.modules = _module_names()
+
+    def module(self, filename: str, depth: int) -> Optional[str]:
+        """Name of the module defined in `filename` shortened to `depth` components, e.g. `shopapi.schemas`"""
+        name = self.modules.get(os.path.abspath(filename))
+        return ".".join(name.split(".")[:depth]) if name else None
+
+    def __call__(self, traceback: tracemalloc.Traceback) -> str:
+        # frames are sorted from the oldest to the most recent one
+        frame = traceback[-1]
+        if self.group_by == "line":
+            return f"{frame.filename}:{frame.lineno}"
+        if self.group_by == "caller":
+            app_frames = (item for item in reversed(traceback) if self.module(item.filename, 1) in _APP_PACKAGES)
+            frame = next(app_frames, frame)
+        return self.module(frame.filename, self.depth) or frame.filename
+
+
+def top(limit: int = 20, group_by: str = "module", depth: int = 2, diff: bool = False) -> List[Dict[str, Any]]:
+    """Groups of traced allocations with the most memory, grouped by the allocating `module`,
+    by the innermost application module on the stack (`caller`, needs more than one traced frame)
+    or by source `line`. With `diff` the growth since the baseline snapshot is reported instead.
+    """
+    if group_by not in GROUPS:
+        raise ValueError(f"Unknown grouping '{group_by}'")
+    if not tracemalloc.is_tracing():
+        return []
+    # snapshot first, so that allocations of the grouping itself are not reported
+    snapshot = _snapshot()
+    grouping = _Grouping(group_by, depth)
+    baseline: Optional[tracemalloc.Snapshot] = _baseline.get("snapshot") if diff else None
+    groups: Dict[str, List[int]] = {}
+    if baseline is not None:
+        for change in snapshot.compare_to(baseline, "traceback"):
+            totals = groups.setdefault(grouping(change.traceback), [0, 0])
+            totals[0] += change.size_diff
+            totals[1] += change.count_diff
+    else:
+        for stat in snapshot.statistics("traceback"):
+            totals = groups.setdefault(grouping(stat.traceback), [0, 0])
+            totals[0] += stat.size
+            totals[1] += stat.count
+    size_key, count_key = ("size_diff", "count_diff") if baseline is not None else ("size", "count")
+    ordered = sorted(groups.items(), key=lambda item: abs(item[1][0]), reverse=True)
+    return [{"group": group, size_key: size, count_key: count} for group, (size, count) in ordered[:limit]]
@@ -0,0 +1,293 @@
+"""Application metrics exposed in Prometheus text format
+"""
+
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from shopapi.helpers.dbhooks import QueryEvent
+
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Base for all metrics"""
+
+    kind: str = NotImplemented
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+
+    def samples(self) -> Iterator[str]:
+        """Yield sample lines of the metric"""
+        raise NotImplementedError()
+
+    def render(self) -> str:
+        """Render metric in Prometheus text format"""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """Monotonically increasing counter"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self.values: Dict[LabelValues, float] = {}
+
+    def inc(self, labels: LabelValues = (), amount: float = 1):
+        """Increment counter by `amount`"""
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self) -> Iterator[str]:
+        for labels, value in self.values.items():
+            yield f"{self.name}{_format_labels(self.labels, labels)} {_format_value(value)}"
+
+
+class Gauge(Counter):
+    """Value that can go both up and down"""
+
+    kind = "gauge"
+
+    def dec(self, labels: LabelValues = (), amount: float = 1):
+        """Decrement gauge by `amount`"""
+        self.values[labels] = self.values.get(labels, 0) - amount
+
+    def set(self, value: float, labels: LabelValues = ()):
+        """Set gauge to `value`"""
+        self.values[labels] = value
+
+    @contextmanager
+    def track_inprogress(self, labels: LabelValues = ()) -> Iterator[None]:
+        """Increment gauge for the duration of the block"""
+        self.inc(labels)
+        try:
+            yield
+        finally:
+            self.dec(labels)
+
+
+class Histogram(Metric):
+    """Distribution of observed values in cumulative buckets"""
+
+    kind = "histogram"
+
+    def __init__(
+        self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS
+    ):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        self.series: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, labels: LabelValues = ()):
+        """Record observed `value`"""
+        series = self.series.get(labels)
+        if series is None:
+            # one slot per bucket, one for +Inf, followed by sum
+            series = self.series[labels] = [0] * (len(self.buckets) + 2)
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    @contextmanager
+    def time(self, labels: LabelValues = ()) -> Iterator[None]:
+        """Observe duration of the block in seconds"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, labels)
+
+    def samples(self) -> Iterator[str]:
+        for labels, series in self.series.items():
+            cumulative: float = 0
+            for bound, count in zip((*self.buckets, float("inf")), series):
+                cumulative += count
+                le_label = f'le="{_format_value(float(bound))}"'
+                yield f"{self.name}_bucket{_format_labels(self.labels, labels, le_label)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labels, labels)} {_format_value(series[-1])}"
+            yield f"{self.name}_count{_format_labels(self.labels, labels)} {cumulative}"
+
+
+class Registry:
+    """Collection of metrics rendered together"""
+
+    def __init__(self):
+        self.metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        """Add `metric` to the registry and return it"""
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Render all metrics in Prometheus text format"""
+        return "\n".join(metric.render() for metric in self.metrics) + "\n"
+
+
+registry = Registry()
+
+REQUESTS_IN_FLIGHT = Gauge("shopapi_http_requests_in_flight", "Number of HTTP requests being processed")
+REQUEST_DURATION = Histogram(
+    "shopapi_http_request_duration_seconds", "HTTP request latency", ("method", "handler", "status")
+)
+REQUEST_QUERIES = Histogram(
+    "shopapi_db_queries_per_request", "Number of SQL statements issued by a request", ("handler",), COUNT_BUCKETS
+)
+REQUEST_DB_TIME = Histogram(
+    "shopapi_db_time_per_request_seconds", "Time spent executing SQL statements per request", ("handler",)
+)
+QUERY_DURATION = Histogram("shopapi_db_query_duration_seconds", "SQL statement latency", ("connection",))
+QUERY_ERRORS = Counter("shopapi_db_query_errors_total", "Number of failed SQL statements", ("connection",))
+BCRYPT_IN_PROGRESS = Gauge("shopapi_bcrypt_in_progress", "Number of bcrypt operations being computed")
+BCRYPT_DURATION = Histogram("shopapi_bcrypt_duration_seconds", "Duration of bcrypt operations", ("operation",))
+CACHE_REQUESTS = Counter("shopapi_cache_requests_total", "Number of cache lookups", ("cache", "result"))
+COALESCED_REQUESTS = Counter(
+    "shopapi_coalesced_reads_total",
+    "Number of reads by whether they executed the query (leader) or shared an in-flight one (follower)",
+    ("operation", "result"),
+)
+EVENTS_PUBLISHED = Counter(
+    "shopapi_events_published_total", "Number of published write events", ("resource", "action")
+)
+EVENT_SUBSCRIBERS = Gauge("shopapi_event_subscribers", "Number of connected event stream clients")
+EVENT_SUBSCRIBERS_DROPPED = Counter(
+    "shopapi_event_subscribers_dropped_total", "Number of event stream clients disconnected for falling behind"
+)
+LOG_RECORDS_SUPPRESSED = Counter(
+    "shopapi_log_records_suppressed_total", "Number of repeated log records suppressed by rate limiting"
+)
+LOG_RECORDS_DROPPED = Counter("shopapi_log_records_dropped_total", "Number of log records dropped on full queue")
+BATCH_OPERATIONS = Counter(
+    "shopapi_batch_operations_total", "Number of operations executed in batches", ("method", "status")
+)
+ROUTE_CLASS_ACTIVE = Gauge(
+    "shopapi_route_class_active_requests", "Number of requests being processed by route class", ("route_class",)
+)
+ROUTE_CLASS_QUEUED = Gauge(
+    "shopapi_route_class_queued_requests", "Number of requests waiting for a slot by route class", ("route_class",)
+)
+ROUTE_CLASS_WAIT = Histogram(
+    "shopapi_route_class_wait_seconds", "Time requests waited for a slot of their route class", ("route_class",)
+)
+REQUESTS_SHED = Counter(
+    "shopapi_requests_shed_total",
+    "Number of requests rejected by load shedding, because the queue was full or the wait timed out",
+    ("route_class", "reason"),
+)
+
+for _metric in (
+    REQUESTS_IN_FLIGHT,
+    REQUEST_DURATION,
+    REQUEST_QUERIES,
+    REQUEST_DB_TIME,
+    QUERY_DURATION,
+    QUERY_ERRORS,
+    BCRYPT_IN_PROGRESS,
+    BCRYPT_DURATION,
+    CACHE_REQUESTS,
+    COALESCED_REQUESTS,
+    EVENTS_PUBLISHED,
+    EVENT_SUBSCRIBERS,
+    EVENT_SUBSCRIBERS_DROPPED,
+    LOG_RECORDS_SUPPRESSED,
+    LOG_RECORDS_DROPPED,
+    BATCH_OPERATIONS,
+    ROUTE_CLASS_ACTIVE,
+    ROUTE_CLASS_QUEUED,
+    ROUTE_CLASS_WAIT,
+    REQUESTS_SHED,
+):
+    registry.register(_metric)
+
+
+class RequestStats:
+    """Per-request database statistics"""
+
+    __slots__ = ("queries", "db_time")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+
+
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def observe_query(event: QueryEvent):
+    """Query listener recording SQL statement metrics, see `dbhooks.add_listener`"""
+    QUERY_DURATION.observe(event.duration, (event.connection,))
+    if event.failed:
+        QUERY_ERRORS.inc((event.connection,))
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_time += event.duration
+
+
+def cache_hit(cache: str):
+    """Record cache hit of cache named `cache`"""
+    CACHE_REQUESTS.inc((cache, "hit"))
+
+
+def cache_miss(cache: str):
+    """Record cache miss of cache named `cache`"""
+    CACHE_REQUESTS.inc((cache, "miss"))
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request latency, requests in flight and per-request database usage"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        REQUESTS_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            duration = time.perf_counter() - started
+            REQUESTS_IN_FLIGHT.dec()
+            _request_stats.reset(token)
+            handler = getattr(scope.get("endpoint"), "__name__", "unmatched")
+            REQUEST_DURATION.observe(duration, (scope["method"], handler, str(status)))
+            REQUEST_QUERIES.observe(stats.queries, (handler,))
+            REQUEST_DB_TIME.observe(stats.db_time, (handler,))
@@ -0,0 +1,226 @@
+"""On-demand sampling profiler of single requests, available to admins only
+"""
+
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from contextvars import ContextVar
+from typing import Deque, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from shopapi.config import Config
+from shopapi.helpers import dependencies as deps
+from shopapi.helpers import memory
+from shopapi.helpers.dbhooks import QueryEvent
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "x-profile"
+
+# first matching path fragment of the innermost frames decides where the sample belongs
+CATEGORIES: List[Tuple[str, str]] = [
+    ("/pydantic/", "pydantic"),
+    ("/passlib/", "bcrypt"),
+    ("/bcrypt/", "bcrypt"),
+    ("/jose/", "jose"),
+    ("/tortoise/", "orm"),
+    ("/pypika/", "orm"),
+    ("/aiosqlite/", "orm"),
+    ("/asyncpg/", "orm"),
+    ("/fastapi/", "framework"),
+    ("/starlette/", "framework"),
+]
+
+
+def _categorize(stack: Tuple[str, ...]) -> str:
+    if not stack:
+        return "other"
+    if "/selectors.py:" in stack[-1]:
+        # event loop is waiting for I/O, usually for the database
+        return "idle"
+    for frame in reversed(stack):
+        for fragment, category in CATEGORIES:
+            if fragment in frame:
+                return category
+    return "app"
+
+
+class Sampler(threading.Thread):
+    """Background thread sampling stack of thread `thread_id` every `interval` seconds"""
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(daemon=True, name="shopapi-profiler")
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)  # pylint: disable=protected-access
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_filename}:{code.co_name}")
+                frame = frame.f_back
+            self.samples[tuple(reversed(stack))] += 1
+
+    def stop(self):
+        """Stop sampling and wait for the thread to finish"""
+        self._stopped.set()
+        self.join()
+
+
+class Profile:  # pylint: disable=too-many-instance-attributes
+    """Profile of a single request"""
+
+    def __init__(self, method: str, path: str, interval: float):
+        self.id = uuid.uuid4().hex
+        self.method = method
+        self.path = path
+        self.interval = interval
+        self.started = time.perf_counter()
+        self.duration = 0.0
+        self.db_time = 0.0
+        self.db_queries = 0
+        self.samples: Counter = Counter()
+
+    def folded(self) -> str:
+        """Samples in folded stack format, as accepted by flamegraph.pl or speedscope"""
+        lines = []
+        for stack, count in self.samples.most_common():
+            frames = [_short_frame(frame) for frame in stack]
+            lines.append(f"{';'.join(frames)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def categories(self) -> Dict[str, float]:
+        """Sampled wall time in seconds by category, `db` is measured exactly from executed statements"""
+        times: Dict[str, float] = {}
+        for stack, count in self.samples.items():
+            category = _categorize(stack)
+            times[category] = times.get(category, 0.0) + count * self.interval
+        return {"db": self.db_time, **times}
+
+    def summary(self) -> Dict:
+        """Summary of the profile"""
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "duration": self.duration,
+            "db_queries": self.db_queries,
+            "samples": sum(self.samples.values()),
+            "categories": self.categories(),
+        }
+
+
+def _short_frame(frame: str) -> str:
+    filename, _, function = frame.rpartition(":")
+    for marker in ("/site-packages/", "/lib/python"):
+        if marker in filename:
+            filename = filename.split(marker, 1)[1]
+            break
+    return f"{filename.replace(os.sep, '/')}:{function}"
+
+
+profiles: Deque[Profile] = deque(maxlen=Config.Profiling.keep)
+memory.register_cache("profiles", lambda: profiles)
+
+_active: ContextVar[Optional[Profile]] = ContextVar("active_profile", default=None)
+
+
+def get_profile(profile_id: str) -> Optional[Profile]:
+    """Get stored profile by its id"""
+    for profile in profiles:
+        if profile.id == profile_id:
+            return profile
+    return None
+
+
+def record_query(event: QueryEvent):
+    """Query listener adding statement duration to the active profile, see `dbhooks.add_listener`"""
+    profile = _active.get()
+    if profile is not None:
+        profile.db_queries += 1
+        profile.db_time += event.duration
+
+
+async def _is_admin(request: Request) -> bool:
+    try:
+        token = await deps.get_user_token(
+            token=request.query_params.get("token"),
+            x_token=request.headers.get("x-token"),
+            authorization=request.headers.get("authorization"),
+            sessiontoken=request.cookies.get("sessiontoken"),
+        )
+        user = await deps.get_user(await deps.get_user_token_strict(token))
+        await deps.get_admin_role(await deps.get_user_role(user))
+    except HTTPException:
+        return False
+    return True
+
+
+def _store(profile: Profile):
+    profiles.append(profile)
+    if Config.Profiling.directory:
+        os.makedirs(Config.Profiling.directory, exist_ok=True)
+        path = os.path.join(Config.Profiling.directory, f"{profile.id}.folded")
+        with open(path, "w", encoding="utf-8") as fid:
+            fid.write(profile.folded())
+
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling requests sent with `X-Profile: 1` header by an admin.
+    Response carries `X-Profile-Id` header (profile can be downloaded from `/service/profiles/{id}`)
+    and `X-Profile-Summary` header with time spent by category in milliseconds.
+    Samples are taken from the event loop thread, so concurrent requests show up in the profile as well.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not any(
+            key == PROFILE_HEADER.encode("latin-1") and value in (b"1", b"true") for key, value in scope["headers"]
+        ):
+            await self.app(scope, receive, send)
+            return
+        if not await _is_admin(Request(scope)):
+            logger.warning("Profiling of %s %s was requested by a non-admin user", scope["method"], scope["path"])
+            await self.app(scope, receive, send)
+            return
+
+        profile = Profile(scope["method"], scope["path"], Config.Profiling.interval_ms / 1000)
+        sampler = Sampler(threading.get_ident(), profile.interval)
+        token = _active.set(profile)
+        sampler.start()
+
+        def finish():
+            if sampler.is_alive():
+                sampler.stop()
+                profile.duration = time.perf_counter() - profile.started
+                profile.samples = sampler.samples
+                _store(profile)
+
+        async def send_with_profile(message):
+            if message["type"] == "http.response.start":
+                finish()
+                summary = ";".join(f"{name}={value * 1000:.1f}" for name, value in profile.categories().items())
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (b"x-profile-id", profile.id.encode("latin-1")),
+                    (b"x-profile-summary", summary.encode("latin-1")),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_profile)
+        finally:
+            finish()
+            _active.reset(token)
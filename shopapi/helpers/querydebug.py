@@ -0,0 +1,118 @@
+"""Debug-mode SQL statement recording, N+1 pattern detection and per-request query budget
+"""
+
+import logging
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, List, Optional, Tuple
+
+from shopapi.config import Config
+from shopapi.helpers.dbhooks import QueryEvent, fingerprint
+
+logger = logging.getLogger(__name__)
+
+
+class QueryRecorder:
+    """Collects SQL statements executed while it is active"""
+
+    def __init__(self, budget: Optional[int] = None, repeated_threshold: Optional[int] = None):
+        self.budget = budget if budget is not None else Config.Debug.query_budget
+        self.repeated_threshold = (
+            repeated_threshold if repeated_threshold is not None else Config.Debug.repeated_query_threshold
+        )
+        self.events: List[QueryEvent] = []
+
+    @property
+    def count(self) -> int:
+        """Number of recorded statements"""
+        return len(self.events)
+
+    @property
+    def duration(self) -> float:
+        """Total time spent executing recorded statements in seconds"""
+        return sum(event.duration for event in self.events)
+
+    @property
+    def over_budget(self) -> bool:
+        """Returns True if more statements than `budget` were recorded"""
+        return self.count > self.budget
+
+    def shapes(self) -> List[Tuple[str, int]]:
+        """List recorded statement shapes with number of occurrences, most frequent first"""
+        return Counter(fingerprint(event.sql) for event in self.events).most_common()
+
+    def repeated(self) -> List[Tuple[str, int]]:
+        """List statement shapes executed at least `repeated_threshold` times, these are likely N+1 patterns"""
+        return [(shape, count) for shape, count in self.shapes() if count >= self.repeated_threshold]
+
+
+_recorder: ContextVar[Optional[QueryRecorder]] = ContextVar("query_recorder", default=None)
+
+
+def record_query(event: QueryEvent):
+    """Query listener appending statements to the active recorder, see `dbhooks.add_listener`"""
+    recorder = _recorder.get()
+    if recorder is not None:
+        recorder.events.append(event)
+
+
+@contextmanager
+def recording(budget: Optional[int] = None, repeated_threshold: Optional[int] = None) -> Iterator[QueryRecorder]:
+    """Record all statements executed in the current context inside the block.
+    `record_query` must be registered as a query listener.
+    """
+    recorder = QueryRecorder(budget, repeated_threshold)
+    token = _recorder.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _recorder.reset(token)
+
+
+def report(recorder: QueryRecorder, handler: str):
+    """Log budget violations and likely N+1 patterns found in `recorder`"""
+    if recorder.over_budget:
+        logger.warning(
+            "Handler '%s' executed %d SQL statements, query budget is %d", handler, recorder.count, recorder.budget
+        )
+    for shape, count in recorder.repeated():
+        logger.warning("Possible N+1 in handler '%s', statement executed %d times: %s", handler, count, shape)
+
+
+class QueryDebugMiddleware:
+    """ASGI middleware recording SQL statements of each request.
+    Statistics are returned in response headers:
+
+        - `X-Query-Count` number of statements
+        - `X-Query-Time` time spent executing statements in milliseconds
+        - `X-Query-Budget` configured budget
+        - `X-Query-Over-Budget` `1` if the budget was exceeded, `0` otherwise
+        - `X-Query-Repeated` number of statement shapes repeated at least `repeated_query_threshold` times
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with recording() as recorder:
+
+            async def send_with_stats(message):
+                if message["type"] == "http.response.start":
+                    handler = getattr(scope.get("endpoint"), "__name__", "unmatched")
+                    report(recorder, handler)
+                    message["headers"] = [
+                        *message.get("headers", []),
+                        (b"x-query-count", str(recorder.count).encode("latin-1")),
+                        (b"x-query-time", f"{recorder.duration * 1000:.3f}".encode("latin-1")),
+                        (b"x-query-budget", str(recorder.budget).encode("latin-1")),
+                        (b"x-query-over-budget", b"1" if recorder.over_budget else b"0"),
+                        (b"x-query-repeated", str(len(recorder.repeated())).encode("latin-1")),
+                    ]
+                await send(message)
+
+            await self.app(scope, receive, send_with_stats)
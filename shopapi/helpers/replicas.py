@@ -0,0 +1,117 @@
+"""Read replica routing helpers
+"""
+
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Dict, Iterator, List, Tuple, TypeVar
+
+from tortoise.transactions import current_transaction_map
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.exceptions import DBConnectionError, DoesNotExist, OperationalError
+
+from shopapi.config import Config, build_db_connections
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+PRIMARY = "default"
+
+_primary_pinned: ContextVar[bool] = ContextVar("primary_pinned", default=False)
+
+
+def pin_primary():
+    """Route all subsequent reads within the current context (request) to the primary database.
+    Used after writes so that the client always reads its own writes.
+    """
+    _primary_pinned.set(True)
+
+
+def primary_pinned() -> bool:
+    """Returns True if reads of the current context are pinned to the primary database"""
+    return _primary_pinned.get()
+
+
+@contextmanager
+def use_primary() -> Iterator[None]:
+    """Context manager routing all reads inside the block to the primary database"""
+    token = _primary_pinned.set(True)
+    try:
+        yield
+    finally:
+        _primary_pinned.reset(token)
+
+
+def _connection(name: str) -> BaseDBAsyncClient:
+    """Client of connection `name`, or of the transaction open on it in the current context"""
+    return current_transaction_map[name].get()
+
+
+class ReplicaRouter:
+    """Round-robin router over read replicas.
+    Replicas that fail are ejected for `eject_seconds` and reads fall back to the primary.
+    """
+
+    def __init__(self, replicas: List[str], eject_seconds: int = 30):
+        self.replicas = replicas
+        self.eject_seconds = eject_seconds
+        self._ejected_until: Dict[str, float] = {}
+        self._next = 0
+
+    @property
+    def enabled(self) -> bool:
+        """Returns True if there is at least one replica configured"""
+        return bool(self.replicas)
+
+    def healthy(self) -> List[str]:
+        """List replicas that are not currently ejected"""
+        now = time.monotonic()
+        return [name for name in self.replicas if self._ejected_until.get(name, 0) <= now]
+
+    def eject(self, name: str):
+        """Stop routing reads to replica `name` for `eject_seconds`"""
+        self._ejected_until[name] = time.monotonic() + self.eject_seconds
+        logger.warning("Replica '%s' was ejected for %d seconds", name, self.eject_seconds)
+
+    def pick(self) -> str:
+        """Return name of the connection the next read should be routed to"""
+        if not self.replicas or _primary_pinned.get():
+            return PRIMARY
+        healthy = self.healthy()
+        if not healthy:
+            return PRIMARY
+        self._next = (self._next + 1) % len(healthy)
+        return healthy[self._next]
+
+    def db_for_read(self) -> Tuple[str, BaseDBAsyncClient]:
+        """Return name and client of the connection the next read should be routed to"""
+        name = self.pick()
+        return name, _connection(name)
+
+    @staticmethod
+    def db_for_write() -> BaseDBAsyncClient:
+        """Return primary database client"""
+        return _connection(PRIMARY)
+
+    async def read(self, query: Callable[[BaseDBAsyncClient], Awaitable[T]]) -> T:
+        """Run read `query` against a replica. If the replica fails, it is ejected
+        and the query is retried against the primary.
+        """
+        name, db = self.db_for_read()
+        if name == PRIMARY:
+            return await query(db)
+        try:
+            return await query(db)
+        except DoesNotExist:
+            raise
+        except (DBConnectionError, OperationalError) as error:
+            logger.error(error)
+            self.eject(name)
+        return await query(self.db_for_write())
+
+
+router = ReplicaRouter(
+    [name for name in build_db_connections() if name != PRIMARY], Config.Database.replica_eject_seconds
+)
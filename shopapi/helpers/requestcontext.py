@@ -0,0 +1,76 @@
+"""Request context available anywhere down the call stack, e.g. in database query listeners
+"""
+
+import functools
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, Optional, TypeVar, cast
+
+from shopapi.helpers import identitymap, tracing
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+_scope: ContextVar[Optional[Dict[str, Any]]] = ContextVar("request_scope", default=None)
+_operation: ContextVar[Optional[str]] = ContextVar("resource_operation", default=None)
+
+
+def route() -> Optional[str]:
+    """Name of the endpoint handling the current request, None outside of a request"""
+    scope = _scope.get()
+    if scope is None:
+        return None
+    return getattr(scope.get("endpoint"), "__name__", None) or scope.get("path")
+
+
+def operation() -> Optional[str]:
+    """Name of the outermost `ResourceOperator` method currently running, e.g. `TagOperator.list`"""
+    return _operation.get()
+
+
+def tracked(method: F) -> F:
+    """Decorator of async `ResourceOperator` methods recording the method in the context, see `operation`,
+    and as a tracing span
+    """
+
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        name = f"{self.__class__.__name__}.{method.__name__}"
+        with tracing.span(name):
+            if _operation.get() is not None:
+                return await method(self, *args, **kwargs)
+            token = _operation.set(name)
+            try:
+                return await method(self, *args, **kwargs)
+            finally:
+                _operation.reset(token)
+
+    return cast(F, wrapper)
+
+
+@contextmanager
+def sub_request(scope: Dict[str, Any]) -> Iterator[None]:
+    """Make `scope` of a sub-request run within the current request (see `batch`) current for the block,
+    the identity map of the enclosing request is shared
+    """
+    token = _scope.set(scope)
+    try:
+        yield
+    finally:
+        _scope.reset(token)
+
+
+class RequestContextMiddleware:
+    """ASGI middleware making the current request scope available through `route`
+    and opening request-scoped identity map, see `identitymap`
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        token = _scope.set(scope)
+        try:
+            with identitymap.scope():
+                await self.app(scope, receive, send)
+        finally:
+            _scope.reset(token)
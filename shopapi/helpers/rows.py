@@ -0,0 +1,114 @@
+"""Lightweight read-only rows for list queries, used instead of full Tortoise model instances
+"""
+
+from collections import defaultdict, namedtuple
+from operator import itemgetter
+from typing import Any, Dict, List, Sequence, Tuple, Type
+
+from pypika import Table  # type: ignore
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.fields.relational import BackwardFKRelation, ForeignKeyFieldInstance, ManyToManyFieldInstance
+from tortoise.models import Model
+from tortoise.queryset import QuerySet
+
+from shopapi.helpers import memory
+
+Values = Tuple[Any, ...]
+
+_row_types: Dict[Tuple[Type[Model], Tuple[str, ...]], Type[Any]] = {}
+memory.register_cache("row_types", lambda: _row_types)
+
+
+def columns(model: Type[Model]) -> Tuple[str, ...]:
+    """Names of fields of `model` stored in its own table, including foreign key ids like `parent_category_id`"""
+    return tuple(model._meta.fields_db_projection)  # pylint: disable=protected-access
+
+
+def row_type(model: Type[Model], relations: Sequence[str] = ()) -> Type[Any]:
+    """Named tuple type with `model` columns followed by `relations` as attributes.
+    Like model instances, rows expose `pk` and `_meta`, so that schemas can tell columns and relations apart.
+    """
+    key = (model, tuple(relations))
+    row_cls = _row_types.get(key)
+    if row_cls is None:
+        name = f"{model.__name__}Row"
+        base = namedtuple(name, columns(model) + key[1])  # type: ignore
+        meta = model._meta  # pylint: disable=protected-access
+        pk = property(itemgetter(columns(model).index(meta.pk_attr)))
+        row_cls = _row_types[key] = type(name, (base,), {"__slots__": (), "_meta": meta, "pk": pk})
+    return row_cls
+
+
+async def _values(model: Type[Model], db: BaseDBAsyncClient, **filters) -> List[Values]:
+    return await model.filter(**filters).using_db(db).values_list(*columns(model))
+
+
+async def _many_to_many(field: ManyToManyFieldInstance, ids: List[Any], db: BaseDBAsyncClient) -> Dict[Any, Any]:
+    """Return lists of rows related through `field` by owner id, in the order of the links"""
+    related_cls = row_type(field.related_model)
+    through = Table(field.through)
+    query = (
+        db.query_class.from_(through)
+        .select(through[field.backward_key], through[field.forward_key])
+        .where(through[field.backward_key].isin(ids))
+    )
+    _, links = await db.execute_query(str(query))
+    related_ids = list({link[field.forward_key] for link in links})
+    by_id = {row.pk: row for row in map(related_cls._make, await _values(field.related_model, db, pk__in=related_ids))}
+    grouped: Dict[Any, Any] = defaultdict(list)
+    for link in links:
+        # links and related rows are read by separate queries, the related row may be deleted in between
+        related = by_id.get(link[field.forward_key])
+        if related is not None:
+            grouped[link[field.backward_key]].append(related)
+    return grouped
+
+
+async def _related(
+    model: Type[Model], relation: str, values: List[Values], db: BaseDBAsyncClient
+) -> Tuple[int, Dict[Any, Any]]:
+    """Fetch `relation` of resources `values` of `model` in bulk.
+    Returns position of the key in `values` and mapping of the key to related row (forward foreign keys)
+    or list of related rows (many-to-many and backward foreign keys).
+    """
+    field = model._meta.fields_map[relation]  # pylint: disable=protected-access
+    related = field.related_model  # type: ignore
+    related_cls = row_type(related)
+    pk_position = columns(model).index(model._meta.pk_attr)  # pylint: disable=protected-access
+    ids = [row[pk_position] for row in values]
+    if isinstance(field, ManyToManyFieldInstance):
+        return pk_position, await _many_to_many(field, ids, db)
+    if isinstance(field, ForeignKeyFieldInstance):
+        position = columns(model).index(field.source_field)
+        related_ids = list({row[position] for row in values if row[position] is not None})
+        return position, {
+            row.pk: row for row in map(related_cls._make, await _values(related, db, pk__in=related_ids))
+        }
+    if isinstance(field, BackwardFKRelation):
+        grouped: Dict[Any, Any] = defaultdict(list)
+        for row in map(related_cls._make, await _values(related, db, **{f"{field.relation_field}__in": ids})):
+            grouped[getattr(row, field.relation_field)].append(row)
+        return pk_position, grouped
+    raise TypeError(f"Relation {relation} of {model.__name__} can not be fetched as rows")
+
+
+async def fetch(query: QuerySet, relations: Sequence[str], db: BaseDBAsyncClient) -> List[Any]:
+    """Execute `query` using `db` and return read-only rows (see `row_type`) instead of model instances,
+    with `relations` fetched in bulk, one query per relation (two for many-to-many relations).
+    Rows are not tracked by the ORM and can not be saved or awaited, use them only for reading.
+    """
+    model = query.model
+    values = await query.using_db(db).values_list(*columns(model))
+    row_cls = row_type(model, relations)
+    if not values:
+        return []
+    if not relations:
+        return [row_cls._make(row) for row in values]
+    attached = []
+    for relation in relations:
+        position, related = await _related(model, relation, values, db)
+        # forward foreign keys hold a single row (or None), other relations lists of rows
+        field = model._meta.fields_map[relation]  # pylint: disable=protected-access
+        default: Any = None if isinstance(field, ForeignKeyFieldInstance) else []
+        attached.append([related.get(row[position], default) for row in values])
+    return [row_cls._make(row + extra) for row, extra in zip(values, zip(*attached))]
@@ -12,7 +12,7 @@ from tortoise.exceptions import DoesNotExist
 
 from shopapi.schemas import schemas, models
 from shopapi import constants
-from shopapi.helpers import exceptions
+from shopapi.helpers import exceptions, identitymap, metrics, tracing
 from shopapi.config import Config
 
 logger = logging.getLogger(__name__)
@@ -26,12 +26,16 @@ def verify_password(pwd_test: str, pwd_hash: str) -> bool:
     Returns:
         bool -- True or False whether verified
     """
-    return pwd_context.verify(pwd_test, pwd_hash)
+    with tracing.span("bcrypt.verify"):
+        with metrics.BCRYPT_IN_PROGRESS.track_inprogress(), metrics.BCRYPT_DURATION.time(("verify",)):
+            return pwd_context.verify(pwd_test, pwd_hash)
 
 
 def get_password_hash(password: str) -> bytes:
     """Get password string hashed to be saved in db"""
-    return pwd_context.hash(password).encode("ascii")
+    with tracing.span("bcrypt.hash"):
+        with metrics.BCRYPT_IN_PROGRESS.track_inprogress(), metrics.BCRYPT_DURATION.time(("hash",)):
+            return pwd_context.hash(password).encode("ascii")
 
 
 def create_access_token(
@@ -57,38 +61,45 @@ def create_access_token(
     return jwt_content
 
 
-async def decode_jwt(token: str) -> Mapping:
-    """Get token info from token"""
+def verify_token(token: str) -> Mapping:
+    """Verify token signature and validity period and return its payload.
+    Does not check the user against the database, see `decode_jwt`.
+    """
     try:
         payload = jwt.decode(token, Config.secret_key, algorithms=[constants.JWT_ALGORITHM])
-        expires = datetime.fromtimestamp(float(payload.get("exp", 0)))
-        not_before = datetime.fromtimestamp(float(payload.get("nbf", 0)))
-        now = datetime.utcnow()
-        if expires < now:
-            logger.info("Expired token: %s, expires: %s", payload, expires)
-            raise exceptions.CredentialsExpired()
-        if now < not_before:
-            logger.info("Token not valid yet: %s, not-before: %s", payload, not_before)
-            raise exceptions.CredentialsException()
-        sid: Optional[int] = payload.get("sid")
-        if sid is None:
-            raise exceptions.CredentialsException()
-        try:
-            user_db = await models.User.get(id=sid)
-        except DoesNotExist as error:
-            logger.warning("Someone is probably trying to login with a non-existing account")
-            logger.warning(error)
-            logger.warning(payload)
-            raise exceptions.CredentialsException()
-        rid: Optional[int] = payload.get("rid")
-        if rid is None:
-            raise exceptions.CredentialsException()
-        if rid != (await user_db.role).id:
-            raise exceptions.CredentialsExpired()
-        return payload
     except JWTError as error:
         logger.error(error)
         raise exceptions.CredentialsException()
+    expires = datetime.fromtimestamp(float(payload.get("exp", 0)))
+    not_before = datetime.fromtimestamp(float(payload.get("nbf", 0)))
+    now = datetime.utcnow()
+    if expires < now:
+        logger.info("Expired token of user %s, expires: %s", payload.get("sid"), expires)
+        raise exceptions.CredentialsExpired()
+    if now < not_before:
+        logger.info("Token of user %s not valid yet, not-before: %s", payload.get("sid"), not_before)
+        raise exceptions.CredentialsException()
+    return payload
+
+
+async def decode_jwt(token: str) -> Mapping:
+    """Get token info from token"""
+    payload = verify_token(token)
+    sid: Optional[int] = payload.get("sid")
+    if sid is None:
+        raise exceptions.CredentialsException()
+    try:
+        user_db = await identitymap.get(models.User, sid)
+    except DoesNotExist as error:
+        # the payload is not logged as a whole, it contains personal data
+        logger.warning("Someone is probably trying to login with a non-existing account %s: %s", sid, error)
+        raise exceptions.CredentialsException()
+    rid: Optional[int] = payload.get("rid")
+    if rid is None:
+        raise exceptions.CredentialsException()
+    if rid != user_db.role_id:  # type: ignore
+        raise exceptions.CredentialsExpired()
+    return payload
 
 
 async def user_from_jwt(token: str) -> schemas.UserFromDB:
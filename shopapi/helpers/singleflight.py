@@ -0,0 +1,43 @@
+"""Single-flight coalescing of identical concurrent calls
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+from shopapi.config import Config
+from shopapi.helpers import metrics
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Concurrent calls of `do` with the same key share a single execution of the first caller's function.
+    The execution runs in its own task, so it is not cancelled if the first caller goes away.
+    """
+
+    def __init__(self):
+        self.flights: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, operation: str, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        """Return result of `func`, or of an identical in-flight call of `operation` with the same `key`"""
+        if not Config.Coalescing.enabled:
+            return await func()
+        flight_key = (operation, key)
+        flight = self.flights.get(flight_key)
+        if flight is not None:
+            metrics.COALESCED_REQUESTS.inc((operation, "follower"))
+            return await asyncio.shield(flight)
+        metrics.COALESCED_REQUESTS.inc((operation, "leader"))
+        flight = asyncio.ensure_future(func())
+        self.flights[flight_key] = flight
+        flight.add_done_callback(lambda _: self._land(flight_key, flight))
+        return await asyncio.shield(flight)
+
+    def _land(self, flight_key: Hashable, flight: asyncio.Future):
+        self.flights.pop(flight_key, None)
+        if not flight.cancelled():
+            # retrieve the exception, all callers may have gone away already
+            flight.exception()
+
+
+group = SingleFlight()
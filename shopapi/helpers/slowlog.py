@@ -0,0 +1,83 @@
+"""Slow query log and per-fingerprint statement statistics
+"""
+
+import logging
+from typing import Dict, List, Optional
+
+from shopapi.config import Config
+from shopapi.helpers import memory, requestcontext
+from shopapi.helpers.dbhooks import QueryEvent, fingerprint
+
+logger = logging.getLogger(__name__)
+
+SORT_KEYS = ("total", "max", "count", "slow")
+
+
+class FingerprintStats:
+    """Aggregated statistics of all statements sharing one fingerprint"""
+
+    __slots__ = ("fingerprint", "count", "total", "max", "slow", "route", "operation")
+
+    def __init__(self, shape: str):
+        self.fingerprint = shape
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.slow = 0
+        self.route: Optional[str] = None
+        self.operation: Optional[str] = None
+
+    def as_dict(self) -> Dict:
+        """Statistics as json-serializable dict, times in milliseconds"""
+        return {
+            "fingerprint": self.fingerprint,
+            "count": self.count,
+            "slow": self.slow,
+            "total_ms": self.total * 1000,
+            "mean_ms": self.total / self.count * 1000 if self.count else 0.0,
+            "max_ms": self.max * 1000,
+            "route": self.route,
+            "operation": self.operation,
+        }
+
+
+stats: Dict[str, FingerprintStats] = {}
+memory.register_cache("slow_queries", lambda: stats)
+
+
+def record_query(event: QueryEvent):
+    """Query listener aggregating statistics and logging slow statements, see `dbhooks.add_listener`"""
+    shape = fingerprint(event.sql)
+    entry = stats.get(shape)
+    if entry is None:
+        if len(stats) >= Config.SlowQueries.keep:
+            del stats[min(stats.values(), key=lambda item: item.total).fingerprint]
+        entry = stats[shape] = FingerprintStats(shape)
+    entry.count += 1
+    entry.total += event.duration
+    entry.max = max(entry.max, event.duration)
+    if event.duration * 1000 < Config.SlowQueries.threshold_ms:
+        return
+    entry.slow += 1
+    entry.route = requestcontext.route()
+    entry.operation = requestcontext.operation()
+    logger.warning(
+        "Slow query (%.1f ms) in route '%s', operation '%s': %s",
+        event.duration * 1000,
+        # background jobs run outside of any route, plain functions outside of any operator method
+        entry.route or "-",
+        entry.operation or "-",
+        shape,
+    )
+
+
+def top(sort: str = "total", limit: int = 20) -> List[Dict]:
+    """Return statistics of `limit` fingerprints with the highest `sort` key"""
+    if sort not in SORT_KEYS:
+        raise ValueError(f"Unknown sort key '{sort}'")
+    return [entry.as_dict() for entry in sorted(stats.values(), key=lambda e: getattr(e, sort), reverse=True)][:limit]
+
+
+def reset():
+    """Forget all collected statistics"""
+    stats.clear()
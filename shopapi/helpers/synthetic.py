@@ -0,0 +1,174 @@
+"""Synthetic data generator for reproducing production-scale volumes locally
+"""
+
+import logging
+import random
+import time
+from typing import Awaitable, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Type
+
+from pypika import Table  # type: ignore
+from tortoise.transactions import in_transaction
+
+from shopapi.helpers import security, utils
+from shopapi.schemas import api, models
+from shopapi.schemas.base import BaseModelTortoise
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "synthetic"
+EMAIL_DOMAIN = "synthetic-shopapi.demo"
+
+WORDS = (
+    "red blue green black white vintage classic modern sporty elegant casual wool cotton leather silk "
+    "summer winter limited premium eco"
+).split()
+
+
+def _batches(total: int, batch_size: int) -> Iterator[range]:
+    for start in range(0, total, batch_size):
+        yield range(start, min(start + batch_size, total))
+
+
+def _words(rng: random.Random, count: int = 2) -> str:
+    return " ".join(rng.choices(WORDS, k=count))
+
+
+async def _ids(model: Type[BaseModelTortoise], field: str, prefix: str) -> List[int]:
+    return await model.filter(**{f"{field}__startswith": prefix}).order_by("id").values_list("id", flat=True)
+
+
+async def _link(through: str, columns: Tuple[str, str], pairs: Sequence[Tuple[int, int]], batch_size: int):
+    """Insert `pairs` into m2m `through` table in batches, each batch in one transaction"""
+    table = Table(through)
+    for batch in _batches(len(pairs), batch_size):
+        async with in_transaction() as connection:
+            query = connection.query_class.into(table).columns(*columns)
+            for index in batch:
+                query = query.insert(*pairs[index])
+            await connection.execute_query(str(query))
+
+
+def _sample_pairs(rng: random.Random, owners: List[int], related: List[int], per_owner: int) -> List[Tuple[int, int]]:
+    per_owner = min(per_owner, len(related))
+    return [(owner, related_id) for owner in owners for related_id in rng.sample(related, per_owner)]
+
+
+async def create_users(params: api.SyntheticDataIn, rng: random.Random):
+    """Create users sharing a single password hash, so that only one bcrypt round is paid"""
+    password_hash = security.get_password_hash(params.password)
+    for batch in _batches(params.users, params.batch_size):
+        await utils.BatchWrite().create(
+            models.User,
+            [
+                models.User(
+                    email=f"{PREFIX}.user{index}@{EMAIL_DOMAIN}",
+                    password_hash=password_hash,
+                    first_name=rng.choice(WORDS).capitalize(),
+                    last_name=f"{rng.choice(WORDS).capitalize()}{index}",
+                    role_id=params.role_id,
+                )
+                for index in batch
+            ],
+        ).execute()
+
+
+async def create_tags(params: api.SyntheticDataIn) -> List[int]:
+    """Create tags and return their ids"""
+    for batch in _batches(params.tags, params.batch_size):
+        tags = [models.Tag(name=f"{PREFIX}-tag-{index}") for index in batch]
+        await utils.BatchWrite().create(models.Tag, tags).execute()
+    return await _ids(models.Tag, "name", f"{PREFIX}-tag-")
+
+
+async def create_categories(params: api.SyntheticDataIn, rng: random.Random) -> List[int]:
+    """Create category trees `category_depth` levels deep, every level has the same number of categories
+    and each category is attached to a random parent from the level above. Returns ids of all categories.
+    """
+    per_level = -(-params.categories // params.category_depth)
+    parents: List[int] = []
+    all_ids: List[int] = []
+    for level in range(params.category_depth):
+        first = level * per_level
+        count = min(per_level, params.categories - first)
+        if count <= 0:
+            break
+        for batch in _batches(count, params.batch_size):
+            await utils.BatchWrite().create(
+                models.Category,
+                [
+                    models.Category(
+                        title=f"{PREFIX}-L{level}-{first + index} {_words(rng)}",
+                        parent_category_id=rng.choice(parents) if parents else None,
+                    )
+                    for index in batch
+                ],
+            ).execute()
+        parents = await _ids(models.Category, "title", f"{PREFIX}-L{level}-")
+        all_ids.extend(parents)
+    return all_ids
+
+
+async def create_products(params: api.SyntheticDataIn, rng: random.Random, category_ids: List[int]) -> List[int]:
+    """Create products in random categories and return their ids"""
+    for batch in _batches(params.products, params.batch_size):
+        await utils.BatchWrite().create(
+            models.Product,
+            [
+                models.Product(
+                    title=f"{PREFIX} {_words(rng)} {index}",
+                    short_description=_words(rng, 12),
+                    category_id=rng.choice(category_ids) if category_ids else None,
+                )
+                for index in batch
+            ],
+        ).execute()
+    return await _ids(models.Product, "title", f"{PREFIX} ")
+
+
+async def _no_progress(_fraction: float, _message: Optional[str] = None):
+    pass
+
+
+async def generate(
+    params: api.SyntheticDataIn, progress: Callable[[float, Optional[str]], Awaitable[None]] = _no_progress
+) -> Dict[str, float]:
+    """Generate synthetic data, the same `params` (including `seed`) always produce the same data.
+    `progress` is awaited after every stage, e.g. to update a background job.
+    Returns number of created rows by table and elapsed time in seconds.
+    """
+    started = time.perf_counter()
+    rng = random.Random(params.seed)
+    await create_users(params, rng)
+    await progress(0.3, "Users created")
+    tag_ids = await create_tags(params)
+    category_ids = await create_categories(params, rng)
+    category_tags = _sample_pairs(rng, category_ids, tag_ids, params.tags_per_category)
+    await _link("category_tag", ("category_id", "tag_id"), category_tags, params.batch_size)
+    await progress(0.5, "Tags and categories created")
+    product_ids = await create_products(params, rng, category_ids)
+    await progress(0.7, "Products created")
+    product_tags = _sample_pairs(rng, product_ids, tag_ids, params.tags_per_product)
+    await _link("product_tag", ("product_id", "tag_id"), product_tags, params.batch_size)
+    elapsed = time.perf_counter() - started
+    logger.info("Synthetic data generated in %.1f s", elapsed)
+    return {
+        "users": params.users,
+        "tags": len(tag_ids),
+        "categories": len(category_ids),
+        "category_tag": len(category_tags),
+        "products": len(product_ids),
+        "product_tag": len(product_tags),
+        "elapsed": elapsed,
+    }
+
+
+async def delete():
+    """Delete all synthetic data, relations are removed by cascades"""
+    await (
+        utils.BatchWrite()
+        .delete(models.Product, title__startswith=f"{PREFIX} ")
+        .delete(models.Category, title__startswith=f"{PREFIX}-L")
+        .delete(models.Tag, name__startswith=f"{PREFIX}-tag-")
+        .delete(models.User, email__endswith=f"@{EMAIL_DOMAIN}")
+        .execute()
+    )
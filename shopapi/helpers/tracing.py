@@ -0,0 +1,303 @@
+"""Lightweight tracing: spans of requests, operator methods, dependencies, bcrypt and SQL statements
+with W3C trace context (`traceparent` header) propagation and pluggable exporters
+"""
+
+import functools
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, TypeVar, cast
+
+from shopapi.config import Config
+from shopapi.helpers import memory
+from shopapi.helpers.dbhooks import QueryEvent, fingerprint
+
+logger = logging.getLogger(__name__)
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+TRACEPARENT_HEADER = "traceparent"
+
+_TRACEPARENT = re.compile(r"^([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+_INVALID_TRACE_ID = "0" * 32
+_INVALID_SPAN_ID = "0" * 16
+
+
+class Span:  # pylint: disable=too-many-instance-attributes
+    """Timed operation within a trace, times are in seconds since the epoch"""
+
+    __slots__ = ("trace", "span_id", "parent_id", "name", "kind", "start", "end", "attributes", "error")
+
+    def __init__(self, trace: "Trace", name: str, parent_id: Optional[str], kind: str = "internal"):
+        self.trace = trace
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start = time.time()
+        self.end: Optional[float] = None
+        self.attributes: Dict[str, Any] = {}
+        self.error: Optional[str] = None
+
+    @property
+    def duration(self) -> float:
+        """Duration in seconds, 0 while the span is open"""
+        return self.end - self.start if self.end is not None else 0.0
+
+    def traceparent(self) -> str:
+        """W3C `traceparent` header value identifying this span, for propagation to downstream services"""
+        return f"00-{self.trace.trace_id}-{self.span_id}-01"
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Span as json-serializable dictionary"""
+        return {
+            "trace_id": self.trace.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start": self.start,
+            "duration": self.duration,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class Trace:
+    """Finished spans of a single trace, exported once its local root span ends"""
+
+    __slots__ = ("trace_id", "root", "spans", "dropped")
+
+    def __init__(self, trace_id: str):
+        self.trace_id = trace_id
+        self.root: Optional[Span] = None
+        self.spans: List[Span] = []
+        self.dropped = 0
+
+    def add(self, finished: Span):
+        """Add `finished` span, spans over `Config.Tracing.max_spans` (except the root) are only counted"""
+        if len(self.spans) < Config.Tracing.max_spans or finished is self.root:
+            self.spans.append(finished)
+        else:
+            self.dropped += 1
+
+    def summary(self) -> Dict[str, Any]:
+        """Root span of the trace with number of spans"""
+        root = cast(Span, self.root)
+        return {
+            "trace_id": self.trace_id,
+            "name": root.name,
+            "start": root.start,
+            "duration": root.duration,
+            "spans": len(self.spans),
+            "dropped_spans": self.dropped,
+            "error": root.error,
+        }
+
+
+class Exporter:
+    """Receives every finished trace"""
+
+    def export(self, trace: Trace):
+        """Export finished `trace`"""
+        raise NotImplementedError()
+
+
+class InMemoryExporter(Exporter):
+    """Keeps last `keep` traces in memory, they can be listed with `/service/traces`"""
+
+    def __init__(self, keep: int):
+        self.traces: Deque[Trace] = deque(maxlen=keep)
+
+    def export(self, trace: Trace):
+        self.traces.append(trace)
+
+    def get(self, trace_id: str) -> Optional[Trace]:
+        """Get stored trace by its id"""
+        for trace in self.traces:
+            if trace.trace_id == trace_id:
+                return trace
+        return None
+
+
+class FileExporter(InMemoryExporter):
+    """Appends spans of every trace to `path` as JSON lines and keeps last `keep` traces in memory.
+    Meant for local use, the file is written synchronously.
+    """
+
+    def __init__(self, path: str, keep: int):
+        super().__init__(keep)
+        self.path = path
+        self.lock = threading.Lock()
+
+    def export(self, trace: Trace):
+        super().export(trace)
+        lines = "".join(json.dumps(finished.to_dict(), default=str) + "\n" for finished in trace.spans)
+        with self.lock, open(self.path, "a", encoding="utf-8") as fid:
+            fid.write(lines)
+
+
+def _default_exporter() -> Optional[Exporter]:
+    if not Config.Tracing.enabled:
+        return None
+    if Config.Tracing.exporter == "file":
+        return FileExporter(Config.Tracing.file, Config.Tracing.keep)
+    return InMemoryExporter(Config.Tracing.keep)
+
+
+exporter: Optional[Exporter] = _default_exporter()
+
+_current: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+memory.register_cache("traces", lambda: getattr(exporter, "traces", ()))
+
+
+def set_exporter(new_exporter: Optional[Exporter]):
+    """Replace exporter of finished traces, None disables tracing"""
+    global exporter  # pylint: disable=global-statement
+    exporter = new_exporter
+
+
+def current() -> Optional[Span]:
+    """Span currently open in this context, None outside of a sampled trace"""
+    return _current.get()
+
+
+def parse_traceparent(header: Optional[str]):
+    """Return `(trace_id, parent_span_id, sampled)` from W3C `traceparent` header, None if it is missing or invalid"""
+    match = _TRACEPARENT.match(header.strip().lower()) if header else None
+    if match is None:
+        return None
+    version, trace_id, span_id, flags = match.groups()
+    if version == "ff" or trace_id == _INVALID_TRACE_ID or span_id == _INVALID_SPAN_ID:
+        return None
+    return trace_id, span_id, bool(int(flags, 16) & 1)
+
+
+@contextmanager
+def start_trace(name: str, traceparent: Optional[str] = None, kind: str = "server") -> Iterator[Optional[Span]]:
+    """Open local root span `name`, continuing the trace of incoming `traceparent` header if valid.
+    The trace is recorded with probability `Config.Tracing.sample_percent`, or whenever the caller sampled it
+    if `Config.Tracing.trust_traceparent` is set. Yields None if the trace is not recorded.
+    """
+    # any client can send a sampled `traceparent`, so the caller's decision is only followed if trusted
+    sampled = random.random() * 100 < Config.Tracing.sample_percent
+    parent = parse_traceparent(traceparent)
+    if parent is not None:
+        trace_id, parent_id, parent_sampled = parent
+        sampled = sampled or (parent_sampled and Config.Tracing.trust_traceparent)
+    else:
+        trace_id, parent_id = os.urandom(16).hex(), None
+    target = exporter
+    if target is None or not sampled:
+        yield None
+        return
+    trace = Trace(trace_id)
+    trace.root = Span(trace, name, parent_id, kind)
+    try:
+        with _open(trace.root) as root:
+            yield root
+    finally:
+        target.export(trace)
+
+
+@contextmanager
+def span(name: str, kind: str = "internal", **attributes) -> Iterator[Optional[Span]]:
+    """Open child span `name` of the current span, no-op (yielding None) outside of a recorded trace"""
+    parent = _current.get()
+    if parent is None:
+        yield None
+        return
+    child = Span(parent.trace, name, parent.span_id, kind)
+    child.attributes.update(attributes)
+    with _open(child):
+        yield child
+
+
+@contextmanager
+def _open(opened: Span) -> Iterator[Span]:
+    token = _current.set(opened)
+    try:
+        yield opened
+    except BaseException as error:
+        opened.error = repr(error)
+        raise
+    finally:
+        _current.reset(token)
+        opened.end = time.time()
+        opened.trace.add(opened)
+
+
+def traced(name: Optional[str] = None) -> Callable[[F], F]:
+    """Decorator recording calls of async function as spans named `name` (qualified function name by default)"""
+
+    def decorator(func: F) -> F:
+        span_name = name or f"{func.__module__.rsplit('.', 1)[-1]}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            if _current.get() is None:
+                return await func(*args, **kwargs)
+            with span(span_name):
+                return await func(*args, **kwargs)
+
+        return cast(F, wrapper)
+
+    return decorator
+
+
+def record_query(event: QueryEvent):
+    """Query listener adding finished SQL statement as a span of the current span, see `dbhooks.add_listener`"""
+    parent = _current.get()
+    if parent is None:
+        return
+    query = Span(parent.trace, "db.query", parent.span_id, "client")
+    query.end = time.time() - (time.perf_counter() - event.started - event.duration)
+    query.start = query.end - event.duration
+    # literals are stripped, they may contain personal data
+    query.attributes.update(statement=fingerprint(event.sql), connection=event.connection)
+    if event.failed:
+        query.error = "failed"
+    parent.trace.add(query)
+
+
+class TracingMiddleware:
+    """ASGI middleware opening a root span for every HTTP request, named by the matched endpoint.
+    Incoming `traceparent` header is continued and the response carries `traceparent` of the request span.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        header = next((value for key, value in scope["headers"] if key == b"traceparent"), None)
+        with start_trace(f"{scope['method']} {scope['path']}", header.decode("latin-1") if header else None) as root:
+            if root is None:
+                await self.app(scope, receive, send)
+                return
+            root.attributes.update(method=scope["method"], path=scope["path"])
+
+            async def send_traced(message):
+                if message["type"] == "http.response.start":
+                    root.attributes["status_code"] = message["status"]
+                    headers = list(message.get("headers", []))
+                    headers.append((TRACEPARENT_HEADER.encode("latin-1"), root.traceparent().encode("latin-1")))
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_traced)
+            finally:
+                endpoint = getattr(scope.get("endpoint"), "__name__", None)
+                if endpoint:
+                    root.name = f"{scope['method']} {endpoint}"
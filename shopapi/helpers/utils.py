@@ -1,10 +1,15 @@
 """Utility helpers
 """
 
-from typing import Optional, Type, Union
+from typing import Any, Awaitable, Callable, Iterable, List, Optional, Type, Union
+from tortoise import timezone
+from tortoise.backends.base.client import BaseDBAsyncClient
 from tortoise.queryset import Q
+from tortoise.transactions import in_transaction
 
+from shopapi.schemas import models
 from shopapi.schemas.base import BaseModelTortoise
+from shopapi.helpers.changes import delete_tracked
 from shopapi.helpers.dependencies import QueryParams
 
 
@@ -18,3 +23,64 @@ def build_search_query(search: Union[Optional[str], Optional[QueryParams]], mode
         return Q()
     query = Q(*[Q(**{f"{field}__icontains": search}) for field in model.get_search_fields()], join_type="OR")
     return query
+
+
+WriteOperation = Callable[[BaseDBAsyncClient], Awaitable[Any]]
+
+
+class BatchWrite:
+    """Set-based writes executed in a single transaction, e.g.
+
+        await BatchWrite().delete(models.Tag, name__in=names).create(models.Tag, tags).execute()
+
+    Operations run in the order they were added, if any of them fails, none of them is committed.
+    """
+
+    def __init__(self, batch_size: Optional[int] = None):
+        self.batch_size = batch_size
+        self.operations: List[WriteOperation] = []
+
+    def create(self, model: Type[BaseModelTortoise], objects: Iterable[BaseModelTortoise]) -> "BatchWrite":
+        """Insert `objects` using `bulk_create`, rows of tracked models share one change sequence number"""
+        objects = list(objects)
+
+        async def insert(db: BaseDBAsyncClient):
+            if issubclass(model, models.TrackedModel):
+                change_seq = await models.ChangeCounter.next(db)
+                for obj in objects:
+                    obj.change_seq = change_seq  # type: ignore
+            await model.bulk_create(objects, batch_size=self.batch_size, using_db=db)
+
+        if objects:
+            self.operations.append(insert)
+        return self
+
+    def update(self, model: Type[BaseModelTortoise], values: dict, **filters) -> "BatchWrite":
+        """Update all rows of `model` matching `filters` with `values` in one statement,
+        rows of tracked models are marked as changed
+        """
+
+        async def update(db: BaseDBAsyncClient):
+            tracked = {}
+            if issubclass(model, models.TrackedModel):
+                tracked = {"change_seq": await models.ChangeCounter.next(db), "updated_at": timezone.now()}
+            await model.filter(**filters).using_db(db).update(**values, **tracked)
+
+        self.operations.append(update)
+        return self
+
+    def delete(self, model: Type[BaseModelTortoise], **filters) -> "BatchWrite":
+        """Delete all rows of `model` matching `filters` in one statement, recording tombstones for the change feed"""
+        self.operations.append(lambda db: delete_tracked(model, db, **filters))
+        return self
+
+    def call(self, operation: WriteOperation) -> "BatchWrite":
+        """Run any other `operation`, it receives the transaction connection as its only argument"""
+        self.operations.append(operation)
+        return self
+
+    async def execute(self, connection_name: Optional[str] = None):
+        """Execute all operations in one transaction"""
+        async with in_transaction(connection_name) as connection:
+            for operation in self.operations:
+                await operation(connection)
@@ -8,3 +8,5 @@ from shopapi.routers import service
 from shopapi.routers import role
 from shopapi.routers import tag
 from shopapi.routers import category
+from shopapi.routers import events
+from shopapi.routers import batch
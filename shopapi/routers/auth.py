@@ -16,7 +16,7 @@ from starlette.responses import JSONResponse, RedirectResponse
 
 from shopapi.schemas import schemas, api
 from shopapi.config import Config
-from shopapi.helpers import exceptions, dependencies, security
+from shopapi.helpers import exceptions, dependencies, security, tracing
 from shopapi import actions
 
 logger = logging.getLogger(__name__)
@@ -91,7 +91,8 @@ async def auth_sso_callback(
 ):
     """Process sso provider's login callback and login user"""
     sso = _provider_factory(provider)
-    openidsso = await sso.verify_and_process(request)
+    with tracing.span("sso.verify_and_process", "client", provider=provider):
+        openidsso = await sso.verify_and_process(request)
     if openidsso is None:
         raise exceptions.AuthenticationException()
     openid = schemas.OpenID.from_sso(openidsso)
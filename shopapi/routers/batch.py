@@ -0,0 +1,40 @@
+"""Batch endpoint
+"""
+
+from typing import Optional
+from fastapi import APIRouter, Depends, Request
+
+from shopapi.config import Config
+from shopapi.helpers import batch, dependencies as deps, exceptions
+from shopapi.schemas import api
+
+router = APIRouter(prefix="/batch", tags=["Batch"])
+
+
+@router.post("/", response_model=api.BatchOut)
+async def batch_execute(batch_in: api.BatchIn, request: Request, token: Optional[str] = Depends(deps.get_user_token)):
+    """Execute several operations in one round-trip, e.g.
+
+        {"operations": [
+            {"id": "tag", "method": "POST", "path": "/tag/", "body": {"name": "sale"}},
+            {"method": "PUT", "path": "/user/role", "body": {"user_id": 2, "role_id": 3}},
+            {"method": "GET", "path": "/category/?search=shoes"}
+        ]}
+
+    Every operation is a request of another endpoint, its `path` may include the query string.
+    Streaming endpoints and the endpoints hashing passwords (login, registration) can not be batched.
+    The token is decoded and the role loaded once for all operations, which require the same permissions
+    as standalone requests. Consecutive `GET` operations run concurrently, other operations one by one in order.
+
+    Results are listed in the order of the operations with the status code, headers and body
+    the endpoint would have responded with. A failed operation does not stop the others, unless
+    `transaction` is set: then all operations run in one database transaction, which is rolled back
+    (`committed` is false) by the first failed operation and the remaining operations are skipped.
+    Operations submitting background jobs can not run in a transaction.
+    """
+    if len(batch_in.operations) > Config.Batch.max_operations:
+        raise exceptions.InvalidOperation(
+            detail=f"A batch can contain at most {Config.Batch.max_operations} operations"
+        )
+    executor = batch.BatchExecutor(request, await batch.authenticate(token))
+    return await executor.run(batch_in.operations, batch_in.transaction)
@@ -2,11 +2,11 @@
 """
 
 from typing import List
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Response
 
 from shopapi import actions
 from shopapi.schemas import schemas, models
-from shopapi.helpers import dependencies as deps, exceptions
+from shopapi.helpers import dependencies as deps
 
 router = APIRouter(prefix="/category", tags=["Categories"])
 
@@ -14,9 +14,26 @@ operator = actions.category.CategoryOperator()
 
 
 @router.get("/", response_model=List[schemas.Category])
-async def category_list(common: deps.QueryParams = Depends(deps.query_params)):
-    """List all categories"""
-    return await operator.list(common)
+async def category_list(response: Response, common: deps.QueryParams = Depends(deps.query_params)):
+    """List all categories, or categories with comma-separated `ids`
+    (ids not found are listed in `X-Missing-Ids` header)
+    """
+    return await operator.list(common, response=response)
+
+
+@router.get("/autocomplete", response_model=List[schemas.Suggestion])
+async def category_autocomplete(params: deps.SuggestParams = Depends(deps.suggest_params)):
+    """Suggest categories having a word starting with `q`, served from an in-memory index"""
+    return await operator.suggest(params.q, params.limit)
+
+
+@router.get("/changes", response_model=schemas.Changes[schemas.Category])
+async def category_changes(params: deps.ChangesParams = Depends(deps.changes_params)):
+    """Categories created or updated and ids of categories deleted since `sync_token` returned by the previous call.
+    Without `sync_token` all categories are returned, repeat the call with the new `sync_token`
+    while `has_more` is true.
+    """
+    return await operator.changes(params.sync_token, params.limit)
 
 
 @router.get("/{category_id}", response_model=schemas.Category)
@@ -79,7 +96,7 @@ async def category_tags_list(category_id: int, role: schemas.Role = Depends(deps
     # how do I make mypy know that models.Category is indeed a subclass
     # of BaseModelTortoise and can be returned?
     if isinstance(category_db, models.Category):
-        return [schemas.Tag.from_orm(tag) for tag in category_db.tags]
+        return [schemas.Tag.trusted(tag) for tag in category_db.tags]
 
 
 @router.put("/{category_id}/tag/{tag_id}", response_model=List[schemas.Tag])
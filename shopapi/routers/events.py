@@ -0,0 +1,29 @@
+"""Event stream endpoints
+"""
+
+from fastapi import APIRouter
+
+from shopapi.helpers import events, exceptions
+
+router = APIRouter(prefix="/events", tags=["Events"])
+
+RESOURCES = ("tag", "category")
+
+
+@router.get("/", response_class=events.EventStreamResponse)
+async def events_stream(resources: str = ",".join(RESOURCES)):
+    """Stream `create`, `update` and `delete` events of comma-separated catalog `resources`
+    as server-sent events named `<resource>.<action>`, e.g. `tag.update`.
+    Data of `create` and `update` events is the resource, data of `delete` events contains only its `id`.
+
+    A client that does not keep up receives a `resync` event and is disconnected. It should then catch up
+    using `/<resource>/changes` and reconnect.
+    """
+    requested = frozenset(resource.strip().lower() for resource in resources.split(",") if resource.strip())
+    unknown = requested.difference(RESOURCES)
+    if not requested or unknown:
+        raise exceptions.InvalidOperation(detail=f"`resources` must be a subset of {', '.join(RESOURCES)}")
+    subscription = events.broadcaster.subscribe(requested)
+    return events.EventStreamResponse(
+        events.broadcaster.stream(subscription), headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -2,7 +2,7 @@
 """
 
 from typing import List
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Response
 
 from shopapi import actions
 from shopapi.helpers import dependencies as deps
@@ -15,15 +15,31 @@ operator = actions.role.RoleOperator()
 
 @router.get("/", response_model=List[schemas.Role])
 async def role_list(
-    role: schemas.Role = Depends(deps.get_user_role), common: deps.QueryParams = Depends(deps.query_params)
+    response: Response,
+    role: schemas.Role = Depends(deps.get_user_role),
+    common: deps.QueryParams = Depends(deps.query_params),
 ):
-    """List all roles
+    """List all roles, or roles with comma-separated `ids` (ids not found are listed in `X-Missing-Ids` header)
 
     Required permissions:
 
         - `roles.read`
     """
-    return await operator.list(common, role)
+    return await operator.list(common, role, response)
+
+
+@router.get("/changes", response_model=schemas.Changes[schemas.Role])
+async def role_changes(
+    params: deps.ChangesParams = Depends(deps.changes_params), role: schemas.Role = Depends(deps.get_user_role)
+):
+    """Roles created or updated and ids of roles deleted since `sync_token` returned by the previous call.
+    Without `sync_token` all roles are returned, repeat the call with the new `sync_token` while `has_more` is true.
+
+    Required permissions:
+
+        - `roles.read`
+    """
+    return await operator.changes(params.sync_token, params.limit, role)
 
 
 @router.get("/{role_id}", response_model=schemas.Role)
@@ -2,12 +2,14 @@
 """
 
 import logging
-from typing import List
-from fastapi import APIRouter
-from tortoise.exceptions import DoesNotExist
+from typing import Dict, List, Optional
+from fastapi import APIRouter, Depends
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import PlainTextResponse
 from shopapi import actions
-from shopapi.helpers import exceptions
-from shopapi.schemas import schemas, models
+from shopapi.config import Config
+from shopapi.helpers import autocomplete, dependencies as deps, exceptions, metrics, profiling, slowlog, tracing, utils
+from shopapi.schemas import api, schemas, models
 from shopapi.schemas.schemas import (
     ADMIN,
     EDITOR,
@@ -15,7 +17,7 @@ from shopapi.schemas.schemas import (
 )
 
 from shopapi.constants import ROLE_ADMIN_ID, ROLE_EDITOR_ID, ROLE_PUBLIC_ID, ROLE_VIEWER_ID
-from shopapi.helpers import demo
+from shopapi.helpers import demo, jobs, memory
 
 logger = logging.getLogger(__name__)
 
@@ -43,10 +45,12 @@ async def service_db_init():
             detail="The shop was already intitialized. This action can only be performed once."
         )
 
-    for role in default_roles:
-        await models.Role.create(**role.dict(exclude_none=True))
-
-    await models.Shop.set_initialized(True)
+    await (
+        utils.BatchWrite()
+        .create(models.Role, [models.Role(**role.dict(exclude_none=True)) for role in default_roles])
+        .call(lambda db: models.Shop.set_initialized(True, using_db=db))
+        .execute()
+    )
 
 
 @router.get("/demo-data")
@@ -61,6 +65,7 @@ async def service_demo_data():
     for category in demo.categories:
         logger.info("Creating category %s", category)
         await models.Category.create(**category.dict(exclude_none=True, exclude={"category": ["parent_category_id"]}))
+    autocomplete.invalidate_all()
 
 
 @router.delete("/demo-data")
@@ -68,21 +73,282 @@ async def service_demo_data_delete():
     """Delete demo data"""
     if await models.Shop.is_production():
         raise exceptions.InvalidOperation(detail="The shop is in production mode, this is not doable.")
-    for plain_user in demo.users:
-        try:
-            user_db = await models.User.get(email=plain_user.email)
-            await user_db.delete()
-        except DoesNotExist:
-            continue
-    for tag_input in demo.tags:
-        try:
-            tag_db = await models.Tag.get(name=tag_input.name)
-            await tag_db.delete()
-        except DoesNotExist:
-            continue
-    for category in demo.categories:
-        try:
-            category_db = await models.Category.get(title=category.title)
-            await category_db.delete()
-        except DoesNotExist:
-            continue
+    await (
+        utils.BatchWrite()
+        .delete(models.User, email__in=[plain_user.email for plain_user in demo.users])
+        .delete(models.Tag, name__in=[tag_input.name for tag_input in demo.tags])
+        .delete(models.Category, title__in=[category.title for category in demo.categories])
+        .execute()
+    )
+    autocomplete.invalidate_all()
+
+
+@router.post(
+    "/synthetic-data", response_model=schemas.Job, status_code=202, dependencies=[Depends(deps.get_admin_role)]
+)
+async def service_synthetic_data(params: api.SyntheticDataIn):
+    """Generate synthetic data in configurable volumes, deterministic for the same `seed`.
+    Runs as a background job, its progress can be followed at `/service/jobs/{job_id}`.
+
+    Required permissions:
+
+        - `roles.read`
+        - `roles.write`
+        - `roles.delete`
+    """
+    if await models.Shop.is_production():
+        raise exceptions.InvalidOperation(detail="The shop is in production mode, this is not doable.")
+    return await jobs.runner.submit("synthetic-data", params.dict())
+
+
+@router.delete(
+    "/synthetic-data", response_model=schemas.Job, status_code=202, dependencies=[Depends(deps.get_admin_role)]
+)
+async def service_synthetic_data_delete():
+    """Delete synthetic data in a background job
+
+    Required permissions:
+
+        - `roles.read`
+        - `roles.write`
+        - `roles.delete`
+    """
+    if await models.Shop.is_production():
+        raise exceptions.InvalidOperation(detail="The shop is in production mode, this is not doable.")
+    return await jobs.runner.submit("synthetic-data-delete", {})
+
+
+@router.get("/jobs", response_model=List[schemas.Job], dependencies=[Depends(deps.get_admin_role)])
+async def service_jobs(
+    status: Optional[schemas.JobStatus] = None, common: deps.QueryParams = Depends(deps.query_params)
+):
+    """List background jobs, newest first
+
+    Required permissions:
+
+        - `roles.read`
+        - `roles.write`
+        - `roles.delete`
+    """
+    query = models.Job.filter(utils.build_search_query(common, models.Job))
+    if status is not None:
+        query = query.filter(status=status)
+    return await query.order_by("-id").offset(common.offset).limit(common.limit)
+
+
+@router.post("/jobs", response_model=schemas.Job, status_code=202)
+async def service_job_submit(
+    job: schemas.JobInput,
+    user: schemas.UserToken = Depends(deps.get_user),
+    _role: schemas.Role = Depends(deps.get_admin_role),
+):
+    """Submit a background job
+
+    Required permissions:
+
+        - `roles.read`
+        - `roles.write`
+        - `roles.delete`
+    """
+    return await jobs.runner.submit(job.kind, job.params, user.id)
+
+
+@router.get("/jobs/{job_id}", response_model=schemas.Job, dependencies=[Depends(deps.get_admin_role)])
+async def service_job_get(job_id: int):
+    """Get background job status and progress
+
+    Required permissions:
+
+        - `roles.read`
+        - `roles.write`
+        - `roles.delete`
+    """
+    job = await models.Job.get_or_none(id=job_id)
+    if job is None:
+        raise exceptions.ResourceNotFound("job", job_id)
+    return job
+
+
+@router.delete("/jobs/{job_id}", response_model=schemas.Job, dependencies=[Depends(deps.get_admin_role)])
+async def service_job_cancel(job_id: int):
+    """Cancel queued or running background job
+
+    Required permissions:
+
+        - `roles.read`
+        - `roles.write`
+        - `roles.delete`
+    """
+    return await jobs.runner.cancel(job_id)
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def service_metrics():
+    """Application metrics in Prometheus text format"""
+    return PlainTextResponse(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@router.get("/profiles", response_model=List[Dict], dependencies=[Depends(deps.get_admin_role)])
+async def service_profiles():
+    """List stored request profiles, newest first
+
+    Required permissions:
+
+        - `roles.read`
+        - `roles.write`
+        - `roles.delete`
+    """
+    return [profile.summary() for profile in reversed(profiling.profiles)]
+
+
+@router.get("/profiles/{profile_id}", response_class=PlainTextResponse, dependencies=[Depends(deps.get_admin_role)])
+async def service_profile_get(profile_id: str):
+    """Download request profile in folded stacks format (usable by flamegraph.pl, speedscope etc.)
+
+    Required permissions:
+
+        - `roles.read`
+        - `roles.write`
+        - `roles.delete`
+    """
+    profile = profiling.get_profile(profile_id)
+    if profile is None:
+        raise exceptions.ResourceNotFound("profile", profile_id)
+    return PlainTextResponse(profile.folded())
+
+
+def _trace_store() -> tracing.InMemoryExporter:
+    if not isinstance(tracing.exporter, tracing.InMemoryExporter):
+        raise exceptions.InvalidOperation(detail="Traces are not kept, tracing is disabled or uses a custom exporter")
+    return tracing.exporter
+
+
+@router.get("/traces", response_model=List[Dict], dependencies=[Depends(deps.get_admin_role)])
+async def service_traces(min_duration_ms: int = 0, name: Optional[str] = None):
+    """List recorded request traces, newest first, optionally only the ones taking at least `min_duration_ms`
+    or with root span `name` containing `name`, e.g. `category_get`
+
+    Required permissions:
+
+        - `roles.read`
+        - `roles.write`
+        - `roles.delete`
+    """
+    summaries = [trace.summary() for trace in reversed(_trace_store().traces)]
+    return [
+        summary
+        for summary in summaries
+        if summary["duration"] * 1000 >= min_duration_ms and (not name or name in summary["name"])
+    ]
+
+
+@router.get("/traces/{trace_id}", response_model=List[Dict], dependencies=[Depends(deps.get_admin_role)])
+async def service_trace_get(trace_id: str):
+    """Get spans of recorded trace ordered by their start
+
+    Required permissions:
+
+        - `roles.read`
+        - `roles.write`
+        - `roles.delete`
+    """
+    trace = _trace_store().get(trace_id)
+    if trace is None:
+        raise exceptions.ResourceNotFound("trace", trace_id)
+    return [span.to_dict() for span in sorted(trace.spans, key=lambda span: span.start)]
+
+
+@router.get("/memory", response_model=Dict, dependencies=[Depends(deps.get_admin_role)])
+async def service_memory(limit: int = 20, group_by: str = "module", depth: int = 2, diff: bool = False):
+    """Memory usage: sizes of in-process caches and, while allocations are traced (see `/service/memory/start`),
+    top `limit` allocation groups. `group_by` is one of `module` (allocating module shortened to `depth` components,
+    e.g. `shopapi.schemas`), `caller` (innermost application module on the stack) or `line`.
+    With `diff` the growth since the baseline snapshot is listed instead.
+
+    Required permissions:
+
+        - `roles.read`
+        - `roles.write`
+        - `roles.delete`
+    """
+    if group_by not in memory.GROUPS:
+        raise exceptions.InvalidOperation(detail=f"`group_by` must be one of {', '.join(memory.GROUPS)}")
+    # taking and grouping a snapshot and walking the caches may take seconds, keep serving other requests meanwhile
+    caches = await run_in_threadpool(memory.cache_sizes, memory.cache_copies())
+    top = await run_in_threadpool(memory.top, limit, group_by, depth, diff)
+    return {**memory.status(), "caches": caches, "top": top}
+
+
+@router.post("/memory/start", response_model=Dict, dependencies=[Depends(deps.get_admin_role)])
+async def service_memory_start(frames: Optional[int] = None):
+    """Start tracing memory allocations storing `frames` frames of every traceback and take the baseline snapshot.
+    Tracing slows the whole process down and needs memory of its own, stop it when done.
+
+    Required permissions:
+
+        - `roles.read`
+        - `roles.write`
+        - `roles.delete`
+    """
+    await run_in_threadpool(memory.start, frames or Config.Memory.trace_frames)
+    return memory.status()
+
+
+@router.post("/memory/baseline", response_model=Dict, dependencies=[Depends(deps.get_admin_role)])
+async def service_memory_baseline():
+    """Take new baseline snapshot, `/service/memory?diff=true` lists the growth since
+
+    Required permissions:
+
+        - `roles.read`
+        - `roles.write`
+        - `roles.delete`
+    """
+    if not memory.status()["tracing"]:
+        raise exceptions.InvalidOperation(detail="Memory allocations are not traced, start tracing first")
+    await run_in_threadpool(memory.take_baseline)
+    return memory.status()
+
+
+@router.post("/memory/stop", response_model=Dict, dependencies=[Depends(deps.get_admin_role)])
+async def service_memory_stop():
+    """Stop tracing memory allocations and release the traces
+
+    Required permissions:
+
+        - `roles.read`
+        - `roles.write`
+        - `roles.delete`
+    """
+    memory.stop()
+    return memory.status()
+
+
+@router.get("/slow-queries", response_model=List[Dict], dependencies=[Depends(deps.get_admin_role)])
+async def service_slow_queries(sort: str = "total", limit: int = 20):
+    """List SQL statement statistics aggregated by fingerprint (statement with literals stripped).
+    `sort` is one of `total`, `max`, `count` or `slow` (number of executions over the slow query threshold).
+
+    Required permissions:
+
+        - `roles.read`
+        - `roles.write`
+        - `roles.delete`
+    """
+    if sort not in slowlog.SORT_KEYS:
+        raise exceptions.InvalidOperation(detail=f"`sort` must be one of {', '.join(slowlog.SORT_KEYS)}")
+    return slowlog.top(sort, limit)
+
+
+@router.delete("/slow-queries", dependencies=[Depends(deps.get_admin_role)])
+async def service_slow_queries_reset():
+    """Reset SQL statement statistics
+
+    Required permissions:
+
+        - `roles.read`
+        - `roles.write`
+        - `roles.delete`
+    """
+    slowlog.reset()
+    return {"detail": "Removed"}
@@ -2,7 +2,7 @@
 """
 
 from typing import List
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Response
 
 from shopapi import actions
 from shopapi.schemas import schemas
@@ -14,9 +14,23 @@ operator = actions.tag.TagOperator()
 
 
 @router.get("/", response_model=List[schemas.Tag])
-async def tag_list(common: deps.QueryParams = Depends(deps.query_params)):
-    """List all tags"""
-    return await operator.list(common)
+async def tag_list(response: Response, common: deps.QueryParams = Depends(deps.query_params)):
+    """List all tags, or tags with comma-separated `ids` (ids not found are listed in `X-Missing-Ids` header)"""
+    return await operator.list(common, response=response)
+
+
+@router.get("/autocomplete", response_model=List[schemas.Suggestion])
+async def tag_autocomplete(params: deps.SuggestParams = Depends(deps.suggest_params)):
+    """Suggest tags having a word starting with `q`, served from an in-memory index"""
+    return await operator.suggest(params.q, params.limit)
+
+
+@router.get("/changes", response_model=schemas.Changes[schemas.Tag])
+async def tag_changes(params: deps.ChangesParams = Depends(deps.changes_params)):
+    """Tags created or updated and ids of tags deleted since `sync_token` returned by the previous call.
+    Without `sync_token` all tags are returned, repeat the call with the new `sync_token` while `has_more` is true.
+    """
+    return await operator.changes(params.sync_token, params.limit)
 
 
 @router.get("/{tag_id}", response_model=schemas.Tag)
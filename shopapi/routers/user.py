@@ -3,7 +3,7 @@
 
 import logging
 from typing import List
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Response
 from shopapi.helpers import dependencies as deps, exceptions
 from shopapi.schemas import models, schemas, api
 from shopapi import actions
@@ -45,7 +45,7 @@ async def user_role_update(role_update: api.RoleUpdateIn, role: schemas.Role = D
     user_db = await user_db.update_from_dict({"role_id": role_update.role_id})
     await user_db.save()
     await user_db.fetch_related("role")
-    return api.RoleUpdateOut.from_orm(user_db)
+    return api.RoleUpdateOut.trusted(user_db)
 
 
 @router.get(
@@ -54,16 +54,31 @@ async def user_role_update(role_update: api.RoleUpdateIn, role: schemas.Role = D
     response_model=List[api.UserUpdateOut],
 )
 async def user_list(
+    response: Response,
     role: schemas.Role = Depends(deps.get_user_role),
     common: deps.QueryParams = Depends(deps.query_params),
 ):
-    """List all users
+    """List all users, or users with comma-separated `ids` (ids not found are listed in `X-Missing-Ids` header)
 
     Required permissions:
 
         - `users.read`
     """
-    return await operator.list(common, role)
+    return await operator.list(common, role, response)
+
+
+@router.get("/changes", dependencies=[Depends(deps.get_user)], response_model=schemas.Changes[api.UserUpdateOut])
+async def user_changes(
+    params: deps.ChangesParams = Depends(deps.changes_params), role: schemas.Role = Depends(deps.get_user_role)
+):
+    """Users created or updated and ids of users deleted since `sync_token` returned by the previous call.
+    Without `sync_token` all users are returned, repeat the call with the new `sync_token` while `has_more` is true.
+
+    Required permissions:
+
+        - `users.read`
+    """
+    return await operator.changes(params.sync_token, params.limit, role)
 
 
 @router.get("/{user_id}", response_model=api.UserUpdateOut)
@@ -1,10 +1,10 @@
 """API schemas without relation to DB
 """
 
-from typing import List, Optional
-from pydantic import BaseModel, EmailStr, constr  # pylint: disable=no-name-in-module
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel, EmailStr, conint, conlist, constr  # pylint: disable=no-name-in-module
 
-from shopapi.constants import PASSWORD_REGEX, ROLE_PUBLIC_ID
+from shopapi.constants import PASSWORD_REGEX, ROLE_PUBLIC_ID, ROLE_VIEWER_ID
 from shopapi.helpers import security
 from shopapi.schemas.base import ComputedBase, ORMBase
 
@@ -86,3 +86,51 @@ class UserUpdateOut(ORMBase):
     first_name: Optional[str]
     last_name: Optional[str]
     picture: Optional[str]
+
+
+class SyntheticDataIn(BaseModel):
+    """Volumes and parameters of generated synthetic data"""
+
+    users: conint(ge=0) = 1000  # type: ignore
+    tags: conint(ge=0) = 100  # type: ignore
+    categories: conint(ge=0) = 200  # type: ignore
+    category_depth: conint(ge=1) = 4  # type: ignore
+    tags_per_category: conint(ge=0) = 3  # type: ignore
+    products: conint(ge=0) = 1000  # type: ignore
+    tags_per_product: conint(ge=0) = 5  # type: ignore
+    role_id: int = ROLE_VIEWER_ID
+    password: constr(min_length=6, regex=PASSWORD_REGEX) = "synthetic"  # type: ignore
+    seed: int = 0
+    batch_size: conint(ge=1) = 1000  # type: ignore
+
+
+class BatchOperationIn(BaseModel):
+    """Single operation of a batch, i.e. a sub-request of any API endpoint"""
+
+    id: Optional[str]
+    method: constr(to_upper=True, regex="^(GET|POST|PUT|PATCH|DELETE)$")  # type: ignore
+    path: constr(regex="^/")  # type: ignore
+    body: Optional[Any]
+
+
+class BatchIn(BaseModel):
+    """Operations executed by a batch"""
+
+    operations: conlist(BatchOperationIn, min_items=1)  # type: ignore
+    transaction: bool = False
+
+
+class BatchOperationOut(BaseModel):
+    """Result of a single batch operation, as the endpoint would have responded"""
+
+    id: Optional[str]
+    status: int
+    headers: Dict[str, str] = {}
+    body: Any
+
+
+class BatchOut(BaseModel):
+    """Results of batch operations in the order of the operations"""
+
+    committed: bool
+    results: List[BatchOperationOut]
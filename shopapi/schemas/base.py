@@ -1,18 +1,28 @@
 """Base for schemas
 """
 
-from typing import List, NamedTuple, Type
+from enum import Enum
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple, Type, TypeVar
 from pydantic import BaseModel as PydanticBase  # pylint: disable=no-name-in-module
+from pydantic.fields import SHAPE_LIST, SHAPE_SINGLETON, ModelField  # pylint: disable=no-name-in-module
 from tortoise import fields
 from tortoise.models import Model
 
+from shopapi.helpers import memory
+
+O = TypeVar("O", bound="ORMBase")
+
+_missing = object()
+
+Converter = Callable[[Any], Any]
+
 
 class BaseModelTortoise(Model):
     """BaseModel"""
 
     id = fields.IntField(pk=True)
-    created_at = fields.DatetimeField(auto_now_add=True)
-    updated_at = fields.DatetimeField(auto_now=True)
+    created_at = fields.DatetimeField(auto_now_add=True, index=True)
+    updated_at = fields.DatetimeField(auto_now=True, index=True)
 
     @staticmethod
     def get_search_fields() -> List[str]:
@@ -20,6 +30,32 @@ class BaseModelTortoise(Model):
         return []
 
 
+def _converter(field: ModelField) -> Optional[Converter]:
+    """Cheap conversion of trusted `field` value to the type `from_orm` would produce, None if it is used as is"""
+    if isinstance(field.type_, type) and issubclass(field.type_, ORMBase):
+        nested = field.type_
+
+        def convert(value: Any) -> Any:
+            # relations that were not fetched are awaitable querysets
+            if hasattr(value, "__await__") and not isinstance(value, Model):
+                raise TypeError(f"Related {nested.__name__} was not fetched, use .fetch_related() first")
+            return nested.trusted(value)
+
+        if field.shape == SHAPE_SINGLETON:
+            return convert
+        if field.shape == SHAPE_LIST:
+            return lambda values: [convert(value) for value in values]
+        raise TypeError(f"Unsupported shape of nested field {field.name}")
+    if isinstance(field.type_, type) and issubclass(field.type_, Enum) and field.shape == SHAPE_SINGLETON:
+        enum = field.type_
+        return lambda value: value if isinstance(value, enum) else enum(value)
+    return None
+
+
+_trusted_plans: Dict[type, List[Tuple[str, Optional[Converter]]]] = {}
+memory.register_cache("trusted_plans", lambda: _trusted_plans)
+
+
 class ORMBase(PydanticBase):
     """Base for orm-mode schemas"""
 
@@ -28,6 +64,26 @@ class ORMBase(PydanticBase):
 
         orm_mode = True
 
+    @classmethod
+    def trusted(cls: Type[O], obj: Any) -> O:
+        """Create schema from ORM `obj` like `from_orm`, but without validation.
+        Only for data that was already validated, i.e. loaded from our own database, never for user input.
+        Nested schemas and enums are still converted, relations must be fetched.
+        """
+        plan = _trusted_plans.get(cls)
+        if plan is None:
+            plan = _trusted_plans[cls] = [(name, _converter(field)) for name, field in cls.__fields__.items()]
+        # schemas with iterable children are built from columns and the children only, see `IterableChildren.from_orm`
+        children = getattr(cls, "iterable_children", None)
+        skipped = obj._meta.fetch_fields.difference(children) if children else ()  # pylint: disable=protected-access
+        values = {}
+        for name, convert in plan:
+            value = getattr(obj, name, _missing) if name not in skipped else _missing
+            if value is _missing:
+                continue
+            values[name] = convert(value) if convert is not None and value is not None else value
+        return cls.construct(_fields_set=set(values), **values)
+
 
 class ComputedBase(PydanticBase):
     """Base for schemas containing computed properties"""
@@ -46,7 +102,7 @@ class ComputedBase(PydanticBase):
         skip_defaults=None,
         exclude_unset=False,
         exclude_defaults=False,
-        exclude_none=False
+        exclude_none=False,
     ):
         """Return as dict"""
         dct = super().dict(
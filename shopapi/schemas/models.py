@@ -1,14 +1,16 @@
 """Database models for Tortoise-ORM operations
 """
 
-from typing import List, Optional
+from typing import Iterable, List, Optional
 from tortoise import fields
+from tortoise.backends.base.client import BaseDBAsyncClient
 from shopapi.schemas.base import BaseModelTortoise
+from shopapi.schemas.schemas import JobStatus
 
-from shopapi.config import build_db_url
+from shopapi.config import build_db_connections
 
 TORTOISE_ORM = {
-    "connections": {"default": build_db_url()},
+    "connections": build_db_connections(),
     "apps": {
         "models": {
             "models": ["shopapi.schemas.models", "aerich.models"],
@@ -28,6 +30,57 @@ def boolstr(val: str) -> bool:
     return val.lower() in ("yes", "true", "1")
 
 
+class ChangeCounter(BaseModelTortoise):
+    """Single-row counter assigning sequence numbers to changes served by the change feed"""
+
+    value = fields.BigIntField(default=0)
+
+    class Meta:
+        """Class metadata"""
+
+        table = "change_counter"
+
+    @classmethod
+    async def next(cls, using_db: BaseDBAsyncClient) -> int:
+        """Increment the counter within the transaction `using_db` and return the new value.
+        The counter row stays locked until the transaction ends, so the numbers are committed in increasing order.
+        """
+        rows = await using_db.execute_query_dict(
+            'UPDATE "change_counter" SET "value" = "value" + 1 WHERE "id" = 1 RETURNING "value"'
+        )
+        if rows:
+            return rows[0]["value"]
+        await cls.create(id=1, value=1, using_db=using_db)
+        return 1
+
+
+class TrackedModel(BaseModelTortoise):
+    """Model served by the change feed, every save assigns the row the next change sequence number
+    in the same transaction, see `helpers.changes`
+    """
+
+    change_seq = fields.BigIntField(default=0, index=True)  # type: int
+
+    class Meta:
+        """Class metadata"""
+
+        abstract = True
+
+    async def save(
+        self,
+        using_db: Optional[BaseDBAsyncClient] = None,
+        update_fields: Optional[Iterable[str]] = None,
+        force_create: bool = False,
+        force_update: bool = False,
+    ) -> None:
+        db = using_db or self._meta.db
+        async with db._in_transaction() as connection:  # pylint: disable=protected-access
+            self.change_seq = await ChangeCounter.next(connection)
+            if update_fields is not None:
+                update_fields = [*update_fields, "change_seq"]
+            await super().save(connection, update_fields, force_create, force_update)
+
+
 class Shop(BaseModelTortoise):
     """Shop"""
 
@@ -47,19 +100,19 @@ class Shop(BaseModelTortoise):
         return boolstr(dbmod.value)
 
     @classmethod
-    async def set_bool(cls, key: str, val: bool = True):
+    async def set_bool(cls, key: str, val: bool = True, using_db: Optional[BaseDBAsyncClient] = None):
         """Set flag in the database by its key"""
-        dbmod = await cls.get_settings(key)
+        dbmod = await cls.get_settings(key, using_db)
         if dbmod is None:
-            await cls.create(key=key, value=strbool(val))
+            await cls.create(key=key, value=strbool(val), using_db=using_db)
         else:
             dbmod.value = strbool(val)
-            await dbmod.save()
+            await dbmod.save(using_db=using_db)
 
     @classmethod
-    async def get_settings(cls, key: str) -> Optional["Shop"]:
+    async def get_settings(cls, key: str, using_db: Optional[BaseDBAsyncClient] = None) -> Optional["Shop"]:
         """Get settings by key"""
-        dbmod = await cls.filter(key=key).first()
+        dbmod = await cls.filter(key=key).using_db(using_db).first()  # type: ignore
         if not dbmod:
             return None
         return dbmod
@@ -70,9 +123,9 @@ class Shop(BaseModelTortoise):
         return await cls.get_bool("initialized")
 
     @classmethod
-    async def set_initialized(cls, val: bool = True):
+    async def set_initialized(cls, val: bool = True, using_db: Optional[BaseDBAsyncClient] = None):
         """Set initialized flag"""
-        await cls.set_bool("initialized", val)
+        await cls.set_bool("initialized", val, using_db)
 
     @classmethod
     async def is_production(cls) -> bool:
@@ -85,7 +138,7 @@ class Shop(BaseModelTortoise):
         await cls.set_bool("production", val)
 
 
-class Role(BaseModelTortoise):
+class Role(TrackedModel):
     """Role"""
 
     title = fields.CharField(unique=True, max_length=64)
@@ -101,7 +154,7 @@ class Role(BaseModelTortoise):
         return ["title"]
 
 
-class User(BaseModelTortoise):
+class User(TrackedModel):
     """User"""
 
     email = fields.CharField(unique=True, max_length=256)
@@ -122,7 +175,7 @@ class OpenID(BaseModelTortoise):
     """OpenID"""
 
     user = fields.ForeignKeyField("models.User", null=True)
-    email = fields.CharField(max_length=256)
+    email = fields.CharField(max_length=256, index=True)
     first_name = fields.CharField(max_length=64, null=True)
     last_name = fields.CharField(max_length=64, null=True)
     display_name = fields.CharField(max_length=128, null=True)
@@ -130,8 +183,14 @@ class OpenID(BaseModelTortoise):
     provider = fields.CharField(max_length=32)
     provider_id = fields.CharField(max_length=64)
 
+    class Meta:
+        """Class metadata"""
+
+        # lookups by provider account, optionally narrowed by email, see `actions.user.load_openid`
+        indexes = (("provider", "provider_id"),)
 
-class Tag(BaseModelTortoise):
+
+class Tag(TrackedModel):
     """Tag"""
 
     name = fields.CharField(max_length=256, unique=True)
@@ -142,7 +201,7 @@ class Tag(BaseModelTortoise):
         return ["name"]
 
 
-class Category(BaseModelTortoise):
+class Category(TrackedModel):
     """Category"""
 
     title = fields.CharField(max_length=256, index=True, unique=True)
@@ -160,7 +219,7 @@ class Category(BaseModelTortoise):
 
 
 # TODO: stub
-class Product(BaseModelTortoise):
+class Product(TrackedModel):
     """Product"""
 
     title = fields.CharField(max_length=256, index=True)
@@ -169,3 +228,37 @@ class Product(BaseModelTortoise):
     )  # type:ignore
     tags: fields.ManyToManyRelation["Tag"] = fields.ManyToManyField("models.Tag", through="product_tag")
     short_description = fields.CharField(max_length=1024, index=True)
+
+
+class Job(BaseModelTortoise):
+    """Background job"""
+
+    kind = fields.CharField(max_length=64, index=True)
+    status = fields.CharEnumField(JobStatus, max_length=16, default=JobStatus.QUEUED, index=True)
+    progress = fields.FloatField(default=0)
+    message = fields.CharField(max_length=1024, null=True)
+    params = fields.JSONField(null=True)
+    result = fields.JSONField(null=True)
+    error = fields.CharField(max_length=1024, null=True)
+    user: fields.ForeignKeyNullableRelation[User] = fields.ForeignKeyField(
+        "models.User", related_name="jobs", null=True, on_delete=fields.SET_NULL
+    )  # type: ignore
+    started_at = fields.DatetimeField(null=True)
+    heartbeat_at = fields.DatetimeField(null=True)
+    finished_at = fields.DatetimeField(null=True)
+
+    @staticmethod
+    def get_search_fields() -> List[str]:
+        return ["kind"]
+
+
+class Tombstone(TrackedModel):
+    """Record of a deleted resource, served by the change feed"""
+
+    resource = fields.CharField(max_length=64)
+    resource_id = fields.IntField()
+
+    class Meta:
+        """Class metadata"""
+
+        indexes = (("resource", "change_seq", "id"),)
@@ -1,10 +1,11 @@
 """Schemas used throughout the API with connection to DB
 """
 
-from datetime import datetime
-from enum import IntFlag
-from typing import Dict, Mapping, Optional, Union, List, Type, ClassVar
+from datetime import datetime, timezone
+from enum import Enum, IntFlag
+from typing import Any, Dict, Generic, Mapping, Optional, Union, List, Type, TypeVar, ClassVar
 from pydantic import BaseModel, EmailStr  # pylint: disable=no-name-in-module
+from pydantic.generics import GenericModel
 from fastapi_sso.sso.base import OpenID as OpenIDSSO
 
 from shopapi import constants
@@ -165,6 +166,23 @@ class UserToken(BaseModel):
             role_id=token_info.get("rid"),
         )
 
+    @staticmethod
+    def from_trusted_token(token_info: Union[Mapping, dict]) -> "UserToken":
+        """Return `UserToken` from payload of a token with verified signature, i.e. issued by us, without validation.
+        Timestamps are converted to UTC `datetime`s the same way as in `from_token`.
+        """
+        return UserToken.construct(
+            id=token_info["sid"],
+            email=token_info["sub"],
+            issuer=token_info["iss"],
+            not_before=datetime.fromtimestamp(token_info["nbf"], timezone.utc),
+            issued_at=datetime.fromtimestamp(token_info["iat"], timezone.utc),
+            expires=datetime.fromtimestamp(token_info["exp"], timezone.utc),
+            provider=token_info["pvd"],
+            provider_id=token_info.get("pid"),
+            role_id=token_info["rid"],
+        )
+
 
 class TagUserInput(ORMBase):
     """Tag input from user"""
@@ -208,3 +226,56 @@ class Category(CategoryInput, DateTimesMixin):
 
 
 Category.update_forward_refs()
+
+
+class Suggestion(BaseModel):
+    """Autocomplete suggestion"""
+
+    id: int
+    text: str
+
+
+ChangedT = TypeVar("ChangedT")
+
+
+class Changes(GenericModel, Generic[ChangedT]):
+    """Page of the change feed, pass `sync_token` to the next request to continue"""
+
+    changed: List[ChangedT]
+    deleted: List[int]
+    sync_token: str
+    has_more: bool
+
+
+class JobStatus(str, Enum):
+    """State of a background job"""
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+class JobInput(BaseModel):
+    """Background job to be submitted"""
+
+    kind: str
+    params: Dict[str, Any] = {}
+
+
+class Job(ORMBase, DateTimesMixin):
+    """Background job output from db"""
+
+    id: int
+    kind: str
+    status: JobStatus
+    progress: float
+    message: Optional[str]
+    params: Optional[Dict[str, Any]]
+    result: Optional[Any]
+    error: Optional[str]
+    user_id: Optional[int]
+    started_at: Optional[datetime]
+    heartbeat_at: Optional[datetime]
+    finished_at: Optional[datetime]